@@ -0,0 +1,181 @@
+"""Benchmark extract → classify → fill against local fixture pages.
+
+Usage:
+    python -m benchmarks.bench_pipeline --iterations 5 --output bench.json
+
+Every stage is timed separately per fixture and reported as n/mean/p50/p95 in
+seconds. Gemini is replaced by a deterministic fake and all non-local requests
+are aborted, so runs are offline and comparable across commits.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import platform
+import statistics
+import sys
+import time
+from urllib.parse import urlparse
+
+from browser_utils import launch_browser
+from config import FILL_BLOCK_PROFILE
+from field_classifier import classify_fields_with_gemini, stream_classified_fields
+from form_extractor import extract_form_fields
+from form_filler import autofill_form, autofill_form_stream
+from url_extractor.batch import percentile
+
+from .fixtures import FixtureServer, FakeGeminiModel
+
+STAGES = (
+    "launch_browser", "readiness", "extract_form_fields", "classify_fields_with_gemini", "autofill_form",
+    "classify_fill_stream", "total",
+)
+
+BENCH_USER = {
+    "telegram_id": 0,
+    "name": "Bench User",
+    "father_name": "Bench Parent",
+    "email": "bench@example.com",
+    "mobile": "9876543210",
+    "dob": "2000-01-01",
+    "panAdhaarUserId": "ABCDE1234F",
+    "address": "1 Test Street",
+    "password": "not-a-secret",
+}
+
+
+async def _local_only(route):
+    """Keep the benchmark offline: saved portal dumps reference remote scripts."""
+    host = urlparse(route.request.url).hostname or ""
+    if host in ("127.0.0.1", "localhost") or route.request.url.startswith(("data:", "about:")):
+        await route.fallback()
+    else:
+        await route.abort()
+
+
+async def run_once(url: str, model: FakeGeminiModel, block_profile: str, max_fill_fields, readiness_timeout_s: float,
+                   stream: bool = False) -> dict:
+    timings = {}
+    counts = {}
+    started = time.perf_counter()
+
+    t = time.perf_counter()
+    p, browser, browser_context, page = await launch_browser(block_profile=block_profile, headless=True)
+    timings["launch_browser"] = time.perf_counter() - t
+    try:
+        await browser_context.route("**/*", _local_only)
+
+        # Readiness mirrors main.py: navigate, then poll until fields show up
+        t = time.perf_counter()
+        await page.goto(url, wait_until="domcontentloaded", timeout=30000)
+        deadline = time.perf_counter() + readiness_timeout_s
+        while True:
+            fields = await extract_form_fields(page)
+            if fields or time.perf_counter() >= deadline:
+                break
+            await asyncio.sleep(0.1)
+        timings["readiness"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        fields = await extract_form_fields(page)
+        timings["extract_form_fields"] = time.perf_counter() - t
+        counts["fields"] = len(fields)
+
+        if stream:
+            # Classification and filling overlap, so only their combined time is meaningful
+            async def limited():
+                n = 0
+                async for mapping in stream_classified_fields(fields, model):
+                    if max_fill_fields is not None and n >= max_fill_fields:
+                        continue
+                    n += 1
+                    yield mapping
+
+            t = time.perf_counter()
+            counts["filled"] = await autofill_form_stream(page, limited(), BENCH_USER)
+            timings["classify_fill_stream"] = time.perf_counter() - t
+        else:
+            t = time.perf_counter()
+            classified = classify_fields_with_gemini(fields, model)
+            timings["classify_fields_with_gemini"] = time.perf_counter() - t
+            counts["classified"] = len(classified)
+
+            if max_fill_fields is not None:
+                classified = classified[:max_fill_fields]
+
+            t = time.perf_counter()
+            counts["filled"] = await autofill_form(page, classified, BENCH_USER)
+            timings["autofill_form"] = time.perf_counter() - t
+    finally:
+        await browser.close()
+        await p.stop()
+    timings["total"] = time.perf_counter() - started
+    return {"timings": timings, "counts": counts}
+
+
+def summarize(runs: list) -> dict:
+    stages = {}
+    for stage in STAGES:
+        values = [r["timings"][stage] for r in runs if stage in r["timings"]]
+        if values:
+            stages[stage] = {
+                "n": len(values),
+                "mean": round(statistics.mean(values), 4),
+                "p50": round(percentile(values, 50), 4),
+                "p95": round(percentile(values, 95), 4),
+            }
+    return {"stages": stages, "counts": runs[-1]["counts"] if runs else {}}
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the form fill pipeline against local fixture pages.")
+    parser.add_argument("--iterations", "-n", type=int, default=5, help="Runs per fixture")
+    parser.add_argument("--fixture", action="append", help="Fixture path to run (repeatable, default: all)")
+    parser.add_argument("--inputs", type=int, default=300, help="Inputs on the synthetic large form")
+    parser.add_argument("--max-fill-fields", type=int, default=40,
+                        help="Cap fields passed to autofill_form (it types with human-like delays); 0 = no cap")
+    parser.add_argument("--block-profile", default=FILL_BLOCK_PROFILE, help="Resource blocking profile for the page")
+    parser.add_argument("--readiness-timeout", type=float, default=10.0, help="Seconds to wait for fields to appear")
+    parser.add_argument("--stream", action="store_true", help="Time streamed classification overlapped with filling")
+    parser.add_argument("--output", "-o", help="Write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    results = {
+        "meta": {
+            "iterations": args.iterations,
+            "inputs": args.inputs,
+            "max_fill_fields": args.max_fill_fields or None,
+            "block_profile": args.block_profile,
+            "stream": args.stream,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "fixtures": {},
+    }
+    with FixtureServer(n_inputs=args.inputs) as server:
+        fixtures = args.fixture or server.fixtures()
+        for path in fixtures:
+            model = FakeGeminiModel()
+            runs = []
+            print(f"⏱️ {path} x{args.iterations}", file=sys.stderr)
+            for _ in range(args.iterations):
+                # The pipeline logs every field; keep stdout for the JSON report
+                with contextlib.redirect_stdout(sys.stderr):
+                    runs.append(await run_once(
+                        server.base_url + path, model, args.block_profile,
+                        args.max_fill_fields or None, args.readiness_timeout, args.stream
+                    ))
+            results["fixtures"][path] = summarize(runs)
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+        print(f"📊 Wrote {args.output}", file=sys.stderr)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
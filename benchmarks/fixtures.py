@@ -0,0 +1,146 @@
+import json
+import re
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Saved DOM dumps of the e-Pay Tax portal, served as-is
+DEBUG_PAGES = {
+    "/debug_prelogin.html": ROOT / "debug_prelogin_main.html",
+    "/debug_postlogin.html": ROOT / "debug_postlogin_main.html",
+}
+
+FIELD_KINDS = [
+    ("name", "Full Name", "text"),
+    ("email", "Email Address", "email"),
+    ("mobile", "Mobile Number", "tel"),
+    ("dob", "Date of Birth", "date"),
+    ("pan", "PAN", "text"),
+    ("father_name", "Father's Name", "text"),
+    ("address", "Address", "text"),
+    ("remarks", "Remarks", "text"),
+]
+
+
+def _inputs(n: int, prefix: str) -> str:
+    rows = []
+    for i in range(n):
+        key, label, typ = FIELD_KINDS[i % len(FIELD_KINDS)]
+        fid = f"{prefix}_{key}_{i}"
+        rows.append(f'<div><label for="{fid}">{label} {i}</label><input id="{fid}" name="{fid}" type="{typ}" placeholder="{label}"></div>')
+    return "\n".join(rows)
+
+
+def synthetic_pages(n_inputs: int = 300) -> dict:
+    """Generated fixtures: a large flat form and a page with nested iframes."""
+    page = "<!doctype html><html><head><title>{title}</title></head><body><form>{body}</form></body></html>"
+    return {
+        "/simple.html": page.format(title="Simple form", body=_inputs(8, "s")),
+        "/many_inputs.html": page.format(title="Large form", body=_inputs(n_inputs, "m")),
+        "/nested_iframes.html": page.format(
+            title="Nested frames",
+            body=_inputs(10, "top") + '<iframe src="/frame_outer.html" width="900" height="900"></iframe>',
+        ),
+        "/frame_outer.html": page.format(
+            title="Outer frame",
+            body=_inputs(20, "outer") + '<iframe src="/frame_inner.html" width="800" height="600"></iframe>',
+        ),
+        "/frame_inner.html": page.format(title="Inner frame", body=_inputs(20, "inner")),
+    }
+
+
+class FixtureServer:
+    """Serve fixture pages from memory on 127.0.0.1 in a background thread."""
+
+    def __init__(self, n_inputs: int = 300):
+        self.pages = {path: html.encode("utf-8") for path, html in synthetic_pages(n_inputs).items()}
+        for path, file in DEBUG_PAGES.items():
+            if file.exists():
+                self.pages[path] = file.read_bytes()
+        pages = self.pages
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = pages.get(self.path.split("?")[0])
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def fixtures(self) -> list:
+        """Top-level pages worth benchmarking (frames are loaded by their parents)."""
+        return [p for p in self.pages if not p.startswith("/frame_")]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+CATEGORY_RULES = [
+    ("father", "father_name"),
+    ("email", "email"),
+    ("mobile", "mobile"),
+    ("phone", "mobile"),
+    ("birth", "dob"),
+    ("dob", "dob"),
+    ("pan", "pan"),
+    ("address", "address"),
+    ("password", "password"),
+    ("name", "name"),
+]
+
+
+def fake_category(text: str) -> str:
+    text = text.lower()
+    return next((cat for word, cat in CATEGORY_RULES if word in text), "other")
+
+
+# "12 t=email l="Email Address" n=email ..." lines of the classification prompt
+FIELD_LINE = re.compile(r"^(\d+)(?: (.*))?$", re.M)
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGeminiModel:
+    """Deterministic stand-in for genai.GenerativeModel used by the classifier.
+
+    It reads the field lines of the classification prompt and labels each field by
+    keyword rules, so benchmarks measure our code rather than network and model latency.
+    """
+
+    def __init__(self, chunk_size: int = 64):
+        self.calls = 0
+        self.chunk_size = chunk_size
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        self.calls += 1
+        fields_part = prompt.split("Fields:", 1)[-1]
+        out = [{"i": int(i), "c": fake_category(attrs or "")} for i, attrs in FIELD_LINE.findall(fields_part)]
+        text = json.dumps(out, indent=2)
+        if stream:
+            # Chunk boundaries deliberately fall mid-object, like real streamed output
+            return [_FakeResponse(text[i:i + self.chunk_size]) for i in range(0, len(text), self.chunk_size)]
+        return _FakeResponse(text)
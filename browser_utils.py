@@ -1,9 +1,13 @@
 from playwright.async_api import async_playwright
+from config import FILL_BLOCK_PROFILE
+from url_extractor.resource_blocking import apply_resource_blocking
+from tracing import traced
 
-async def launch_browser():
+@traced("launch_browser")
+async def launch_browser(block_profile: str = FILL_BLOCK_PROFILE, allow=None, storage_state=None, headless: bool = False):
     p = await async_playwright().start()
     browser = await p.chromium.launch(
-        headless=False,
+        headless=headless,
         args=[
             '--disable-blink-features=AutomationControlled',
             '--disable-dev-shm-usage',
@@ -19,6 +23,7 @@ async def launch_browser():
         locale='en-US',
         timezone_id='Asia/Kolkata',
         permissions=['geolocation'],
+        storage_state=storage_state,
         extra_http_headers={
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.9',
@@ -34,6 +39,7 @@ async def launch_browser():
             'sec-ch-ua-platform': '"Windows"'
         }
     )
+    await apply_resource_blocking(browser_context, block_profile, allow)
     page = await browser_context.new_page()
     await page.add_init_script("""
         Object.defineProperty(navigator, 'webdriver', { get: () => undefined });
@@ -3,3 +3,51 @@ from dotenv import load_dotenv
 load_dotenv()
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 TELEGRAM_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
+
+# Resource blocking for the fill browser (off | trackers | light | strict); the user
+# reviews this page, so by default only analytics/ads requests are dropped
+FILL_BLOCK_PROFILE = os.environ.get("FILL_BLOCK_PROFILE", "trackers")
+
+# Tracing: spans go to TRACE_FILE as JSONL; METRICS_PORT > 0 also serves /metrics
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "0").lower() in ("1", "true", "yes")
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+# Interface /metrics listens on; localhost unless a scraper elsewhere needs it
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+
+# Fill job admission: concurrent browsers overall and per user, waiting line sizes,
+# and free memory (MiB) required before another browser is launched
+FILL_MAX_CONCURRENT = int(os.environ.get("FILL_MAX_CONCURRENT", "3"))
+FILL_PER_USER_LIMIT = int(os.environ.get("FILL_PER_USER_LIMIT", "1"))
+FILL_MAX_QUEUE = int(os.environ.get("FILL_MAX_QUEUE", "20"))
+FILL_PER_USER_QUEUE = int(os.environ.get("FILL_PER_USER_QUEUE", "1"))
+FILL_MIN_FREE_MB = int(os.environ.get("FILL_MIN_FREE_MB", "700"))
+
+# Pending button requests: lifetime, memory bound and SQLite file ("" keeps them in memory only)
+PENDING_TTL_S = int(os.environ.get("PENDING_TTL_S", str(24 * 3600)))
+PENDING_MAX_ENTRIES = int(os.environ.get("PENDING_MAX_ENTRIES", "10000"))
+PENDING_DB_PATH = os.environ.get("PENDING_DB_PATH", "pending_requests.db")
+
+# Open a matched form before its button is tapped, using idle browser slots only.
+# Off by default: the fill browser is visible, so a prewarm opens a window the user
+# has not asked for yet. Fields are classified only once the button is pressed;
+# unclaimed prewarms are closed after PREWARM_TTL_S
+PREWARM_ENABLED = os.environ.get("PREWARM_ENABLED", "0").lower() in ("1", "true", "yes")
+PREWARM_TTL_S = int(os.environ.get("PREWARM_TTL_S", "180"))
+
+# Stream Gemini's field classification and start filling before the full answer arrives
+STREAM_CLASSIFICATION = os.environ.get("STREAM_CLASSIFICATION", "1").lower() in ("1", "true", "yes")
+
+# Field classification: estimated prompt tokens of field lines per Gemini request
+# (larger forms are split) and how many of those requests run in parallel
+CLASSIFY_TOKEN_BUDGET = int(os.environ.get("CLASSIFY_TOKEN_BUDGET", "1500"))
+CLASSIFY_MAX_PARALLEL = int(os.environ.get("CLASSIFY_MAX_PARALLEL", "4"))
+# Classification requests arriving within this many ms are batched into one call (0 = off).
+# Only the non-streamed path batches: with STREAM_CLASSIFICATION on (the default)
+# each fill streams its own request and these settings have no effect
+CLASSIFY_BATCH_WINDOW_MS = int(os.environ.get("CLASSIFY_BATCH_WINDOW_MS", "25"))
+CLASSIFY_BATCH_MAX_FORMS = int(os.environ.get("CLASSIFY_BATCH_MAX_FORMS", "8"))
+
+# Uploaded documents up to this size are downloaded and parsed in memory;
+# larger ones are spooled to a temporary file
+DOC_IN_MEMORY_MAX_MB = float(os.environ.get("DOC_IN_MEMORY_MAX_MB", "8"))
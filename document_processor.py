@@ -1,21 +1,105 @@
-import json
+import io
 import os
 import tempfile
 import logging
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Union
 import google.generativeai as genai
 from PIL import Image
 import fitz  # PyMuPDF for PDF processing
 import docx  # python-docx for Word documents
 import pandas as pd  # For Excel files
+from local_extractor import VALIDATED_KEYS, extract_locally
+from tracing import span, traced
+from url_extractor.model_router import as_router
+from url_extractor.prompts import get_prompt_cache, model_name_of, register_prompt
+from url_extractor.structured import MalformedResponse, json_config, parse_structured, response_text
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Static schema first so it can be served from the prompt cache; only the text varies
+USER_DETAILS_PROMPT = register_prompt(
+    "user_details",
+    prefix="""Extract user details from the text that follows and return ONLY a JSON object with the following structure.
+If any field is not found, set it to null.
+
+Required JSON structure:
+{
+    "name": "Full name",
+    "email": "Email address",
+    "mobile": "Phone number",
+    "dob": "Date of birth (YYYY-MM-DD format)",
+    "panAdhaarUserId": "PAN or Aadhaar ID",
+    "address": "Full address",
+    "gender": "Gender",
+    "father_name": "Father's name",
+    "mother_name": "Mother's name",
+    "occupation": "Occupation",
+    "annual_income": "Annual income",
+    "bank_account": "Bank account number",
+    "ifsc_code": "IFSC code",
+    "emergency_contact": "Emergency contact number",
+    "blood_group": "Blood group",
+    "marital_status": "Marital status",
+    "qualification": "Educational qualification",
+    "institution": "Educational institution",
+    "passing_year": "Year of passing",
+    "percentage": "Percentage/CGPA",
+    "work_experience": "Work experience in years",
+    "skills": "Skills (comma-separated)",
+    "languages": "Languages known (comma-separated)",
+    "hobbies": "Hobbies (comma-separated)",
+    "achievements": "Achievements",
+    "certifications": "Certifications",
+    "projects": "Projects worked on",
+    "references": "References",
+    "notes": "Additional notes"
+}
+
+When a list of needed fields is given, return only those keys.
+Return ONLY the JSON object, no additional text or explanations.
+""",
+    suffix="""
+Needed fields: {fields}
+
+Text to extract from:
+{text}
+""",
+)
+
+USER_DETAIL_KEYS = [
+    "name", "email", "mobile", "dob", "panAdhaarUserId", "address", "gender", "father_name", "mother_name",
+    "occupation", "annual_income", "bank_account", "ifsc_code", "emergency_contact", "blood_group",
+    "marital_status", "qualification", "institution", "passing_year", "percentage", "work_experience", "skills",
+    "languages", "hobbies", "achievements", "certifications", "projects", "references", "notes",
+]
+
+# Every value is a string or null; Gemini returns exactly these keys
+USER_DETAILS_SCHEMA = {
+    "type": "object",
+    "properties": {key: {"type": "string", "nullable": True} for key in USER_DETAIL_KEYS},
+}
+USER_DETAILS_CONFIG = json_config(USER_DETAILS_SCHEMA)
+
+def _user_details_config(keys):
+    return json_config({"type": "object", "properties": {key: USER_DETAILS_SCHEMA["properties"][key] for key in keys}})
+
+# Uploads are parsed straight from memory when small enough, otherwise from a spooled file
+DocumentSource = Union[str, bytes, bytearray]
+
+def _in_memory(source: DocumentSource) -> bool:
+    return isinstance(source, (bytes, bytearray))
+
+def _as_file(source: DocumentSource):
+    """A path or a binary file object, whichever the parser should open."""
+    return io.BytesIO(source) if _in_memory(source) else source
+
 class DocumentProcessor:
     def __init__(self, gemini_model):
+        # A ModelRouter (tiered) or a single GenerativeModel
         self.gemini_model = gemini_model
+        self.router = as_router(gemini_model)
         self.supported_formats = {
             'image': ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'],
             'pdf': ['.pdf'],
@@ -24,10 +108,10 @@ class DocumentProcessor:
             'text': ['.txt']
         }
     
-    def extract_text_from_pdf(self, file_path: str) -> str:
+    def extract_text_from_pdf(self, source: DocumentSource) -> str:
         """Extract text from PDF file"""
         try:
-            doc = fitz.open(file_path)
+            doc = fitz.open(stream=source, filetype="pdf") if _in_memory(source) else fitz.open(source)
             text = ""
             for page in doc:
                 text += page.get_text()
@@ -37,10 +121,10 @@ class DocumentProcessor:
             logger.error(f"Error extracting text from PDF: {e}")
             return ""
     
-    def extract_text_from_docx(self, file_path: str) -> str:
+    def extract_text_from_docx(self, source: DocumentSource) -> str:
         """Extract text from Word document"""
         try:
-            doc = docx.Document(file_path)
+            doc = docx.Document(_as_file(source))
             text = ""
             for paragraph in doc.paragraphs:
                 text += paragraph.text + "\n"
@@ -49,52 +133,58 @@ class DocumentProcessor:
             logger.error(f"Error extracting text from DOCX: {e}")
             return ""
     
-    def extract_text_from_excel(self, file_path: str) -> str:
+    def extract_text_from_excel(self, source: DocumentSource) -> str:
         """Extract text from Excel file"""
         try:
-            df = pd.read_excel(file_path)
+            df = pd.read_excel(_as_file(source))
             text = df.to_string()
             return text
         except Exception as e:
             logger.error(f"Error extracting text from Excel: {e}")
             return ""
     
-    def extract_text_from_image(self, file_path: str) -> str:
+    def extract_text_from_image(self, source: DocumentSource) -> str:
         """Extract text from image using Gemini Vision"""
         try:
             # Open and process the image
-            image = Image.open(file_path)
+            image = Image.open(_as_file(source))
             
             # Convert to RGB if necessary
             if image.mode != 'RGB':
                 image = image.convert('RGB')
             
             # Use Gemini to extract text from image
-            response = self.gemini_model.generate_content([
-                "Extract all text content from this image. Return only the text content, no explanations.",
-                image
-            ])
+            def ocr(model):
+                with span("gemini.generate_content", purpose="image_ocr", model=model_name_of(model)):
+                    response = model.generate_content([
+                        "Extract all text content from this image. Return only the text content, no explanations.",
+                        image
+                    ])
+                return response.text if response.text else ""
             
-            return response.text if response.text else ""
+            return self.router.call("image_ocr", ocr, accept=lambda text: bool(text.strip()))
         except Exception as e:
             logger.error(f"Error extracting text from image: {e}")
             return ""
     
-    def extract_text_from_file(self, file_path: str, file_extension: str) -> str:
-        """Extract text from various file formats"""
+    @traced("document.extract_text")
+    def extract_text_from_file(self, source: DocumentSource, file_extension: str) -> str:
+        """Extract text from various file formats (a file path or the file's bytes)"""
         file_extension = file_extension.lower()
         
         if file_extension in self.supported_formats['pdf']:
-            return self.extract_text_from_pdf(file_path)
+            return self.extract_text_from_pdf(source)
         elif file_extension in self.supported_formats['document']:
-            return self.extract_text_from_docx(file_path)
+            return self.extract_text_from_docx(source)
         elif file_extension in self.supported_formats['spreadsheet']:
-            return self.extract_text_from_excel(file_path)
+            return self.extract_text_from_excel(source)
         elif file_extension in self.supported_formats['image']:
-            return self.extract_text_from_image(file_path)
+            return self.extract_text_from_image(source)
         elif file_extension in self.supported_formats['text']:
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
+                if _in_memory(source):
+                    return bytes(source).decode('utf-8')
+                with open(source, 'r', encoding='utf-8') as f:
                     return f.read()
             except Exception as e:
                 logger.error(f"Error reading text file: {e}")
@@ -103,76 +193,42 @@ class DocumentProcessor:
             logger.warning(f"Unsupported file format: {file_extension}")
             return ""
     
-    def extract_user_details_with_gemini(self, extracted_text: str) -> Dict[str, Any]:
-        """Use Gemini AI to extract structured user details from text"""
-        try:
-            prompt = f"""
-            Extract user details from the following text and return ONLY a JSON object with the following structure.
-            If any field is not found, set it to null.
-            
-            Required JSON structure:
-            {{
-                "name": "Full name",
-                "email": "Email address",
-                "mobile": "Phone number",
-                "dob": "Date of birth (YYYY-MM-DD format)",
-                "panAdhaarUserId": "PAN or Aadhaar ID",
-                "address": "Full address",
-                "gender": "Gender",
-                "father_name": "Father's name",
-                "mother_name": "Mother's name",
-                "occupation": "Occupation",
-                "annual_income": "Annual income",
-                "bank_account": "Bank account number",
-                "ifsc_code": "IFSC code",
-                "emergency_contact": "Emergency contact number",
-                "blood_group": "Blood group",
-                "marital_status": "Marital status",
-                "qualification": "Educational qualification",
-                "institution": "Educational institution",
-                "passing_year": "Year of passing",
-                "percentage": "Percentage/CGPA",
-                "work_experience": "Work experience in years",
-                "skills": "Skills (comma-separated)",
-                "languages": "Languages known (comma-separated)",
-                "hobbies": "Hobbies (comma-separated)",
-                "achievements": "Achievements",
-                "certifications": "Certifications",
-                "projects": "Projects worked on",
-                "references": "References",
-                "notes": "Additional notes"
-            }}
-            
-            Text to extract from:
-            {extracted_text}
-            
-            Return ONLY the JSON object, no additional text or explanations.
-            """
-            
-            response = self.gemini_model.generate_content(prompt)
+    @traced("document.extract_user_details")
+    def extract_user_details_with_gemini(self, extracted_text: str, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Use Gemini AI to extract structured user details from text (only ``fields`` when given)"""
+        values = {"text": extracted_text, "fields": ", ".join(fields) if fields else "all"}
+        config = _user_details_config(fields) if fields else USER_DETAILS_CONFIG
+        
+        def extract(model):
+            with span("gemini.generate_content", purpose="user_details", model=model_name_of(model)):
+                response = get_prompt_cache().generate(
+                    model, USER_DETAILS_PROMPT.name, values, generation_config=config
+                )
             
-            # Try to parse the JSON response
+            text = response_text(response)
             try:
-                # Clean the response text
-                response_text = response.text.strip()
-                if response_text.startswith('```json'):
-                    response_text = response_text[7:]
-                if response_text.endswith('```'):
-                    response_text = response_text[:-3]
-                
-                user_details = json.loads(response_text)
-                logger.info(f"Successfully extracted user details: {list(user_details.keys())}")
-                return user_details
-                
-            except json.JSONDecodeError as e:
+                return parse_structured(text, USER_DETAILS_SCHEMA)
+            except MalformedResponse as e:
                 logger.error(f"Failed to parse JSON response: {e}")
-                logger.error(f"Response text: {response.text}")
-                return {}
-                
+                logger.error(f"Response text: {text}")
+                raise
+        
+        try:
+            # Short documents go to the cheapest model; an unparsable or empty answer moves up a tier
+            # A partial request may legitimately come back empty, so only full extractions escalate on that
+            user_details = self.router.call(
+                "user_details", extract, size=len(extracted_text),
+                accept=None if fields else (lambda details: any(v for v in details.values())),
+            )
+            logger.info(f"Successfully extracted user details: {list(user_details.keys())}")
+            return user_details
+        except MalformedResponse:
+            return {}
         except Exception as e:
             logger.error(f"Error extracting user details with Gemini: {e}")
             return {}
     
+    @traced("document.validate")
     def validate_user_details(self, user_details: Dict[str, Any]) -> Dict[str, Any]:
         """Validate and clean extracted user details"""
         validated = {}
@@ -219,12 +275,13 @@ class DocumentProcessor:
         
         return validated
     
-    def process_document(self, file_path: str, file_extension: str) -> Dict[str, Any]:
-        """Main method to process a document and extract user details"""
-        logger.info(f"Processing document: {file_path}")
+    @traced("document.process")
+    def process_document(self, source: DocumentSource, file_extension: str) -> Dict[str, Any]:
+        """Main method to process a document (path or in-memory bytes) and extract user details"""
+        logger.info(f"Processing document: {f'{len(source)} bytes in memory' if _in_memory(source) else source}")
         
         # Extract text from document
-        extracted_text = self.extract_text_from_file(file_path, file_extension)
+        extracted_text = self.extract_text_from_file(source, file_extension)
         
         if not extracted_text.strip():
             logger.warning("No text extracted from document")
@@ -232,8 +289,25 @@ class DocumentProcessor:
         
         logger.info(f"Extracted {len(extracted_text)} characters of text")
         
-        # Extract user details using Gemini
-        user_details = self.extract_user_details_with_gemini(extracted_text)
+        # Patterns and checksums first; Gemini is skipped only when they explain the whole text
+        with span("document.local_extract") as s:
+            user_details, leftover = extract_locally(extracted_text)
+            s.set(fields=len(user_details), leftover_chars=len(leftover))
+        validated = {key: value for key, value in user_details.items() if key in VALIDATED_KEYS}
+        wanted = [key for key in USER_DETAIL_KEYS if key not in validated]
+        logger.info(f"Local extraction found {len(user_details)} fields ({len(validated)} validated); "
+                    f"{len(leftover)} characters left unexplained")
+        
+        llm_used = bool(wanted and leftover.strip())
+        if llm_used:
+            # Gemini reads the whole document so values sharing a line with a match are not lost;
+            # it overrides everything local except checksum/structure-validated values
+            llm_details = self.extract_user_details_with_gemini(extracted_text, wanted if validated else None)
+            for key in wanted:
+                if llm_details.get(key):
+                    user_details[key] = llm_details[key]
+        else:
+            logger.info("Skipping Gemini: the document was fully explained locally")
         
         if not user_details:
             logger.warning("No user details extracted")
@@ -251,5 +325,6 @@ class DocumentProcessor:
             "success": True,
             "user_details": validated_details,
             "extracted_fields_count": non_null_fields,
-            "raw_text_length": len(extracted_text)
+            "raw_text_length": len(extracted_text),
+            "llm_used": llm_used
         }
@@ -1,40 +1,471 @@
+import asyncio
+import bisect
+import contextvars
 import json
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
+from config import CLASSIFY_TOKEN_BUDGET, CLASSIFY_MAX_PARALLEL, CLASSIFY_BATCH_WINDOW_MS, CLASSIFY_BATCH_MAX_FORMS
+from tracing import span
+from url_extractor.model_router import as_router
+from url_extractor.prompts import estimate_tokens, get_prompt_cache, model_name_of, register_prompt
+from url_extractor.structured import MalformedResponse, json_config, parse_structured, response_text, validate
 
-def classify_fields_with_gemini(fields, gemini_model):
-    prompt = f"""
-You are given form fields from a webpage. 
-Each field has attributes: id, name, placeholder, type, and label.
-Classify each field into one of these categories:
-- name
-- email
-- password
-- phone
-- address
-- father_name
-- mother_name
-- aadhaar_number
-- date_of_birth
-- assessment_year
-- pan
-- dob
-- mobile
-- other
-Return JSON ONLY (no markdown, no explanation), format:
-[
-  {{"id": "...", "name": "...", "category": "..."}},
-  ...
+CATEGORIES = [
+    "name", "email", "password", "phone", "address", "father_name", "mother_name", "aadhaar_number",
+    "date_of_birth", "assessment_year", "pan", "dob", "mobile", "other",
 ]
-Fields:
-{json.dumps(fields, indent=2)}
-"""
-    response = gemini_model.generate_content(prompt)
-    raw_text = response.text.strip()
-    raw_text = re.sub(r"^```[a-zA-Z]*\n?", "", raw_text)
-    raw_text = re.sub(r"```$", "", raw_text)
+
+# Field attributes sent to the model, with the short keys used in the prompt
+ATTR_KEYS = (
+    ("type", "t"),
+    ("label", "l"),
+    ("name", "n"),
+    ("id", "id"),
+    ("placeholder", "ph"),
+    ("formcontrolname", "fc"),
+    ("aria_label", "al"),
+)
+MAX_ATTR_CHARS = 60
+PLAIN_VALUE = re.compile(r"^[\w.\-/]+$")
+
+def _compact(value):
+    value = " ".join(str(value).split())
+    if len(value) > MAX_ATTR_CHARS:
+        value = value[:MAX_ATTR_CHARS - 1] + "…"
+    return value
+
+def encode_field(index, field, frame_legend):
+    """One prompt line: the field index followed by its non-empty attributes."""
+    parts = [str(index)]
+    seen = set()
+    for key, short in ATTR_KEYS:
+        value = field.get(key)
+        if not value or (key == "type" and value == "text"):
+            continue
+        value = _compact(value)
+        # Labels are often copied from the placeholder or aria-label; send each text once
+        if key != "type" and value.lower() in seen:
+            continue
+        seen.add(value.lower())
+        parts.append(f"{short}={value}" if PLAIN_VALUE.match(value) else f"{short}={json.dumps(value, ensure_ascii=False)}")
+    frame = field.get("frame", "main")
+    if frame != "main":
+        parts.append(f"f={frame_legend.setdefault(frame, len(frame_legend) + 1)}")
+    return " ".join(parts)
+
+CLASSIFY_PROMPT = register_prompt(
+    "classify_fields",
+    prefix=f"""Classify each web form field into one of these categories: {", ".join(CATEGORIES)}.
+Each field line is: its index, then only the attributes it has (t=type, default text; l=label; n=name; id; ph=placeholder; fc=formcontrolname; al=aria-label; f=iframe number from the frame list).
+If fields are grouped under "Form n:" headers they come from separate, unrelated forms; indices are unique across all of them.
+Return JSON ONLY (no markdown, no explanation): an array with one {{"i": <index>, "c": "<category>"}} per field.
+""",
+    suffix="{frames}Fields:\n{fields}\n",
+)
+
+# Gemini is constrained to this shape, so answers need no fence stripping or guessing
+CLASSIFICATION_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"i": {"type": "integer"}, "c": {"type": "string", "enum": CATEGORIES}},
+        "required": ["i", "c"],
+    },
+}
+CLASSIFICATION_CONFIG = json_config(CLASSIFICATION_SCHEMA)
+
+def classification_prompt_values(fields, indices=None, sections=None):
+    """Per-call values of CLASSIFY_PROMPT for fields[i], i in indices (all fields by default).
+
+    ``sections`` lists the start indices of separate forms batched into one
+    prompt; each gets a "Form n:" header while indices stay global.
+    """
+    indices = range(len(fields)) if indices is None else indices
+    frame_legend = {}
+    starts = {start: n for n, start in enumerate(sections or [], start=1)}
+    lines = []
+    for i in indices:
+        if i in starts:
+            lines.append(f"Form {starts[i]}:")
+        lines.append(encode_field(i, fields[i], frame_legend))
+    frames = "".join(f"f{n}={url}\n" for url, n in frame_legend.items())
+    return {"frames": "Frames:\n" + frames if frames else "", "fields": "\n".join(lines)}
+
+def build_classification_prompt(fields, indices=None, sections=None):
+    """The full classification prompt as sent when no prefix cache is in use."""
+    return CLASSIFY_PROMPT.render(**classification_prompt_values(fields, indices, sections))
+
+def fields_cost(fields):
+    """Estimated prompt tokens of the field lines for ``fields``."""
+    legend = {}
+    return sum(estimate_tokens(encode_field(i, field, legend)) + 1 for i, field in enumerate(fields))
+
+def plan_chunks(fields, budget=CLASSIFY_TOKEN_BUDGET):
+    """Split field indices so each sub-request's field list stays within ``budget`` tokens.
+
+    Chunks are balanced (similar size) rather than filled greedily, so the
+    parallel requests finish at about the same time.
+    """
+    legend = {}
+    costs = [estimate_tokens(encode_field(i, field, legend)) + 1 for i, field in enumerate(fields)]
+    total = sum(costs)
+    if total <= budget:
+        return [list(range(len(fields)))] if fields else []
+    target = total / -(-total // budget)
+    chunks, current, used = [], [], 0
+    for i, cost in enumerate(costs):
+        if current and (used + cost > budget or used >= target):
+            chunks.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+def decode_classification(items, fields):
+    """Map index-based model output back onto the full field dicts.
+
+    Each result keeps every extracted attribute (frame, formcontrolname, ...) so
+    the filler can build selectors and find the right iframe. Also accepts the
+    older {"id", "name", "category"} shape.
+    """
+    by_key = {(f.get("id", ""), f.get("name", "")): f for f in fields}
+    out = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        category = item.get("c") or item.get("category")
+        index = item.get("i", item.get("index"))
+        if isinstance(index, str) and index.strip().isdigit():
+            index = int(index)
+        field = None
+        if isinstance(index, int) and not isinstance(index, bool) and 0 <= index < len(fields):
+            field = fields[index]
+        elif "id" in item or "name" in item:
+            field = by_key.get((item.get("id", ""), item.get("name", "")), {"id": item.get("id", ""), "name": item.get("name", "")})
+        if field is None or not category:
+            continue
+        out.append({**field, "category": category})
+    return out
+
+def _report_usage(response, prompt, s, label):
+    meta = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(meta, "prompt_token_count", None)
+    output_tokens = getattr(meta, "candidates_token_count", None)
+    cached_tokens = getattr(meta, "cached_content_token_count", None)
+    estimated = estimate_tokens(prompt)
+    s.set(prompt_tokens=prompt_tokens, output_tokens=output_tokens, cached_tokens=cached_tokens, prompt_tokens_est=estimated)
+    print(f"🧮 {label}: prompt {prompt_tokens if prompt_tokens is not None else f'~{estimated}'} tokens"
+          f"{f' ({cached_tokens} cached)' if cached_tokens else ''}, "
+          f"output {output_tokens if output_tokens is not None else '?'} tokens")
+
+def _complete_enough(mappings, indices):
+    # The prompt asks for every field; losing more than half of them means a confused answer
+    return len(mappings) * 2 >= len(indices)
+
+def _classify_chunk(fields, indices, gemini_model, floor=0):
+    values = classification_prompt_values(fields, indices)
+    prompt = CLASSIFY_PROMPT.render(**values)
+
+    def attempt(model):
+        with span("gemini.generate_content", purpose="classify_fields", fields=len(indices), model=model_name_of(model)) as s:
+            response = get_prompt_cache().generate(model, CLASSIFY_PROMPT.name, values, generation_config=CLASSIFICATION_CONFIG)
+            _report_usage(response, prompt, s, f"Classified {len(indices)} fields")
+        text = response_text(response)
+        try:
+            return decode_classification(parse_structured(text, CLASSIFICATION_SCHEMA), fields)
+        except MalformedResponse as e:
+            print("Gemini parse error:", text, e)
+            raise
+
     try:
-        return json.loads(raw_text)
-    except Exception as e:
-        print("Gemini parse error:", raw_text, e)
+        return as_router(gemini_model).call(
+            "classify_fields", attempt, size=len(indices), floor=floor,
+            accept=lambda mappings: _complete_enough(mappings, indices),
+        )
+    except MalformedResponse:
         return []
+
+def classify_fields_with_gemini(fields, gemini_model):
+    chunks = plan_chunks(fields)
+    if len(chunks) <= 1:
+        return _classify_chunk(fields, chunks[0] if chunks else [], gemini_model) if fields else []
+    print(f"✂️ Splitting {len(fields)} fields into {len(chunks)} classification requests")
+    with ThreadPoolExecutor(max_workers=min(len(chunks), CLASSIFY_MAX_PARALLEL)) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, _classify_chunk, fields, chunk, gemini_model)
+            for chunk in chunks
+        ]
+        return [mapping for future in futures for mapping in future.result()]
+
+def _split_sections(items, combined, offsets, count):
+    results = [[] for _ in range(count)]
+    for item in items:
+        index, category = item["i"], item["c"]
+        if 0 <= index < len(combined):
+            form = bisect.bisect_right(offsets, index) - 1
+            results[form].append({**combined[index], "category": category})
+    return results
+
+def classify_forms_batch(forms, gemini_model):
+    """Classify several small forms with one Gemini call; returns one mapping list per form.
+
+    Completeness is judged per form: a form that comes back less than half
+    classified is sent again on its own through classify_fields_with_gemini.
+    """
+    combined, offsets = [], []
+    for fields in forms:
+        offsets.append(len(combined))
+        combined.extend(fields)
+    values = classification_prompt_values(combined, sections=offsets)
+    prompt = CLASSIFY_PROMPT.render(**values)
+
+    def attempt(model):
+        with span("gemini.generate_content", purpose="classify_fields_batch", forms=len(forms), fields=len(combined),
+                  model=model_name_of(model)) as s:
+            response = get_prompt_cache().generate(model, CLASSIFY_PROMPT.name, values, generation_config=CLASSIFICATION_CONFIG)
+            _report_usage(response, prompt, s, f"Classified {len(forms)} forms / {len(combined)} fields in one call")
+        return parse_structured(response_text(response), CLASSIFICATION_SCHEMA)
+
+    def every_form_complete(items):
+        sections = _split_sections(items, combined, offsets, len(forms))
+        return all(_complete_enough(mappings, fields) for mappings, fields in zip(sections, forms))
+
+    items = as_router(gemini_model).call(
+        "classify_fields", attempt, size=len(combined), accept=every_form_complete,
+    )
+    results = _split_sections(items, combined, offsets, len(forms))
+    for n, fields in enumerate(forms):
+        if not _complete_enough(results[n], fields):
+            print(f"🔂 Batched classification covered {len(results[n])}/{len(fields)} fields of form {n + 1}; "
+                  f"classifying it on its own")
+            results[n] = classify_fields_with_gemini(fields, gemini_model)
+    return results
+
+class ClassificationBatcher:
+    """Coalesce classification requests from concurrent fills into shared Gemini calls.
+
+    Requests arriving within ``window_ms`` of the first one are sent together as
+    one sectioned prompt, flushed early once ``max_forms`` forms or the token
+    budget are reached. Forms too large to share a prompt go straight to
+    classify_fields_with_gemini. If a batched call fails, each form is retried
+    on its own.
+    """
+
+    def __init__(self, gemini_model, window_ms=CLASSIFY_BATCH_WINDOW_MS, max_forms=CLASSIFY_BATCH_MAX_FORMS,
+                 budget=CLASSIFY_TOKEN_BUDGET):
+        self.gemini_model = gemini_model
+        self.window_ms = window_ms
+        self.max_forms = max_forms
+        self.budget = budget
+        self._pending = []
+        self._pending_cost = 0
+        self._timer = None
+        self.calls = 0
+        self.forms = 0
+
+    async def classify(self, fields):
+        if not fields:
+            return []
+        cost = fields_cost(fields)
+        if self.window_ms <= 0 or cost > self.budget:
+            self.calls += 1
+            self.forms += 1
+            return await asyncio.to_thread(classify_fields_with_gemini, fields, self.gemini_model)
+        if self._pending and self._pending_cost + cost > self.budget:
+            self._flush()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((fields, future))
+        self._pending_cost += cost
+        if len(self._pending) >= self.max_forms:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window_ms / 1000, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_cost = self._pending, [], 0
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        forms = [fields for fields, _ in batch]
+        self.calls += 1
+        self.forms += len(forms)
+        try:
+            if len(forms) == 1:
+                results = [await asyncio.to_thread(classify_fields_with_gemini, forms[0], self.gemini_model)]
+            else:
+                results = await asyncio.to_thread(classify_forms_batch, forms, self.gemini_model)
+        except Exception as e:
+            print(f"⚠️ Batched classification of {len(forms)} forms failed ({e}); classifying each form separately")
+            results = await asyncio.gather(
+                *(asyncio.to_thread(classify_fields_with_gemini, fields, self.gemini_model) for fields in forms),
+                return_exceptions=True,
+            )
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+class JsonArrayStreamParser:
+    """Incrementally parse a top-level JSON array of objects.
+
+    feed() takes the next chunk of model output and returns the objects completed
+    by it. Anything before the first '[' (such as a markdown fence) is skipped.
+    """
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._obj_start = None
+        self.done = False
+
+    def feed(self, text):
+        if self.done:
+            return []
+        self._buf += text
+        buf = self._buf
+        out = []
+        i = self._pos
+        while i < len(buf):
+            c = buf[i]
+            if not self._started:
+                if c == "[":
+                    self._started = True
+                    self._depth = 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c in "{[":
+                if self._depth == 1 and c == "{":
+                    self._obj_start = i
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._obj_start is not None:
+                    try:
+                        out.append(json.loads(buf[self._obj_start:i + 1]))
+                    except ValueError as e:
+                        print(f"⚠️ Skipping malformed field mapping: {e}")
+                    self._obj_start = None
+                elif self._depth == 0:
+                    self.done = True
+                    i += 1
+                    break
+            i += 1
+        # Keep only the unfinished object so the buffer stays small on long outputs
+        keep = self._obj_start if self._obj_start is not None else i
+        self._buf = buf[keep:]
+        self._pos = i - keep
+        if self._obj_start is not None:
+            self._obj_start = 0
+        return out
+
+async def stream_classified_fields(fields, gemini_model):
+    """Async generator yielding each field mapping as soon as Gemini has written it.
+
+    Large forms are split into sub-requests (see plan_chunks) that stream in
+    parallel. Each blocking streaming call runs in a worker thread and hands text
+    chunks to the event loop through a shared queue. When a sub-request's stream
+    fails or ends before its array closes, the fields it had not yet classified
+    are retried once without streaming.
+    """
+    if not fields:
+        return
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue()
+    done = object()
+    plan = plan_chunks(fields)
+    if len(plan) > 1:
+        print(f"✂️ Splitting {len(fields)} fields into {len(plan)} streamed classification requests")
+    router = as_router(gemini_model)
+    tiers = [router.pick("classify_fields", size=len(indices)) for indices in plan]
+
+    def produce(n, indices):
+        values = classification_prompt_values(fields, indices)
+        prompt = CLASSIFY_PROMPT.render(**values)
+        model = router.model(tiers[n])
+        try:
+            with span("gemini.generate_content", purpose="classify_fields_stream", fields=len(indices),
+                      model=model_name_of(model)) as s:
+                last = None
+                for last in get_prompt_cache().generate(model, CLASSIFY_PROMPT.name, values, stream=True,
+                                                        generation_config=CLASSIFICATION_CONFIG):
+                    try:
+                        text = last.text
+                    except Exception:
+                        text = ""  # e.g. a chunk carrying only safety metadata
+                    if text:
+                        loop.call_soon_threadsafe(chunks.put_nowait, (n, text))
+                # Usage totals arrive with the final chunk
+                _report_usage(last, prompt, s, f"Streamed {len(indices)} fields")
+        except Exception as e:
+            loop.call_soon_threadsafe(chunks.put_nowait, (n, e))
+        finally:
+            loop.call_soon_threadsafe(chunks.put_nowait, (n, done))
+
+    sem = asyncio.Semaphore(CLASSIFY_MAX_PARALLEL)
+
+    async def run(n, indices):
+        async with sem:
+            await asyncio.to_thread(produce, n, indices)
+
+    producers = [asyncio.ensure_future(run(n, indices)) for n, indices in enumerate(plan)]
+    parsers = [JsonArrayStreamParser() for _ in plan]
+    yielded = [set() for _ in plan]  # field indices already handed out, per sub-request
+    errors = [None] * len(plan)
+    remaining = len(plan)
+    started = time.perf_counter()
+    try:
+        while remaining:
+            n, item = await chunks.get()
+            if item is done:
+                remaining -= 1
+                continue
+            if isinstance(item, Exception):
+                errors[n] = item
+                continue
+            for entry in validate(parsers[n].feed(item), CLASSIFICATION_SCHEMA):
+                for mapping in decode_classification([entry], fields):
+                    if not any(yielded):
+                        print(f"⚡ First field classified after {time.perf_counter() - started:.2f}s")
+                    yielded[n].add(entry["i"])
+                    yield mapping
+    finally:
+        for producer in producers:
+            if not producer.done():
+                producer.cancel()
+        await asyncio.gather(*producers, return_exceptions=True)
+    for n, indices in enumerate(plan):
+        # An empty but complete array is a valid answer; a stream that broke off
+        # (error or unterminated array) gets its unclassified fields retried once
+        failed = errors[n] is not None or not parsers[n].done
+        router.record("classify_fields", tiers[n], not failed)
+        missing = [i for i in indices if i not in yielded[n]]
+        if failed and missing:
+            print(f"⚠️ Streaming classification stopped after {len(yielded[n])}/{len(indices)} fields"
+                  f"{f' ({errors[n]})' if errors[n] is not None else ''}; retrying {len(missing)} without streaming")
+            # The retry starts one tier up, like any other escalation
+            floor = tiers[n] + 1 if router.max_escalations else tiers[n]
+            for mapping in await asyncio.to_thread(_classify_chunk, fields, missing, router, floor):
+                yield mapping
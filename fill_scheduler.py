@@ -0,0 +1,207 @@
+"""Admission control for browser fill jobs.
+
+Every fill holds a visible Chromium for up to five minutes, so the bot cannot
+start one per button press. FillScheduler caps how many run at once (globally
+and per user), queues the rest by priority, reports queue positions back to the
+caller and holds new launches while the host is short on memory.
+"""
+import asyncio
+import heapq
+import itertools
+
+try:
+    import psutil
+except Exception:
+    psutil = None  # optional; /proc/meminfo is used instead
+
+from config import FILL_MAX_CONCURRENT, FILL_PER_USER_LIMIT, FILL_MAX_QUEUE, FILL_PER_USER_QUEUE, FILL_MIN_FREE_MB
+
+
+class SchedulerBusy(Exception):
+    """Raised when a job cannot even be queued (queue full or user over their limit)."""
+
+
+def available_memory_mb():
+    """Free memory in MiB, or None when it cannot be determined."""
+    if psutil is not None:
+        try:
+            return psutil.virtual_memory().available / (1024 * 1024)
+        except Exception:
+            pass
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except Exception:
+        pass
+    return None
+
+
+class _Ticket:
+    __slots__ = ("priority", "seq", "user_id", "future", "on_position", "position")
+
+    def __init__(self, priority, seq, user_id, future, on_position):
+        self.priority = priority
+        self.seq = seq
+        self.user_id = user_id
+        self.future = future
+        self.on_position = on_position
+        self.position = None
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _Lease:
+    """Admitted slot; ``async with`` it around the job to release on exit."""
+
+    def __init__(self, scheduler, user_id):
+        self._scheduler = scheduler
+        self._user_id = user_id
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._scheduler._release(self._user_id)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+        return False
+
+
+class FillScheduler:
+    """Priority queue in front of browser launches (lower priority value runs first).
+
+    Jobs are admitted while fewer than ``max_concurrent`` run, the user has fewer
+    than ``per_user_limit`` running and at least ``min_free_mb`` of memory is free.
+    The memory check is skipped when nothing is running so the queue always drains.
+    """
+
+    MEMORY_RECHECK_S = 2.0
+
+    def __init__(self, max_concurrent=FILL_MAX_CONCURRENT, per_user_limit=FILL_PER_USER_LIMIT,
+                 max_queue=FILL_MAX_QUEUE, per_user_queue=FILL_PER_USER_QUEUE, min_free_mb=FILL_MIN_FREE_MB,
+                 memory_probe=available_memory_mb):
+        self.max_concurrent = max_concurrent
+        self.per_user_limit = per_user_limit
+        self.max_queue = max_queue
+        self.per_user_queue = per_user_queue
+        self.min_free_mb = min_free_mb
+        self.memory_probe = memory_probe
+        self._queue = []
+        self._seq = itertools.count()
+        self._running = 0
+        self._user_running = {}
+        self._recheck = None
+
+    def stats(self):
+        return {
+            "running": self._running,
+            "queued": len(self._queue),
+            "max_concurrent": self.max_concurrent,
+            "free_mb": self.memory_probe(),
+        }
+
+    async def acquire(self, user_id, priority=0, on_position=None):
+        """Wait for a slot and return a lease.
+
+        ``on_position(n)`` is awaited whenever the job's 1-based queue position
+        changes, including once right after queueing. Raises SchedulerBusy when
+        the job cannot be queued.
+        """
+        queued_for_user = sum(1 for t in self._queue if t.user_id == user_id)
+        if queued_for_user >= self.per_user_queue:
+            raise SchedulerBusy("You already have a form waiting for a browser.")
+        if len(self._queue) >= self.max_queue:
+            raise SchedulerBusy("All browsers are busy and the waiting line is full.")
+
+        loop = asyncio.get_running_loop()
+        ticket = _Ticket(priority, next(self._seq), user_id, loop.create_future(), on_position)
+        heapq.heappush(self._queue, ticket)
+        self._dispatch()
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.future.done() and not ticket.future.cancelled():
+                # Admitted in the same tick we were cancelled; hand the slot back
+                self._release(user_id)
+            elif ticket in self._queue:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._dispatch()
+            raise
+        return _Lease(self, user_id)
+
+    def try_acquire(self, user_id):
+        """Lease a slot only if one is free right now and nobody is waiting; None otherwise.
+
+        For speculative work, which should use idle capacity but never queue.
+        """
+        if (self._queue or self._running >= self.max_concurrent
+                or self._user_running.get(user_id, 0) >= self.per_user_limit or not self._memory_ok()):
+            return None
+        self._running += 1
+        self._user_running[user_id] = self._user_running.get(user_id, 0) + 1
+        return _Lease(self, user_id)
+
+    def _memory_ok(self):
+        if not self.min_free_mb or self._running == 0:
+            return True
+        free = self.memory_probe()
+        return free is None or free >= self.min_free_mb
+
+    def _release(self, user_id):
+        self._running -= 1
+        left = self._user_running.get(user_id, 1) - 1
+        if left > 0:
+            self._user_running[user_id] = left
+        else:
+            self._user_running.pop(user_id, None)
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._queue and self._running < self.max_concurrent:
+            if not self._memory_ok():
+                # Memory frees up outside our control; poll until it does
+                if self._recheck is None:
+                    loop = asyncio.get_running_loop()
+                    self._recheck = loop.call_later(self.MEMORY_RECHECK_S, self._on_recheck)
+                break
+            ticket = next(
+                (t for t in sorted(self._queue) if self._user_running.get(t.user_id, 0) < self.per_user_limit),
+                None,
+            )
+            if ticket is None:
+                break
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+            self._running += 1
+            self._user_running[ticket.user_id] = self._user_running.get(ticket.user_id, 0) + 1
+            ticket.future.set_result(None)
+        self._notify_positions()
+
+    def _on_recheck(self):
+        self._recheck = None
+        self._dispatch()
+
+    def _notify_positions(self):
+        for position, ticket in enumerate(sorted(self._queue), start=1):
+            if ticket.position != position:
+                ticket.position = position
+                if ticket.on_position is not None:
+                    asyncio.ensure_future(self._call_position(ticket, position))
+
+    @staticmethod
+    async def _call_position(ticket, position):
+        # Stale once admitted or moved again; the caller has newer news to show
+        if ticket.future.done() or ticket.position != position:
+            return
+        try:
+            await ticket.on_position(position)
+        except Exception as e:
+            print(f"⚠️ Queue position update failed: {e}")
@@ -1,5 +1,7 @@
 import asyncio
+from tracing import traced
 
+@traced("extract_form_fields")
 async def extract_form_fields(page):
     """Extract input/textarea/select fields with labels, FROM ALL FRAMES"""
     js_code = """
@@ -1,4 +1,9 @@
 import asyncio
+import re
+from tracing import span, traced
+
+# ids usable as a bare "#id" selector; anything else goes through [id='...']
+SIMPLE_ID_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_-]*$")
 
 KEY_MAP = {
     "date_of_birth": "dob",
@@ -10,46 +15,53 @@ KEY_MAP = {
     "aadhaar": "panAdhaarUserId",
 }
 
-async def autofill_form(page, classified_fields, user_data):
-    filled_count = 0
-    for mapping in classified_fields:
-        field_id = mapping.get("id")
-        field_name = mapping.get("name")
-        category = mapping.get("category")
-        field_frame = mapping.get("frame", "main")
-        data_key = KEY_MAP.get(category, category)
-        value = user_data.get(data_key)
-        if not value:
-            print(f"↪ Skip: no user value for category='{category}' (mapped key='{data_key}')")
-            continue
-        candidates = []
-        if field_id:
-            candidates.append(f"#{field_id}")
-        if field_name:
-            candidates.append(f"[name='{field_name}']")
-        if mapping.get("formcontrolname"):
-            candidates.append(f"[formcontrolname='{mapping['formcontrolname']}']")
-        if mapping.get("placeholder"):
-            candidates.append(f"[placeholder='{mapping['placeholder']}']")
-        if mapping.get("aria_label"):
-            candidates.append(f"[aria-label='{mapping['aria_label']}']")
-        if not candidates:
-            print(f"↪ Skip: no selector candidates for category='{category}'")
-            continue
-        target_frame = page.main_frame
-        if field_frame != "main":
-            for frame in page.frames:
-                if frame.url == field_frame or frame.name == field_frame:
-                    target_frame = frame
-                    break
-        filled_this = False
-        for selector in candidates:
-            try:
+def css_attr(name, value):
+    """Attribute selector with ``value`` quoted, so "Father's name" stays a valid selector."""
+    escaped = str(value).replace("\\", "\\\\").replace("'", "\\'").replace("\n", "\\a ")
+    return f"[{name}='{escaped}']"
+
+async def fill_field(page, mapping, user_data):
+    """Fill one classified field; returns True if a selector matched and was typed into."""
+    field_id = mapping.get("id")
+    field_name = mapping.get("name")
+    category = mapping.get("category")
+    field_frame = mapping.get("frame", "main")
+    data_key = KEY_MAP.get(category, category)
+    value = user_data.get(data_key)
+    if not value:
+        print(f"↪ Skip: no user value for category='{category}' (mapped key='{data_key}')")
+        return False
+    candidates = []
+    if field_id:
+        candidates.append(f"#{field_id}" if SIMPLE_ID_RE.match(field_id) else css_attr("id", field_id))
+    if field_name:
+        candidates.append(css_attr("name", field_name))
+    if mapping.get("formcontrolname"):
+        candidates.append(css_attr("formcontrolname", mapping["formcontrolname"]))
+    if mapping.get("placeholder"):
+        candidates.append(css_attr("placeholder", mapping["placeholder"]))
+    if mapping.get("aria_label"):
+        candidates.append(css_attr("aria-label", mapping["aria_label"]))
+    if not candidates:
+        print(f"↪ Skip: no selector candidates for category='{category}'")
+        return False
+    target_frame = page.main_frame
+    if field_frame != "main":
+        for frame in page.frames:
+            if frame.url == field_frame or frame.name == field_frame:
+                target_frame = frame
+                break
+    filled_this = False
+    for selector in candidates:
+        try:
+            with span("autofill.selector", category=category, selector=selector, frame=field_frame) as s:
                 element = target_frame.locator(selector).first
                 await asyncio.sleep(0.2)
                 if not await element.count():
+                    s.set(result="missing")
                     continue
                 if not await element.is_visible():
+                    s.set(result="hidden")
                     continue
                 await element.click()
                 await asyncio.sleep(0.1)
@@ -59,12 +71,29 @@ async def autofill_form(page, classified_fields, user_data):
                     await element.fill("")
                 await asyncio.sleep(0.1)
                 await element.type(str(value), delay=50)
-                filled_count += 1
-                filled_this = True
-                print(f"✅ Filled '{category}' (mapped '{data_key}') via {selector} in frame {field_frame}")
-                break
-            except Exception as e:
-                print(f"⚠️ Try selector failed for '{category}' via {selector}: {e}")
-        if not filled_this:
-            print(f"❌ Could not fill '{category}' (mapped '{data_key}') — no selector matched")
+                s.set(result="filled")
+            filled_this = True
+            print(f"✅ Filled '{category}' (mapped '{data_key}') via {selector} in frame {field_frame}")
+            break
+        except Exception as e:
+            print(f"⚠️ Try selector failed for '{category}' via {selector}: {e}")
+    if not filled_this:
+        print(f"❌ Could not fill '{category}' (mapped '{data_key}') — no selector matched")
+    return filled_this
+
+@traced("autofill_form")
+async def autofill_form(page, classified_fields, user_data):
+    filled_count = 0
+    for mapping in classified_fields:
+        if await fill_field(page, mapping, user_data):
+            filled_count += 1
+    return filled_count
+
+@traced("autofill_form_stream")
+async def autofill_form_stream(page, mappings, user_data):
+    """Like autofill_form, but consumes an async iterator of mappings as they arrive."""
+    filled_count = 0
+    async for mapping in mappings:
+        if await fill_field(page, mapping, user_data):
+            filled_count += 1
     return filled_count
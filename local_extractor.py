@@ -0,0 +1,276 @@
+"""Deterministic extraction of user details from document text.
+
+Identity documents and simple "Label: value" text files carry most of what the
+bot needs in fixed formats, so precompiled patterns with checksum validation
+(Verhoeff for Aadhaar, PAN and IFSC structure, email, Indian mobile numbers,
+dates) fill those fields without Gemini. ``extract_locally`` also returns the
+text left once every matched span is removed; when that is not empty the
+caller still has Gemini read the whole document, and only the values in
+``VALIDATED_KEYS`` take precedence over its answer.
+"""
+import re
+from datetime import date, datetime
+
+# Verhoeff dihedral group tables (Aadhaar's last digit is a Verhoeff check digit)
+_VERHOEFF_D = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9), (1, 2, 3, 4, 0, 6, 7, 8, 9, 5), (2, 3, 4, 0, 1, 7, 8, 9, 5, 6),
+    (3, 4, 0, 1, 2, 8, 9, 5, 6, 7), (4, 0, 1, 2, 3, 9, 5, 6, 7, 8), (5, 9, 8, 7, 6, 0, 4, 3, 2, 1),
+    (6, 5, 9, 8, 7, 1, 0, 4, 3, 2), (7, 6, 5, 9, 8, 2, 1, 0, 4, 3), (8, 7, 6, 5, 9, 3, 2, 1, 0, 4),
+    (9, 8, 7, 6, 5, 4, 3, 2, 1, 0),
+)
+_VERHOEFF_P = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9), (1, 5, 7, 6, 2, 8, 3, 0, 9, 4), (5, 8, 0, 3, 7, 9, 6, 1, 4, 2),
+    (8, 9, 1, 6, 0, 4, 3, 5, 2, 7), (9, 4, 5, 3, 1, 2, 6, 8, 7, 0), (4, 2, 8, 6, 5, 7, 3, 9, 0, 1),
+    (2, 7, 9, 3, 8, 0, 6, 4, 1, 5), (7, 0, 4, 6, 9, 1, 3, 2, 5, 8),
+)
+
+
+def verhoeff_valid(number):
+    if not number.isdigit():
+        return False
+    c = 0
+    for i, digit in enumerate(reversed(number)):
+        c = _VERHOEFF_D[c][_VERHOEFF_P[i % 8][int(digit)]]
+    return c == 0
+
+
+# 4th PAN character is the holder type (P = person, C = company, ...); a PAN next
+# to a "PAN" label only needs the overall shape
+PAN_RE = re.compile(r"\b[A-Z]{3}[ABCEFGHJLPT][A-Z]\d{4}[A-Z]\b")
+LABELLED_PAN_RE = re.compile(r"\b[A-Z]{5}\d{4}[A-Z]\b")
+IFSC_RE = re.compile(r"\b[A-Z]{4}0[A-Z0-9]{6}\b")
+EMAIL_RE = re.compile(r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b")
+# Unlabelled Aadhaar numbers must be printed in the usual 4-4-4 groups
+AADHAAR_GROUPED_RE = re.compile(r"(?<!\d)[2-9]\d{3}[ -]\d{4}[ -]\d{4}(?!\d)")
+AADHAAR_RE = re.compile(r"(?<!\d)[2-9]\d{3}[ -]?\d{4}[ -]?\d{4}(?!\d)")
+MOBILE_RE = re.compile(r"(?<!\d)(?:\+?91[\s-]?|0)?([6-9]\d{4})[\s-]?(\d{5})(?!\d)")
+INTL_MOBILE_RE = re.compile(r"\+91[\s-]?([6-9]\d{4})[\s-]?(\d{5})(?!\d)")
+YEAR_RE = re.compile(r"\b(19|20)\d{2}\b")
+DIGITS_RE = re.compile(r"\d+")
+GENDER_RE = re.compile(r"\b(male|female|transgender)\b", re.I)
+DOB_INLINE_RE = re.compile(
+    r"\b(?:date of birth|birth date|d\.?o\.?b\.?)\W{0,5}"
+    r"(\d{1,2}[/.-]\d{1,2}[/.-]\d{4}|\d{4}-\d{1,2}-\d{1,2}|\d{1,2}\s+[A-Za-z]{3,9}\.?,?\s+\d{4})",
+    re.I,
+)
+# "Label:" (also "=" or a spaced dash) at the start of a line or after a field
+# delimiter (comma, semicolon, pipe, tab or a wide gap), so several labelled
+# values can share one line; hyphens inside labels such as "E-mail" are kept
+LABEL_RE = re.compile(
+    r"(?:^|(?<=[,;|\t])|(?<=\S\s\s))[ \t]*([A-Za-z][A-Za-z '’/.()-]{0,40}?)[ \t]*(?:[:：=]|[ \t]-[ \t])", re.M
+)
+VALUE_TRIM = " \t,;|"
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d %B %Y", "%d %b %Y", "%B %d %Y", "%b %d %Y")
+
+# Normalized label -> user detail key
+LABEL_ALIASES = {
+    "name": "name", "full name": "name", "applicant name": "name", "candidate name": "name", "holder name": "name",
+    "email": "email", "email id": "email", "email address": "email", "mail id": "email",
+    "mobile": "mobile", "mobile no": "mobile", "mobile number": "mobile", "phone": "mobile", "phone no": "mobile",
+    "phone number": "mobile", "contact number": "mobile", "contact no": "mobile", "mob": "mobile",
+    "date of birth": "dob", "dob": "dob", "birth date": "dob", "d o b": "dob",
+    "pan": "pan", "pan no": "pan", "pan number": "pan", "permanent account number": "pan",
+    "aadhaar": "aadhaar", "aadhaar no": "aadhaar", "aadhaar number": "aadhaar", "aadhar": "aadhaar",
+    "aadhar no": "aadhaar", "aadhar number": "aadhaar", "uid": "aadhaar",
+    "address": "address", "residential address": "address", "permanent address": "address",
+    "gender": "gender", "sex": "gender",
+    "fathers name": "father_name", "father name": "father_name",
+    "mothers name": "mother_name", "mother name": "mother_name",
+    "occupation": "occupation", "profession": "occupation",
+    "annual income": "annual_income", "income": "annual_income",
+    "bank account": "bank_account", "account number": "bank_account", "account no": "bank_account",
+    "ac no": "bank_account", "bank account number": "bank_account",
+    "ifsc": "ifsc_code", "ifsc code": "ifsc_code",
+    "emergency contact": "emergency_contact", "emergency contact number": "emergency_contact",
+    "blood group": "blood_group",
+    "marital status": "marital_status",
+    "qualification": "qualification", "education": "qualification",
+    "institution": "institution", "college": "institution", "university": "institution",
+    "passing year": "passing_year", "year of passing": "passing_year",
+    "percentage": "percentage", "cgpa": "percentage",
+    "work experience": "work_experience", "experience": "work_experience",
+    "skills": "skills", "languages": "languages", "languages known": "languages", "hobbies": "hobbies",
+    "achievements": "achievements", "certifications": "certifications", "projects": "projects",
+    "references": "references", "notes": "notes",
+}
+
+# Keys whose local value passed a checksum or structural check; these win over
+# Gemini's answer, everything else found locally is only a fallback for it
+VALIDATED_KEYS = frozenset({
+    "panAdhaarUserId", "email", "mobile", "emergency_contact", "dob", "ifsc_code", "bank_account", "passing_year",
+})
+
+# Section headings and ID card boilerplate that carry no details of their own
+BOILERPLATE = {
+    "personal information", "personal details", "contact details", "education", "educational details",
+    "work experience", "additional details", "additional information", "other details",
+    "income tax department", "govt of india", "government of india", "permanent account number card",
+    "permanent account number",
+    "signature", "unique identification authority of india", "aadhaar", "mera aadhaar meri pehchaan",
+}
+BOILERPLATE_RE = re.compile(r"\b(?:%s)\b" % "|".join(sorted(map(re.escape, BOILERPLATE), key=len, reverse=True)))
+
+
+def _normalize_label(label):
+    return " ".join(re.sub(r"[^a-z0-9 ]", "", label.lower().replace("’", "'").replace("'s", "s")).split())
+
+
+def parse_date(value):
+    """ISO date (YYYY-MM-DD) for the common Indian date spellings, or None."""
+    value = " ".join(value.replace(",", " ").split())
+    for fmt in DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+        if date(1900, 1, 1) <= parsed <= date.today():
+            return parsed.isoformat()
+    return None
+
+
+def normalize_mobile(value):
+    m = MOBILE_RE.search(value)
+    return m.group(1) + m.group(2) if m else None
+
+
+def normalize_aadhaar(value):
+    m = AADHAAR_RE.search(value)
+    if not m:
+        return None
+    digits = "".join(DIGITS_RE.findall(m.group(0)))
+    return digits if verhoeff_valid(digits) else None
+
+
+def _clean(kind, value):
+    """The validated value for a labelled field, or None when it does not check out."""
+    if kind == "email":
+        m = EMAIL_RE.search(value)
+        return m.group(0) if m else None
+    if kind in ("mobile", "emergency_contact"):
+        return normalize_mobile(value)
+    if kind == "dob":
+        return parse_date(value)
+    if kind == "pan":
+        m = LABELLED_PAN_RE.search(value.upper())
+        return m.group(0) if m else None
+    if kind == "aadhaar":
+        return normalize_aadhaar(value)
+    if kind == "ifsc_code":
+        m = IFSC_RE.search(value.upper())
+        return m.group(0) if m else None
+    if kind == "bank_account":
+        digits = "".join(DIGITS_RE.findall(value))
+        return digits if 9 <= len(digits) <= 18 else None
+    if kind == "passing_year":
+        m = YEAR_RE.search(value)
+        return m.group(0) if m else None
+    return value or None
+
+
+def _is_boilerplate(line):
+    # Non-Latin lines (e.g. the Hindi half of a card) are dropped along with headings;
+    # stray numbers of three or more digits still count as content
+    return not re.search(r"[a-z]|\d{3}", BOILERPLATE_RE.sub("", _normalize_label(line)))
+
+
+def _blank(text, start, end):
+    """``text`` with ``[start, end)`` overwritten by spaces; line breaks stay so lines keep their numbers."""
+    return text[:start] + re.sub(r"[^\n]", " ", text[start:end]) + text[end:]
+
+
+def _labelled_values(text):
+    """Yield (kind, value, start, end) for every known "Label: value" pair.
+
+    A value runs to the next known label on the same line, or to the line end.
+    """
+    for line_match in re.finditer(r"[^\n]+", text):
+        line, offset = line_match.group(0), line_match.start()
+        labels = [
+            (m, kind) for m in LABEL_RE.finditer(line)
+            for kind in [LABEL_ALIASES.get(_normalize_label(m.group(1)))] if kind
+        ]
+        for n, (m, kind) in enumerate(labels):
+            end = labels[n + 1][0].start() if n + 1 < len(labels) else len(line)
+            raw = line[m.end():end]
+            value = raw.strip(VALUE_TRIM)
+            if value:
+                # Span covers the label and its value, not the delimiter before the next label
+                yield kind, value, offset + m.start(), offset + m.end() + len(raw.rstrip(VALUE_TRIM))
+
+
+def extract_locally(text):
+    """Return (details, leftover): fields found by pattern, and the text no match explained.
+
+    Only the matched spans are removed, so a record on one line (a spreadsheet
+    row, "Name: ..., Address: ...") keeps its other values in ``leftover``.
+    ``leftover`` is empty when nothing but labels, matched values, delimiters
+    and boilerplate remained, in which case there is nothing left for Gemini.
+    """
+    found = {}
+    ids = {}
+    spans = []  # labelled pairs consumed, as (start, end) offsets into text
+
+    for kind, raw, start, end in _labelled_values(text):
+        value = _clean(kind, raw)
+        if not value:
+            continue
+        if kind in ("pan", "aadhaar"):
+            ids.setdefault(kind, value)
+        else:
+            found.setdefault(kind, value)
+        spans.append((start, end))
+
+    # Unlabelled identifiers and contacts, as printed on ID cards and letters,
+    # looked for only in the text the labels did not explain
+    rest = text
+    for start, end in spans:
+        rest = _blank(rest, start, end)
+    if "pan" not in ids:
+        m = PAN_RE.search(rest.upper())
+        if m:
+            ids["pan"] = m.group(0)
+            rest = _blank(rest, *m.span())
+    if "aadhaar" not in ids:
+        for m in AADHAAR_GROUPED_RE.finditer(rest):
+            digits = "".join(DIGITS_RE.findall(m.group(0)))
+            if verhoeff_valid(digits):
+                ids["aadhaar"] = digits
+                rest = _blank(rest, *m.span())
+                break
+    if "email" not in found:
+        m = EMAIL_RE.search(rest)
+        if m:
+            found["email"] = m.group(0)
+            rest = _blank(rest, *m.span())
+    if "mobile" not in found:
+        m = INTL_MOBILE_RE.search(rest)
+        if m:
+            found["mobile"] = m.group(1) + m.group(2)
+            rest = _blank(rest, *m.span())
+    if "ifsc_code" not in found:
+        m = IFSC_RE.search(rest.upper())
+        if m:
+            found["ifsc_code"] = m.group(0)
+            rest = _blank(rest, *m.span())
+    if "dob" not in found:
+        m = DOB_INLINE_RE.search(rest)
+        if m and parse_date(m.group(1)):
+            found["dob"] = parse_date(m.group(1))
+            rest = _blank(rest, *m.span())
+    if "gender" not in found:
+        matches = list(GENDER_RE.finditer(rest))
+        genders = {m.group(1).lower() for m in matches}
+        if len(genders) == 1:
+            found["gender"] = genders.pop()
+            for m in matches:
+                rest = _blank(rest, *m.span())
+
+    # PAN is the usual portal user id; Aadhaar stands in when there is no PAN
+    if ids:
+        found["panAdhaarUserId"] = ids.get("pan") or ids["aadhaar"]
+
+    leftover = "\n".join(
+        line.strip() for line in rest.split("\n")
+        if re.search(r"[A-Za-z0-9]", line) and not _is_boilerplate(line)
+    )
+    return found, leftover
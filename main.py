@@ -6,12 +6,19 @@ import tempfile
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ApplicationBuilder, MessageHandler, CommandHandler, CallbackQueryHandler, ContextTypes, filters
 import google.generativeai as genai
-from config import GEMINI_API_KEY, TELEGRAM_TOKEN
+from config import GEMINI_API_KEY, TELEGRAM_TOKEN, METRICS_PORT, PREWARM_ENABLED, STREAM_CLASSIFICATION, DOC_IN_MEMORY_MAX_MB
 from browser_utils import launch_browser
 from form_extractor import extract_form_fields
-from field_classifier import classify_fields_with_gemini
-from form_filler import autofill_form
+from field_classifier import ClassificationBatcher, stream_classified_fields
+from form_filler import autofill_form, autofill_form_stream
 from document_processor import DocumentProcessor
+from url_extractor.model_router import get_model_router
+from url_extractor.session_vault import get_session_vault
+from url_extractor.verify import site_of
+from tracing import span, trace_context, start_metrics_server
+from fill_scheduler import FillScheduler, SchedulerBusy
+from pending_store import PendingStore
+from prewarm import PrewarmSlots
 
 # ── Load forms DB and users DB ──
 with open("forms.json", "r") as f:
@@ -19,7 +26,8 @@ with open("forms.json", "r") as f:
 with open("users.json", "r") as f:
     users_db = json.load(f)
 
-pending_requests = {}
+# Requests waiting for their inline button; expire after PENDING_TTL_S and survive restarts
+pending_requests = PendingStore()
 
 # Helper: wait until the browser page is closed or a timeout elapses
 async def wait_until_page_closed(page, timeout: int = 300):
@@ -30,10 +38,23 @@ async def wait_until_page_closed(page, timeout: int = 300):
         pass
 
 genai.configure(api_key=GEMINI_API_KEY)
-gemini_model = genai.GenerativeModel('gemini-2.5-flash')
+# Each Gemini call picks its model tier (MODEL_TIERS) by input size and recent errors
+model_router = get_model_router()
+
+# Concurrent non-streamed fills (STREAM_CLASSIFICATION=0) share Gemini calls for classification (see CLASSIFY_BATCH_WINDOW_MS)
+classification_batcher = ClassificationBatcher(model_router)
 
 # Initialize document processor
-document_processor = DocumentProcessor(gemini_model)
+document_processor = DocumentProcessor(model_router)
+
+# Encrypted store of login sessions, reused across fills of the same portal
+session_vault = get_session_vault()
+
+# Bounds how many fill browsers run at once; extra button presses wait in line
+fill_scheduler = FillScheduler()
+
+# Forms opened speculatively in handle_message, claimed by button_handler
+prewarm_slots = PrewarmSlots()
 
 def save_users_db():
     """Safely save users database to file"""
@@ -143,14 +164,20 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Download the file
         file = await context.bot.get_file(document.file_id)
         
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
-            await file.download_to_drive(temp_file.name)
-            temp_file_path = temp_file.name
+        # Small uploads stay in memory; only large ones are spooled to disk
+        temp_file_path = None
+        if document.file_size and document.file_size <= DOC_IN_MEMORY_MAX_MB * 1024 * 1024:
+            source = await file.download_as_bytearray()
+        else:
+            with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
+                await file.download_to_drive(temp_file.name)
+                temp_file_path = temp_file.name
+            source = temp_file_path
         
         try:
             # Process the document
-            result = document_processor.process_document(temp_file_path, file_extension)
+            with trace_context(f"doc_{telegram_id}_{int(time.time())}"):
+                result = document_processor.process_document(source, file_extension)
             
             if "error" in result:
                 await processing_msg.edit_text(
@@ -247,11 +274,12 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 )
         
         finally:
-            # Clean up temporary file
-            try:
-                os.unlink(temp_file_path)
-            except Exception:
-                pass
+            # Clean up the spooled file, if any
+            if temp_file_path:
+                try:
+                    os.unlink(temp_file_path)
+                except Exception:
+                    pass
     
     except Exception as e:
         await processing_msg.edit_text(
@@ -260,6 +288,73 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"Please try again or contact support if the problem persists."
         )
 
+async def close_browser(p, browser):
+    try:
+        if browser:
+            await browser.close()
+    except Exception:
+        pass
+    try:
+        if p:
+            await p.stop()
+    except Exception:
+        pass
+
+async def open_form_page(url: str, form_key: str, user_id, site: str, classify: bool = True) -> dict:
+    """Launch the fill browser on url, wait for fields and (optionally) classify them.
+
+    The browser is closed again if anything fails or the caller is cancelled.
+    """
+    p = browser = None
+    try:
+        p, browser, browser_context, page = await launch_browser(
+            allow=forms.get(form_key, {}).get("allow_resources"),
+            storage_state=session_vault.load(user_id, site)
+        )
+        async with span("page.goto", url=url):
+            await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+        async with span("page.readiness") as ready:
+            await asyncio.sleep(5)
+            for attempt in range(10):
+                fields = await extract_form_fields(page)
+                if fields:
+                    break
+                await asyncio.sleep(1)
+            ready.set(attempts=attempt + 1, fields=len(fields))
+        print(f"\n📄 INITIAL: Extracted {len(fields)} fields")
+        classified = None
+        if classify:
+            # Batched with other fills and run off the event loop so other chats are not stalled
+            classified = await classification_batcher.classify(fields)
+            print(f"\n🤖 Classified {len(classified)} fields")
+        return {
+            "p": p, "browser": browser, "browser_context": browser_context, "page": page,
+            "fields": fields, "classified": classified
+        }
+    except BaseException:
+        await close_browser(p, browser)
+        raise
+
+async def prewarm_form(request_id: str, lease, url: str, form_key: str, user_id):
+    """Open the form before the button is tapped, holding a scheduler slot.
+
+    Classification waits for the tap, so an ignored button costs no Gemini call.
+    """
+    try:
+        async with trace_context(request_id), span("prewarm", form_key=form_key):
+            job = await open_form_page(url, form_key, user_id, site_of(url), classify=False)
+    except BaseException:
+        lease.release()
+        raise
+    job["lease"] = lease
+    return job
+
+async def discard_prewarmed(job: dict):
+    try:
+        await close_browser(job["p"], job["browser"])
+    finally:
+        job["lease"].release()
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     telegram_id = update.message.from_user.id
     user_text = update.message.text
@@ -272,13 +367,21 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not user_data:
         await update.message.reply_text("❌ Your user data is not in the database.")
         return
-    request_id = f"{telegram_id}_{int(time.time())}"
-    pending_requests[request_id] = {
+    # Only the user id is kept; the profile is read fresh when the button is pressed
+    request_id = pending_requests.add({
         "url": url,
         "form_key": form_key,
-        "user_data": user_data,
+        "telegram_id": telegram_id,
         "chat_id": chat_id
-    }
+    })
+    # Use idle browser capacity to load the form while the user reads the reply
+    if PREWARM_ENABLED:
+        lease = fill_scheduler.try_acquire(telegram_id)
+        if lease is not None:
+            prewarm_slots.start(
+                request_id, prewarm_form(request_id, lease, url, form_key, telegram_id),
+                owner=telegram_id, on_discard=discard_prewarmed
+            )
     keyboard = [
         [InlineKeyboardButton("🚀 Open & Auto-Fill Form", callback_data=f"fill_{request_id}")]
     ]
@@ -297,57 +400,95 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not callback_data.startswith("fill_"):
         return
     request_id = callback_data.replace("fill_", "")
-    if request_id not in pending_requests:
+    request = pending_requests.get(request_id)
+    if request is None:
         await query.edit_message_text("❌ Request expired or invalid.")
         return
-    request = pending_requests[request_id]
-    url = request["url"]
-    user_data = request["user_data"]
-    form_key = request["form_key"]
-    await query.edit_message_text(
-        f"🔄 Opening browser for: **{form_key}**\n"
-        f"Please wait..."
-    )
-    try:
-        p, browser, browser_context, page = await launch_browser()
-        await page.goto(url, wait_until="domcontentloaded", timeout=60000)
-        await asyncio.sleep(5)
-        for attempt in range(10):
-            fields = await extract_form_fields(page)
-            if fields:
-                break
-            await asyncio.sleep(1)
-        print(f"\n📄 INITIAL: Extracted {len(fields)} fields")
-        classified = classify_fields_with_gemini(fields, gemini_model)
-        print(f"\n🤖 Classified {len(classified)} fields")
-        filled_count = await autofill_form(page, classified, user_data)
-        await context.bot.send_message(
-            chat_id=request["chat_id"],
-            text=f"✅ Form auto-filled!\n"
-                 f"📊 Filled {filled_count} fields.\n\n"
-                 f"👀 Please review the form in the browser and submit manually.\n"
-                 f"The browser will stay open for up to 5 minutes, or closes sooner if you exit the window."
-        )
-        # Do not block for a fixed sleep; wait until the user closes the page or timeout
-        await wait_until_page_closed(page, timeout=300)
-        try:
-            await browser.close()
-        except Exception:
-            pass
-        try:
-            await p.stop()
-        except Exception:
-            pass
-    except Exception as e:
-        error_msg = f"❌ Error filling form: {str(e)}"
-        print(error_msg)
-        await context.bot.send_message(
-            chat_id=request["chat_id"],
-            text=error_msg
-        )
-    del pending_requests[request_id]
+    user_data = next((u for u in users_db if u["telegram_id"] == request["telegram_id"]), None)
+    if not user_data:
+        await query.edit_message_text("❌ Your user data is not in the database.")
+        return
+    async with trace_context(request_id), span("button_handler", form_key=request["form_key"]):
+        url = request["url"]
+        form_key = request["form_key"]
+        user_id = user_data.get("telegram_id")
+
+        async def show_queue_position(position):
+            await query.edit_message_text(
+                f"⏳ All browsers are busy. You are #{position} in line for **{form_key}**.\n"
+                f"I'll open the form as soon as a browser frees up."
+            )
+
+        # A prewarm of another request by this user would hold their slot; free it
+        prewarm_slots.discard_owner(user_id, keep=request_id)
+        if prewarm_slots.pending(request_id):
+            await query.edit_message_text(f"⏳ **{form_key}** is still loading, one moment...")
+        job = await prewarm_slots.claim(request_id)
+        if job is not None:
+            lease = job["lease"]
+        else:
+            try:
+                lease = await fill_scheduler.acquire(
+                    user_id, priority=forms.get(form_key, {}).get("priority", 0), on_position=show_queue_position
+                )
+            except SchedulerBusy as e:
+                # Keep the request so the button still works once load drops
+                await query.edit_message_text(f"🚦 {e}\nPlease tap the button again in a few minutes.")
+                return
+        async with lease:
+            if job is not None:
+                await query.edit_message_text(f"⚡ **{form_key}** is already open, filling it now...")
+            else:
+                await query.edit_message_text(
+                    f"🔄 Opening browser for: **{form_key}**\n"
+                    f"Please wait..."
+                )
+            site = site_of(url)
+            try:
+                if job is None:
+                    job = await open_form_page(url, form_key, user_id, site, classify=not STREAM_CLASSIFICATION)
+                page = job["page"]
+                if job["classified"] is None and not STREAM_CLASSIFICATION:
+                    # Prewarmed pages are classified only now that the user asked
+                    job["classified"] = await classification_batcher.classify(job["fields"])
+                if job["classified"] is None:
+                    # Type each field as soon as Gemini has classified it
+                    mappings = stream_classified_fields(job["fields"], model_router)
+                    filled_count = await autofill_form_stream(page, mappings, user_data)
+                else:
+                    filled_count = await autofill_form(page, job["classified"], user_data)
+                await context.bot.send_message(
+                    chat_id=request["chat_id"],
+                    text=f"✅ Form auto-filled!\n"
+                         f"📊 Filled {filled_count} fields.\n\n"
+                         f"👀 Please review the form in the browser and submit manually.\n"
+                         f"The browser will stay open for up to 5 minutes, or closes sooner if you exit the window."
+                )
+                # Do not block for a fixed sleep; wait until the user closes the page or timeout
+                async with span("page.wait_for_close"):
+                    await wait_until_page_closed(page, timeout=300)
+                # Keep any login the user completed so the next fill of this portal skips it
+                try:
+                    session_vault.save(user_id, site, await job["browser_context"].storage_state())
+                except Exception as e:
+                    print(f"⚠️ Could not save session for {site}: {e}")
+            except Exception as e:
+                error_msg = f"❌ Error filling form: {str(e)}"
+                print(error_msg)
+                await context.bot.send_message(
+                    chat_id=request["chat_id"],
+                    text=error_msg
+                )
+            finally:
+                # Close before the slot is released so the next job gets the memory back
+                if job is not None:
+                    await close_browser(job["p"], job["browser"])
+    pending_requests.pop(request_id)
 
 if __name__ == "__main__":
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+
     # Enable concurrent handling of updates so a long-running fill does not block new messages
     app = ApplicationBuilder().token(TELEGRAM_TOKEN).concurrent_updates(True).build()
     
@@ -0,0 +1,118 @@
+"""Pending fill requests waiting for their inline button to be pressed.
+
+Entries expire after a TTL. A min-heap of (expires_at, request_id) makes each
+expiry O(log n), and sweeps run on every access so abandoned requests don't
+pile up. With a database path the store is mirrored to SQLite and reloaded on
+start, so buttons sent before a restart keep working.
+"""
+import heapq
+import json
+import secrets
+import sqlite3
+import time
+
+from config import PENDING_TTL_S, PENDING_MAX_ENTRIES, PENDING_DB_PATH
+
+# Telegram limits callback_data to 64 bytes; "fill_" + 16 chars stays well inside it
+ID_BYTES = 12
+
+
+class PendingStore:
+    def __init__(self, ttl_s=PENDING_TTL_S, max_entries=PENDING_MAX_ENTRIES, db_path=PENDING_DB_PATH):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._entries = {}
+        self._heap = []
+        self._db = None
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS pending (id TEXT PRIMARY KEY, expires_at REAL, payload TEXT)"
+                )
+                self._db.commit()
+                self._load()
+            except Exception as e:
+                print(f"⚠️ Pending store database unavailable, keeping requests in memory only: {e}")
+                self._db = None
+
+    def _load(self):
+        now = time.time()
+        self._db.execute("DELETE FROM pending WHERE expires_at <= ?", (now,))
+        self._db.commit()
+        for request_id, expires_at, payload in self._db.execute("SELECT id, expires_at, payload FROM pending"):
+            try:
+                self._entries[request_id] = (expires_at, json.loads(payload))
+            except Exception:
+                continue
+            self._heap.append((expires_at, request_id))
+        heapq.heapify(self._heap)
+        if self._entries:
+            print(f"📥 Restored {len(self._entries)} pending requests")
+
+    def _new_id(self):
+        while True:
+            request_id = secrets.token_urlsafe(ID_BYTES)
+            if request_id not in self._entries:
+                return request_id
+
+    def _drop(self, request_ids):
+        for request_id in request_ids:
+            self._entries.pop(request_id, None)
+        if self._db is not None and request_ids:
+            self._db.executemany("DELETE FROM pending WHERE id = ?", [(r,) for r in request_ids])
+            self._db.commit()
+
+    def sweep(self, now=None):
+        """Drop expired entries; returns how many were removed."""
+        now = time.time() if now is None else now
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, request_id = heapq.heappop(self._heap)
+            entry = self._entries.get(request_id)
+            # Heap items for popped or re-added ids are stale; only the live expiry counts
+            if entry is not None and entry[0] == expires_at:
+                expired.append(request_id)
+        self._drop(expired)
+        return len(expired)
+
+    def _evict_oldest(self):
+        while self._heap and len(self._entries) >= self.max_entries:
+            expires_at, request_id = heapq.heappop(self._heap)
+            entry = self._entries.get(request_id)
+            if entry is not None and entry[0] == expires_at:
+                self._drop([request_id])
+
+    def add(self, record, ttl_s=None):
+        """Store a JSON-serialisable record and return its new request id."""
+        self.sweep()
+        self._evict_oldest()
+        request_id = self._new_id()
+        expires_at = time.time() + (ttl_s or self.ttl_s)
+        self._entries[request_id] = (expires_at, record)
+        heapq.heappush(self._heap, (expires_at, request_id))
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pending (id, expires_at, payload) VALUES (?, ?, ?)",
+                (request_id, expires_at, json.dumps(record, default=str)),
+            )
+            self._db.commit()
+        return request_id
+
+    def get(self, request_id):
+        """The live record for request_id, or None if unknown or expired."""
+        self.sweep()
+        entry = self._entries.get(request_id)
+        return entry[1] if entry else None
+
+    def pop(self, request_id):
+        record = self.get(request_id)
+        if record is not None:
+            self._drop([request_id])
+        return record
+
+    def __contains__(self, request_id):
+        return self.get(request_id) is not None
+
+    def __len__(self):
+        return len(self._entries)
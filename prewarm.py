@@ -0,0 +1,84 @@
+"""Short-lived slots for work started before the user asks for it.
+
+handle_message starts opening the matched form right away; button_handler claims
+the result by request_id. Unclaimed results are handed to ``on_discard`` once the
+TTL passes (or when the owner starts something else), and still-running work is
+cancelled.
+"""
+import asyncio
+import inspect
+
+from config import PREWARM_TTL_S
+
+
+class _Slot:
+    __slots__ = ("task", "owner", "on_discard", "timer")
+
+    def __init__(self, task, owner, on_discard, timer):
+        self.task = task
+        self.owner = owner
+        self.on_discard = on_discard
+        self.timer = timer
+
+
+class PrewarmSlots:
+    def __init__(self, ttl_s=PREWARM_TTL_S):
+        self.ttl_s = ttl_s
+        self._slots = {}
+        self.hits = 0
+        self.misses = 0
+
+    def start(self, key, coro, owner=None, on_discard=None):
+        """Run ``coro`` in the background and keep its result under ``key``."""
+        self.discard(key)
+        loop = asyncio.get_running_loop()
+        task = asyncio.ensure_future(coro)
+        timer = loop.call_later(self.ttl_s, self.discard, key)
+        self._slots[key] = _Slot(task, owner, on_discard, timer)
+
+    async def claim(self, key):
+        """Take the result for ``key``, waiting if it is still being prepared.
+
+        Returns None when nothing was started, the work failed or it expired.
+        """
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            self.misses += 1
+            return None
+        slot.timer.cancel()
+        try:
+            result = await slot.task
+        except (Exception, asyncio.CancelledError) as e:
+            print(f"⚠️ Prewarm for {key} unusable: {e!r}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def pending(self, key):
+        """True while the work for ``key`` is still running."""
+        slot = self._slots.get(key)
+        return slot is not None and not slot.task.done()
+
+    def discard(self, key):
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return
+        slot.timer.cancel()
+        if not slot.task.done():
+            # The work itself cleans up whatever it had opened when cancelled
+            slot.task.cancel()
+            return
+        if slot.task.cancelled() or slot.task.exception() is not None or slot.on_discard is None:
+            return
+        outcome = slot.on_discard(slot.task.result())
+        if inspect.isawaitable(outcome):
+            asyncio.ensure_future(outcome)
+
+    def discard_owner(self, owner, keep=None):
+        """Drop every slot started for ``owner`` except ``keep``."""
+        for key in [k for k, s in self._slots.items() if s.owner == owner and k != keep]:
+            self.discard(key)
+
+    def __contains__(self, key):
+        return key in self._slots
@@ -0,0 +1,99 @@
+"""Unit tests for streamed classification parsing (run with: python -m pytest test_classification_stream.py)"""
+from field_classifier import JsonArrayStreamParser, decode_classification
+
+ANSWER = '[{"i": 0, "c": "name"}, {"i": 1, "c": "email"}, {"i": 2, "c": "mobile"}]'
+
+
+def feed_all(parser, pieces):
+    out = []
+    for piece in pieces:
+        out.extend(parser.feed(piece))
+    return out
+
+
+def test_whole_answer_in_one_chunk():
+    parser = JsonArrayStreamParser()
+    assert [o["i"] for o in parser.feed(ANSWER)] == [0, 1, 2]
+    assert parser.done
+
+
+def test_every_chunk_boundary_gives_the_same_objects():
+    for cut in range(1, len(ANSWER)):
+        parser = JsonArrayStreamParser()
+        out = feed_all(parser, [ANSWER[:cut], ANSWER[cut:]])
+        assert [o["c"] for o in out] == ["name", "email", "mobile"], cut
+        assert parser.done
+
+
+def test_single_character_chunks():
+    parser = JsonArrayStreamParser()
+    assert len(feed_all(parser, list(ANSWER))) == 3
+    assert parser.done
+
+
+def test_objects_are_returned_as_soon_as_they_close():
+    parser = JsonArrayStreamParser()
+    assert parser.feed('[{"i": 0, "c": "na') == []
+    assert parser.feed('me"}, {"i"') == [{"i": 0, "c": "name"}]
+    assert not parser.done
+
+
+def test_brackets_and_escapes_inside_strings():
+    text = r'[{"i": 0, "c": "a}]\"[{", "x": "back\\"}, {"i": 1, "c": "b"}]'
+    for cut in range(1, len(text)):
+        parser = JsonArrayStreamParser()
+        out = feed_all(parser, [text[:cut], text[cut:]])
+        assert [o["i"] for o in out] == [0, 1], cut
+        assert out[0]["c"] == 'a}]"[{'
+        assert out[0]["x"] == "back\\"
+
+
+def test_code_fence_before_the_array_is_skipped():
+    parser = JsonArrayStreamParser()
+    out = feed_all(parser, ["```json\n", ANSWER, "\n```"])
+    assert len(out) == 3
+    assert parser.done
+
+
+def test_nested_values_stay_inside_their_object():
+    parser = JsonArrayStreamParser()
+    out = parser.feed('[{"i": 0, "c": "name", "extra": {"a": [1, {"b": 2}]}}]')
+    assert out == [{"i": 0, "c": "name", "extra": {"a": [1, {"b": 2}]}}]
+
+
+def test_truncated_stream_is_not_done():
+    parser = JsonArrayStreamParser()
+    out = parser.feed('[{"i": 0, "c": "name"}, {"i": 1, "c": "em')
+    assert out == [{"i": 0, "c": "name"}]
+    assert not parser.done
+
+
+def test_malformed_object_is_skipped():
+    parser = JsonArrayStreamParser()
+    out = parser.feed('[{"i": 0, "c": name}, {"i": 1, "c": "email"}]')
+    assert out == [{"i": 1, "c": "email"}]
+    assert parser.done
+
+
+def test_input_after_the_array_is_ignored():
+    parser = JsonArrayStreamParser()
+    parser.feed(ANSWER)
+    assert parser.feed('[{"i": 5, "c": "x"}]') == []
+
+
+def test_decode_accepts_string_indices_and_rejects_the_rest():
+    fields = [{"id": "a"}, {"id": "b"}]
+    out = decode_classification([
+        {"i": "1", "c": "email"},
+        {"i": True, "c": "x"},
+        {"i": 7, "c": "y"},
+        {"i": 0},
+        "junk",
+    ], fields)
+    assert out == [{"id": "b", "category": "email"}]
+
+
+def test_decode_keeps_the_older_id_name_shape():
+    fields = [{"id": "a", "name": "n", "frame": "main"}]
+    out = decode_classification([{"id": "a", "name": "n", "category": "name"}], fields)
+    assert out == [{"id": "a", "name": "n", "frame": "main", "category": "name"}]
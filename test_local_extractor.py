@@ -0,0 +1,96 @@
+"""Unit tests for local_extractor (run with: python -m pytest test_local_extractor.py)"""
+import pandas as pd
+
+from local_extractor import PAN_RE, extract_locally, normalize_aadhaar, parse_date, verhoeff_valid
+
+VALID_AADHAAR = "234123412346"
+
+
+def test_verhoeff_accepts_valid_check_digits():
+    assert verhoeff_valid("2363")
+    assert verhoeff_valid(VALID_AADHAAR)
+
+
+def test_verhoeff_rejects_wrong_digit_and_transposition():
+    assert not verhoeff_valid("2364")
+    assert not verhoeff_valid("234123412347")
+    assert not verhoeff_valid("324123412346")
+    assert not verhoeff_valid("2341 2341 2346")
+
+
+def test_aadhaar_normalized_only_when_checksum_holds():
+    assert normalize_aadhaar("2341 2341 2346") == VALID_AADHAAR
+    assert normalize_aadhaar("2341-2341-2347") is None
+    # Aadhaar numbers never start with 0 or 1
+    assert normalize_aadhaar("1341 2341 2346") is None
+
+
+def test_unlabelled_pan_requires_known_holder_type():
+    assert PAN_RE.search("ABCPK1234F")
+    assert PAN_RE.search("AAACT1234Q")
+    assert not PAN_RE.search("ABCDE1234F")
+    assert not PAN_RE.search("ABCXK1234F")
+
+
+def test_labelled_pan_only_needs_the_shape():
+    found, _ = extract_locally("PAN Number: ABCDE1234F")
+    assert found["panAdhaarUserId"] == "ABCDE1234F"
+    found, leftover = extract_locally("PAN: ABCD1234F")
+    assert "panAdhaarUserId" not in found
+    assert "ABCD1234F" in leftover
+
+
+def test_parse_date_formats():
+    assert parse_date("1990-05-15") == "1990-05-15"
+    assert parse_date("15/05/1990") == "1990-05-15"
+    assert parse_date("15-05-1990") == "1990-05-15"
+    assert parse_date("15.05.1990") == "1990-05-15"
+    assert parse_date("15 May 1990") == "1990-05-15"
+    assert parse_date("15 Sep 1990") == "1990-09-15"
+    assert parse_date("May 15, 1990") == "1990-05-15"
+
+
+def test_parse_date_rejects_invalid_and_out_of_range():
+    assert parse_date("31/02/1990") is None
+    assert parse_date("15/05/1890") is None
+    assert parse_date("15/05/2999") is None
+    assert parse_date("not a date") is None
+
+
+def test_label_values_stop_at_the_next_label():
+    found, leftover = extract_locally("Name: Ravi Kumar, Email: ravi@example.com, Address: 12 MG Road Pune")
+    assert found["name"] == "Ravi Kumar"
+    assert found["email"] == "ravi@example.com"
+    assert found["address"] == "12 MG Road Pune"
+    assert leftover == ""
+
+
+def test_unknown_labels_stay_inside_the_value():
+    found, _ = extract_locally("Address: Flat 3, Block: B, Pune - 411001 | Mobile: 9876543210")
+    assert found["address"] == "Flat 3, Block: B, Pune - 411001"
+    assert found["mobile"] == "9876543210"
+
+
+def test_tabular_row_keeps_unmatched_cells():
+    df = pd.DataFrame([{
+        "Name": "Ravi Kumar", "Email": "ravi@example.com", "Address": "12 MG Road Pune", "Occupation": "Engineer",
+    }])
+    found, leftover = extract_locally(df.to_string())
+    assert found["email"] == "ravi@example.com"
+    assert "ravi@example.com" not in leftover
+    for cell in ("Ravi Kumar", "12 MG Road Pune", "Engineer"):
+        assert cell in leftover
+
+
+def test_id_card_leaves_only_the_name():
+    text = "INCOME TAX DEPARTMENT GOVT. OF INDIA\nRAVI KUMAR\nDate of Birth\n15/05/1990\nABCPK1234F\nSignature"
+    found, leftover = extract_locally(text)
+    assert found == {"dob": "1990-05-15", "panAdhaarUserId": "ABCPK1234F"}
+    assert leftover == "RAVI KUMAR"
+
+
+def test_invalid_labelled_value_is_left_for_gemini():
+    found, leftover = extract_locally("Mobile: N/A\nAadhaar: 2341 2341 2347")
+    assert "mobile" not in found
+    assert "panAdhaarUserId" not in found
+    assert "N/A" in leftover
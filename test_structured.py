@@ -0,0 +1,85 @@
+"""Unit tests for url_extractor.structured (run with: python -m pytest test_structured.py)"""
+import pytest
+
+from url_extractor.structured import MalformedResponse, parse_structured, validate
+
+ITEMS = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"i": {"type": "integer"}, "c": {"type": "string", "enum": ["name", "email"]}},
+        "required": ["i", "c"],
+    },
+}
+DETAILS = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string", "nullable": True},
+        "score": {"type": "number", "nullable": True},
+        "ok": {"type": "boolean", "nullable": True},
+    },
+}
+
+
+def test_plain_json():
+    assert parse_structured('[{"i": 0, "c": "name"}]', ITEMS) == [{"i": 0, "c": "name"}]
+
+
+def test_code_fence_and_prose_are_stripped():
+    text = 'Here you go:\n```json\n[{"i": 0, "c": "name"}]\n```\nHope this helps!'
+    assert parse_structured(text, ITEMS) == [{"i": 0, "c": "name"}]
+
+
+def test_trailing_commas():
+    assert parse_structured('[{"i": 0, "c": "name",},]', ITEMS) == [{"i": 0, "c": "name"}]
+    assert parse_structured('{"name": "Ravi",}', DETAILS) == {"name": "Ravi"}
+
+
+def test_truncated_array_keeps_complete_objects():
+    text = '[{"i": 0, "c": "name"}, {"i": 1, "c": "email"}, {"i": 2, "c": "na'
+    assert parse_structured(text, ITEMS) == [{"i": 0, "c": "name"}, {"i": 1, "c": "email"}]
+
+
+def test_lone_object_where_an_array_was_asked():
+    assert parse_structured('{"i": 3, "c": "email"}', ITEMS) == [{"i": 3, "c": "email"}]
+
+
+def test_string_indices_and_enum_case_are_coerced():
+    assert parse_structured('[{"i": "2", "c": "EMAIL"}]', ITEMS) == [{"i": 2, "c": "email"}]
+
+
+def test_invalid_items_are_dropped():
+    text = '[{"i": 0, "c": "name"}, {"i": "x", "c": "name"}, {"i": 1, "c": "phone"}, {"c": "email"}, {"i": 1.5, "c": "name"}]'
+    assert parse_structured(text, ITEMS) == [{"i": 0, "c": "name"}]
+
+
+def test_scalar_and_list_coercions():
+    out = parse_structured('{"name": ["Python", "SQL"], "score": "0.8", "ok": "TRUE"}', DETAILS)
+    assert out == {"name": "Python, SQL", "score": 0.8, "ok": True}
+    assert validate(42, {"type": "string"}) == "42"
+
+
+def test_bad_nullable_value_becomes_null():
+    assert parse_structured('{"name": {"first": "R"}, "score": "high"}', DETAILS) == {"name": None, "score": None}
+
+
+def test_required_and_type_mismatches_raise():
+    schema = {"type": "object", "properties": {"action": {"type": "string"}}, "required": ["action"]}
+    with pytest.raises(MalformedResponse):
+        parse_structured('{"reason": "no action"}', schema)
+    with pytest.raises(MalformedResponse):
+        validate("yes", {"type": "boolean"})
+    with pytest.raises(MalformedResponse):
+        validate(True, {"type": "integer"})
+
+
+def test_non_finite_numbers_are_not_integers():
+    for value in ("inf", "nan", float("inf")):
+        with pytest.raises(MalformedResponse):
+            validate(value, {"type": "integer"})
+
+
+def test_empty_and_non_json_raise():
+    for text in ("", "   ", "I could not find any fields.", "[{]"):
+        with pytest.raises(MalformedResponse):
+            parse_structured(text, ITEMS)
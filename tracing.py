@@ -0,0 +1,314 @@
+"""Lightweight tracing for the fill pipeline.
+
+Spans nest through a context variable, so concurrent handlers each get their own
+trace (keyed by request_id) without passing anything around. Finished spans are
+queued for a background writer that appends them to a JSONL file, and folded
+into per-span latency histograms that can be served in Prometheus text format
+on /metrics.
+
+When TRACING_ENABLED is off, ``span()`` returns a shared no-op object and
+``traced`` wrappers only check a flag before calling straight through.
+"""
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import queue
+import threading
+import time
+import uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from config import TRACING_ENABLED, TRACE_FILE, METRICS_HOST
+
+_enabled = TRACING_ENABLED
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def enable(trace_file: str = None):
+    global _enabled
+    _enabled = True
+    if trace_file:
+        _sink.path = trace_file
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+class _JsonlSink:
+    """Appends span records to a JSONL file from a background thread.
+
+    ``write`` only enqueues, so spans finishing on the event loop never wait on
+    the disk; the writer wakes at most every FLUSH_INTERVAL_S, writes whatever
+    has queued up in one go and flushes once.
+    """
+    FLUSH_INTERVAL_S = 0.5
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue = queue.SimpleQueue()
+        self._pending = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._file = None
+        self._file_path = None
+
+    def write(self, record: dict):
+        self._queue.put(record)
+        self._pending.set()
+        if self._thread is None:
+            self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="trace-sink")
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._pending.wait()
+            # Let a burst of spans pile up before touching the file
+            time.sleep(self.FLUSH_INTERVAL_S)
+            self._pending.clear()
+            self.flush()
+
+    def flush(self):
+        """Write out every queued record (also runs at interpreter exit)."""
+        with self._lock:
+            records = []
+            while True:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not records:
+                return
+            try:
+                if self._file is None or self._file_path != self.path:
+                    if self._file:
+                        self._file.close()
+                    self._file = open(self.path, "a", encoding="utf-8")
+                    self._file_path = self.path
+                self._file.write("".join(json.dumps(r, default=str) + "\n" for r in records))
+                self._file.flush()
+            except Exception as e:
+                print(f"⚠️ Trace sink write failed: {e}")
+
+
+class _Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans = {}
+
+    def observe(self, name: str, seconds: float, error: bool):
+        with self._lock:
+            m = self._spans.get(name)
+            if m is None:
+                m = self._spans[name] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0, "errors": 0}
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    m["buckets"][i] += 1
+            m["sum"] += seconds
+            m["count"] += 1
+            if error:
+                m["errors"] += 1
+
+    def render(self) -> str:
+        lines = [
+            "# HELP formfiller_span_duration_seconds Duration of traced pipeline spans.",
+            "# TYPE formfiller_span_duration_seconds histogram",
+        ]
+        with self._lock:
+            snapshot = {k: dict(v, buckets=list(v["buckets"])) for k, v in self._spans.items()}
+        for name, m in sorted(snapshot.items()):
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            for bound, n in zip(BUCKETS, m["buckets"]):
+                lines.append(f'formfiller_span_duration_seconds_bucket{{span="{label}",le="{bound}"}} {n}')
+            lines.append(f'formfiller_span_duration_seconds_bucket{{span="{label}",le="+Inf"}} {m["count"]}')
+            lines.append(f'formfiller_span_duration_seconds_sum{{span="{label}"}} {m["sum"]:.6f}')
+            lines.append(f'formfiller_span_duration_seconds_count{{span="{label}"}} {m["count"]}')
+        lines.append("# HELP formfiller_span_errors_total Spans that ended with an exception.")
+        lines.append("# TYPE formfiller_span_errors_total counter")
+        for name, m in sorted(snapshot.items()):
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'formfiller_span_errors_total{{span="{label}"}} {m["errors"]}')
+        return "\n".join(lines) + "\n"
+
+
+_sink = _JsonlSink(TRACE_FILE)
+metrics = _Metrics()
+
+
+class Span:
+    __slots__ = ("name", "attrs", "span_id", "parent_id", "trace_id", "_start", "_wall", "_token", "_trace_token")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.span_id = uuid.uuid4().hex[:16]
+        self._trace_token = None
+
+    def set(self, **attrs):
+        """Attach attributes known only after the span started (counts, outcomes)."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = _trace_id.get()
+        if self.trace_id is None:
+            # A root span outside trace_context() starts its own trace
+            self.trace_id = uuid.uuid4().hex
+            self._trace_token = _trace_id.set(self.trace_id)
+        self._token = _current_span.set(self)
+        self._wall = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        _current_span.reset(self._token)
+        if self._trace_token is not None:
+            _trace_id.reset(self._trace_token)
+        record = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self._wall, 6),
+            "duration_ms": round(duration * 1000, 3),
+            "status": "error" if exc_type else "ok",
+        }
+        if exc_type:
+            record["error"] = f"{exc_type.__name__}: {exc}"
+        if self.attrs:
+            record["attrs"] = self.attrs
+        _sink.write(record)
+        metrics.observe(self.name, duration, exc_type is not None)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **attrs):
+    """Context manager (``with`` or ``async with``) timing one pipeline step."""
+    if not _enabled:
+        return _NOOP
+    return Span(name, attrs)
+
+
+class trace_context:
+    """Bind a trace id (e.g. the bot's request_id) to everything run inside the block."""
+
+    def __init__(self, trace_id: str):
+        self.trace_id = str(trace_id)
+        self._token = None
+
+    def __enter__(self):
+        self._token = _trace_id.set(self.trace_id)
+        return self
+
+    def __exit__(self, *exc):
+        _trace_id.reset(self._token)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc):
+        return self.__exit__(*exc)
+
+
+def current_trace_id():
+    return _trace_id.get()
+
+
+def traced(name: str = None):
+    """Decorator wrapping a sync or async function in a span named after it."""
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not _enabled:
+                    return await fn(*args, **kwargs)
+                with Span(span_name, {}):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(span_name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def flush():
+    """Write out finished spans still waiting in the sink's queue."""
+    _sink.flush()
+
+
+def start_metrics_server(port: int, host: str = METRICS_HOST):
+    """Serve Prometheus text metrics on http://host:port/metrics from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    print(f"📈 Metrics at http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,187 @@
+from __future__ import annotations
+import argparse
+import asyncio
+import contextlib
+import json
+import statistics
+import sys
+import time
+from typing import Dict, Any, Iterable, List, Optional, TextIO, Tuple
+
+from .browser_pool import BrowserPool
+from .http_client import close_async_client
+from .normalizer import normalize_user_text
+from .service import resolve_form_url, wait_for_background_tasks
+
+QUERY_KEYS = ("query", "text", "user_text", "body", "title")
+ID_KEYS = ("request_id", "id")
+
+
+def read_queries(lines: Iterable[str]) -> Tuple[Dict[str, Dict[str, Any]], int, int]:
+    """Group JSONL records by normalized query text.
+
+    Each record may be a bare JSON string, a plain-text line, or an object carrying
+    the query under one of QUERY_KEYS (requests.jsonl style logs use ``body``).
+    Blank lines, broken JSON objects/arrays and records without a query are
+    skipped. Returns ({normalized: {"query", "ids"}}, lines_read, skipped).
+    """
+    groups: Dict[str, Dict[str, Any]] = {}
+    count = skipped = 0
+    for line in lines:
+        count += 1
+        line = line.strip()
+        if not line:
+            skipped += 1
+            continue
+        try:
+            rec = json.loads(line)
+        except json.JSONDecodeError:
+            if line[0] in "{[":
+                skipped += 1
+                continue
+            rec = line
+        if isinstance(rec, str):
+            query, rid = rec, None
+        elif isinstance(rec, dict):
+            query = next((rec[k] for k in QUERY_KEYS if isinstance(rec.get(k), str) and rec[k]), "")
+            rid = next((rec[k] for k in ID_KEYS if rec.get(k) is not None), None)
+        else:
+            query, rid = "", None
+        key = normalize_user_text(query)
+        if not key:
+            skipped += 1
+            continue
+        group = groups.setdefault(key, {"query": query, "ids": []})
+        if rid is not None:
+            group["ids"].append(rid)
+    return groups, count, skipped
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of ``values`` (pct in 0-100)."""
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def summarize(records: List[Dict[str, Any]], lines_read: int, skipped: int, elapsed_s: float) -> Dict[str, Any]:
+    """Batch statistics; ``duplicates`` counts only valid queries that repeat an earlier one."""
+    stages: Dict[str, List[float]] = {}
+    for rec in records:
+        for stage, secs in (rec.get("timings") or {}).items():
+            stages.setdefault(stage, []).append(secs)
+        stages.setdefault("total", []).append(rec["elapsed_s"])
+    hits = sum(1 for r in records if r.get("cache_hit"))
+    hint_hits = sum((r.get("hint_cache") or {}).get("hits", 0) for r in records)
+    hint_misses = sum((r.get("hint_cache") or {}).get("misses", 0) for r in records)
+    return {
+        "lines": lines_read,
+        "skipped": skipped,
+        "unique_queries": len(records),
+        "duplicates": lines_read - skipped - len(records),
+        "found": sum(1 for r in records if r.get("found")),
+        "errors": sum(1 for r in records if r.get("error")),
+        "elapsed_s": round(elapsed_s, 3),
+        "throughput_qps": round(len(records) / elapsed_s, 3) if elapsed_s else None,
+        "cache": {"hits": hits, "misses": len(records) - hits, "hit_rate": round(hits / len(records), 3) if records else None},
+        "hint_cache": {
+            "hits": hint_hits,
+            "misses": hint_misses,
+            "hit_rate": round(hint_hits / (hint_hits + hint_misses), 3) if hint_hits + hint_misses else None,
+        },
+        "stages": {
+            stage: {
+                "n": len(v),
+                "mean": round(statistics.mean(v), 4),
+                "p50": round(percentile(v, 50), 4),
+                "p95": round(percentile(v, 95), 4),
+            }
+            for stage, v in stages.items()
+        },
+    }
+
+
+async def resolve_batch(
+    groups: Dict[str, Dict[str, Any]],
+    out: TextIO,
+    concurrency: int = 4,
+    use_cache: bool = True,
+    crawl: bool = False,
+    timeout_s: int = 20,
+    pool: Optional[BrowserPool] = None
+) -> List[Dict[str, Any]]:
+    """Resolve every group with bounded concurrency, writing one JSONL result per query as it completes."""
+    sem = asyncio.Semaphore(concurrency)
+    records: List[Dict[str, Any]] = []
+
+    async def one(key: str, group: Dict[str, Any]) -> Dict[str, Any]:
+        async with sem:
+            started = time.perf_counter()
+            rec: Dict[str, Any] = {"query": group["query"], "normalized": key, "ids": group["ids"]}
+            try:
+                url, meta = await resolve_form_url(
+                    group["query"], headless=True, timeout_s=timeout_s,
+                    use_cache=use_cache, crawl=crawl, pool=pool
+                )
+                nav = meta.get("navigation") or {}
+                rec.update(
+                    url=url,
+                    found=bool(nav.get("found")),
+                    needs_login=bool(meta.get("needs_login")),
+                    reason=nav.get("reason"),
+                    source=(meta.get("selected") or {}).get("source"),
+                    cache_hit=bool(meta.get("cache", {}).get("hit")),
+                    hint_cache=meta.get("hint_cache"),
+                    timings=meta.get("timings", {}),
+                )
+            except Exception as e:
+                rec.update(url=None, found=False, error=str(e))
+            rec["elapsed_s"] = round(time.perf_counter() - started, 4)
+            return rec
+
+    tasks = [asyncio.create_task(one(k, g)) for k, g in groups.items()]
+    for fut in asyncio.as_completed(tasks):
+        rec = await fut
+        records.append(rec)
+        out.write(json.dumps(rec, default=str) + "\n")
+        out.flush()
+    return records
+
+
+async def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Resolve a JSONL stream of user intents to form URLs.")
+    parser.add_argument("--input", "-i", help="JSONL input file (default: stdin)")
+    parser.add_argument("--output", "-o", help="JSONL output file (default: stdout)")
+    parser.add_argument("--concurrency", "-c", type=int, default=4, help="Queries (and browser contexts) in flight")
+    parser.add_argument("--timeout", type=int, default=20, help="Per-URL timeout in seconds")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore the resolution cache")
+    parser.add_argument("--crawl", action="store_true", help="Use the parallel crawl navigator")
+    args = parser.parse_args(argv)
+
+    src = open(args.input, "r", encoding="utf-8") if args.input else sys.stdin
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        groups, lines_read, skipped = read_queries(src)
+        print(f"📥 {lines_read} lines, {skipped} skipped, {len(groups)} unique queries", file=sys.stderr)
+        started = time.perf_counter()
+        # Progress prints go to stderr so stdout stays valid JSONL
+        with contextlib.redirect_stdout(sys.stderr):
+            async with BrowserPool(headless=True, max_contexts=args.concurrency) as pool:
+                records = await resolve_batch(
+                    groups, out, concurrency=args.concurrency, use_cache=not args.no_cache,
+                    crawl=args.crawl, timeout_s=args.timeout, pool=pool
+                )
+                await wait_for_background_tasks()
+        stats = summarize(records, lines_read, skipped, time.perf_counter() - started)
+        print("📊 Batch statistics:", file=sys.stderr)
+        print(json.dumps(stats, indent=2), file=sys.stderr)
+    finally:
+        await close_async_client()
+        if src is not sys.stdin:
+            src.close()
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+from __future__ import annotations
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional
+
+from playwright.async_api import async_playwright
+
+from .verify import CHROMIUM_ARGS, open_stealth_context
+
+
+class BrowserPool:
+    """One shared Chromium handing out isolated stealth contexts.
+
+    ``lease()`` blocks while ``max_contexts`` contexts are in use, so callers can
+    fan out freely without launching a browser per URL.
+    """
+
+    def __init__(self, headless: bool = True, max_contexts: int = 4):
+        self.headless = headless
+        self.max_contexts = max_contexts
+        self._sem = asyncio.Semaphore(max_contexts)
+        self._lock = asyncio.Lock()
+        self._p = None
+        self._browser = None
+        self.leases = 0
+
+    async def _ensure_browser(self):
+        async with self._lock:
+            if self._browser is None or not self._browser.is_connected():
+                if self._p is None:
+                    self._p = await async_playwright().start()
+                self._browser = await self._p.chromium.launch(headless=self.headless, args=CHROMIUM_ARGS)
+        return self._browser
+
+    @asynccontextmanager
+    async def lease(self, allow: Optional[List[str]] = None, storage_state: Optional[Dict[str, Any]] = None):
+        """Yield (context, page) on the shared browser; the context is closed afterwards."""
+        async with self._sem:
+            browser = await self._ensure_browser()
+            context, page = await open_stealth_context(browser, self.headless, allow=allow, storage_state=storage_state)
+            self.leases += 1
+            try:
+                yield context, page
+            finally:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+
+    async def close(self) -> None:
+        try:
+            if self._browser:
+                await self._browser.close()
+        except Exception:
+            pass
+        try:
+            if self._p:
+                await self._p.stop()
+        except Exception:
+            pass
+        self._browser = self._p = None
+
+    async def __aenter__(self) -> "BrowserPool":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
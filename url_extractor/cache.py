@@ -0,0 +1,197 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from .config import (
+    CACHE_DIR,
+    RESOLUTION_CACHE_TTL_S,
+    RESOLUTION_CACHE_NEGATIVE_TTL_S,
+    RESOLUTION_CACHE_REVALIDATE_AFTER_S,
+    NAV_HINT_CACHE_TTL_S,
+)
+from .normalizer import normalize_user_text
+
+
+class TTLStore:
+    """Small JSON-file key/value store with per-entry expiry.
+
+    Entries are kept in memory and written through to disk atomically, so the
+    store survives restarts and can be shared between runs of the CLI and bot.
+    """
+
+    def __init__(self, path: Path, max_entries: int = 2000):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data: Optional[Dict[str, Dict[str, Any]]] = None
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._data is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._data = {}
+        return self._data
+
+    def _flush(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._data, f)
+        os.replace(tmp, self.path)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the raw record ({value, stored_at, expires_at}) or None if missing/expired."""
+        with self._lock:
+            data = self._load()
+            rec = data.get(key)
+            if not rec:
+                return None
+            if rec.get("expires_at", 0) <= time.time():
+                del data[key]
+                self._flush()
+                return None
+            return rec
+
+    def set(self, key: str, value: Any, ttl_s: float) -> None:
+        now = time.time()
+        with self._lock:
+            data = self._load()
+            data[key] = {"value": value, "stored_at": now, "expires_at": now + ttl_s}
+            if len(data) > self.max_entries:
+                # Drop expired entries first, then the oldest ones
+                for k in [k for k, r in data.items() if r.get("expires_at", 0) <= now]:
+                    del data[k]
+                overflow = len(data) - self.max_entries
+                if overflow > 0:
+                    for k, _ in sorted(data.items(), key=lambda kv: kv[1].get("stored_at", 0))[:overflow]:
+                        del data[k]
+            self._flush()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            data = self._load()
+            if data.pop(key, None) is not None:
+                self._flush()
+
+
+class ResolutionCache:
+    """Persistent cache of resolve_form_url outcomes keyed by normalized user text.
+
+    Successful resolutions are kept for ``ttl_s``; failures are remembered for the
+    shorter ``negative_ttl_s``. Entries older than ``revalidate_after_s`` are still
+    served but flagged stale so the caller can refresh them in the background.
+    """
+
+    def __init__(
+        self,
+        store: Optional[TTLStore] = None,
+        ttl_s: int = RESOLUTION_CACHE_TTL_S,
+        negative_ttl_s: int = RESOLUTION_CACHE_NEGATIVE_TTL_S,
+        revalidate_after_s: int = RESOLUTION_CACHE_REVALIDATE_AFTER_S,
+    ):
+        self.store = store or TTLStore(CACHE_DIR / "resolutions.json")
+        self.ttl_s = ttl_s
+        self.negative_ttl_s = negative_ttl_s
+        self.revalidate_after_s = revalidate_after_s
+
+    @staticmethod
+    def key_for(user_text: str) -> str:
+        return normalize_user_text(user_text)
+
+    def lookup(self, user_text: str) -> Optional[Dict[str, Any]]:
+        """Return the cached entry with ``age_s`` and ``stale`` added, or None."""
+        key = self.key_for(user_text)
+        if not key:
+            return None
+        rec = self.store.get(key)
+        if not rec:
+            return None
+        entry = dict(rec["value"])
+        entry["age_s"] = time.time() - rec["stored_at"]
+        entry["stale"] = entry["age_s"] >= self.revalidate_after_s
+        return entry
+
+    def store_result(self, user_text: str, url: Optional[str], meta: Dict[str, Any]) -> None:
+        key = self.key_for(user_text)
+        if not key:
+            return
+        nav = meta.get("navigation") or {}
+        found = bool(nav.get("found"))
+        selected = meta.get("selected") or {}
+        entry = {
+            "url": url,
+            "found": found,
+            "needs_login": bool(meta.get("needs_login")),
+            "navigation": {
+                "found": found,
+                "final_url": nav.get("final_url", url),
+                "reason": nav.get("reason"),
+                "needs_login": bool(nav.get("needs_login")),
+                "steps": list(nav.get("steps") or []),
+            },
+            "selected": {k: selected.get(k) for k in ("url", "title", "score", "source") if k in selected},
+        }
+        self.store.set(key, entry, self.ttl_s if found else self.negative_ttl_s)
+
+    def invalidate(self, user_text: str) -> None:
+        self.store.delete(self.key_for(user_text))
+
+
+class NavigationHintCache:
+    """Gemini navigation decisions keyed by page fingerprint and user intent.
+
+    Portal landing pages look the same for every user, so a hint for the same
+    canonical URL, visible link list and normalized request is reused until
+    ``ttl_s`` passes instead of asking Gemini again. Only ``click`` and
+    ``found`` hints are kept, and the navigator stores them only once they
+    have led to a form; a reused hint that does not is discarded.
+    """
+
+    CACHEABLE_ACTIONS = ("click", "found")
+
+    def __init__(self, store: Optional[TTLStore] = None, ttl_s: int = NAV_HINT_CACHE_TTL_S):
+        self.store = store or TTLStore(CACHE_DIR / "navigation_hints.json", max_entries=5000)
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key_for(page_url: str, links: List[Dict[str, str]], user_text: str) -> str:
+        """``page_url`` should already be canonical; ``links`` are the ones shown to Gemini."""
+        links_digest = hashlib.sha1(
+            json.dumps([[link.get("text", ""), link.get("href", "")] for link in links]).encode("utf-8")
+        ).hexdigest()[:16]
+        return f"{page_url}|{links_digest}|{normalize_user_text(user_text)}"
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        rec = self.store.get(key) if self.ttl_s > 0 else None
+        if rec and rec["value"].get("action") in self.CACHEABLE_ACTIONS:
+            self.hits += 1
+            return dict(rec["value"])
+        self.misses += 1
+        return None
+
+    def store_hint(self, key: str, hint: Dict[str, Any]) -> None:
+        """Keep a hint that led to a form."""
+        if self.ttl_s > 0 and hint.get("action") in self.CACHEABLE_ACTIONS:
+            self.store.set(key, {k: v for k, v in hint.items() if k in ("action", "link_text", "href", "reason")}, self.ttl_s)
+
+    def discard(self, key: str) -> None:
+        self.store.delete(key)
+
+
+_navigation_hint_cache: Optional[NavigationHintCache] = None
+
+
+def get_navigation_hint_cache() -> NavigationHintCache:
+    global _navigation_hint_cache
+    if _navigation_hint_cache is None:
+        _navigation_hint_cache = NavigationHintCache()
+    return _navigation_hint_cache
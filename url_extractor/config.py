@@ -15,3 +15,56 @@ DEFAULT_USER_AGENT = (
     "AppleWebKit/537.36 (KHTML, like Gecko) "
     "Chrome/131.0.0.0 Safari/537.36"
 )
+
+# On-disk caches (resolution results, etc.)
+CACHE_DIR = Path(os.getenv("URL_EXTRACTOR_CACHE_DIR", str(ROOT / ".cache")))
+
+# Resolution cache: how long a found form URL is trusted, how long a failure
+# is remembered, and when a still-valid entry is refreshed in the background
+RESOLUTION_CACHE_TTL_S = int(os.getenv("RESOLUTION_CACHE_TTL_S", str(7 * 24 * 3600)))
+RESOLUTION_CACHE_NEGATIVE_TTL_S = int(os.getenv("RESOLUTION_CACHE_NEGATIVE_TTL_S", str(30 * 60)))
+RESOLUTION_CACHE_REVALIDATE_AFTER_S = int(os.getenv("RESOLUTION_CACHE_REVALIDATE_AFTER_S", str(24 * 3600)))
+
+# Cosine similarity above which a local semantic match is trusted and the
+# Gemini intent resolver is skipped
+SEMANTIC_CONFIDENCE_THRESHOLD = float(os.getenv("SEMANTIC_CONFIDENCE_THRESHOLD", "0.45"))
+# Matches below this similarity are unrelated forms and never become candidates
+SEMANTIC_MIN_SIMILARITY = float(os.getenv("SEMANTIC_MIN_SIMILARITY", str(SEMANTIC_CONFIDENCE_THRESHOLD / 2)))
+
+# Resource blocking profile for verification browsers (off | trackers | light | strict).
+# Visible (manual login) runs use VERIFY_VISIBLE_BLOCK_PROFILE so CAPTCHA images still load.
+VERIFY_BLOCK_PROFILE = os.getenv("VERIFY_BLOCK_PROFILE", "strict")
+VERIFY_VISIBLE_BLOCK_PROFILE = os.getenv("VERIFY_VISIBLE_BLOCK_PROFILE", "trackers")
+
+# Offline site indexes (python -m url_extractor.precrawl) older than this are ignored
+SITE_INDEX_MAX_AGE_S = int(os.getenv("SITE_INDEX_MAX_AGE_S", str(30 * 24 * 3600)))
+
+# Login session vault: Fernet key (Fernet.generate_key()) used to encrypt saved
+# Playwright storage state; sessions are not persisted when unset
+SESSION_VAULT_KEY = os.getenv("SESSION_VAULT_KEY")
+SESSION_VAULT_MAX_AGE_S = int(os.getenv("SESSION_VAULT_MAX_AGE_S", str(8 * 3600)))
+
+# Web search results (query -> result links) are cached on disk for this long
+SEARCH_CACHE_TTL_S = int(os.getenv("SEARCH_CACHE_TTL_S", str(24 * 3600)))
+
+# Gemini navigation hints are reused for the same page (URL + visible links)
+# and user intent for this long (0 disables the hint cache)
+NAV_HINT_CACHE_TTL_S = int(os.getenv("NAV_HINT_CACHE_TTL_S", str(24 * 3600)))
+
+# Prompts are sent static prefix first so Gemini's implicit caching can reuse
+# it; PROMPT_CACHE_BACKEND=local counts what a prefix cache would save (tests,
+# benchmarks), off (default) sends the rendered prompt
+PROMPT_CACHE_BACKEND = os.getenv("PROMPT_CACHE_BACKEND", "off").lower()
+PROMPT_CACHE_TTL_S = int(os.getenv("PROMPT_CACHE_TTL_S", "3600"))
+
+# Gemini model tiers, cheapest first. Each call starts on the tier its input
+# size calls for and moves up one tier (at most MODEL_MAX_ESCALATIONS times)
+# when the answer does not parse or looks incomplete. A tier whose recent
+# error rate reaches MODEL_ERROR_RATE_THRESHOLD within MODEL_ERROR_WINDOW_S
+# is skipped until its failures age out.
+MODEL_TIERS = [m.strip() for m in os.getenv(
+    "MODEL_TIERS", "gemini-2.5-flash-lite,gemini-2.5-flash,gemini-2.5-pro"
+).split(",") if m.strip()]
+MODEL_MAX_ESCALATIONS = int(os.getenv("MODEL_MAX_ESCALATIONS", "1"))
+MODEL_ERROR_RATE_THRESHOLD = float(os.getenv("MODEL_ERROR_RATE_THRESHOLD", "0.5"))
+MODEL_ERROR_WINDOW_S = int(os.getenv("MODEL_ERROR_WINDOW_S", "600"))
@@ -0,0 +1,41 @@
+from __future__ import annotations
+import asyncio
+from typing import Optional
+
+try:
+    import httpx
+except Exception:
+    httpx = None  # optional; callers fall back to the browser / sync requests
+
+from .config import DEFAULT_USER_AGENT
+
+_client: Optional["httpx.AsyncClient"] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_async_client() -> Optional["httpx.AsyncClient"]:
+    """Shared keep-alive AsyncClient for the running event loop (None without httpx)."""
+    global _client, _client_loop
+    if httpx is None:
+        return None
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop or _client.is_closed:
+        _client = httpx.AsyncClient(
+            headers={
+                "User-Agent": DEFAULT_USER_AGENT,
+                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+                "Accept-Language": "en-US,en;q=0.9",
+            },
+            follow_redirects=True,
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+        )
+        _client_loop = loop
+    return _client
+
+
+async def close_async_client() -> None:
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
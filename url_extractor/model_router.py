@@ -0,0 +1,149 @@
+from __future__ import annotations
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+try:
+    import google.generativeai as genai
+except Exception:
+    genai = None  # optional; callers then pass their own model factory
+
+from .config import MODEL_TIERS, MODEL_MAX_ESCALATIONS, MODEL_ERROR_RATE_THRESHOLD, MODEL_ERROR_WINDOW_S
+from .prompts import model_name_of
+from .structured import MalformedResponse
+
+# Starting tier per task: ``base`` plus one for every ``steps`` boundary the
+# call's size reaches. Sizes are fields per request for classification and
+# characters of document text for user details.
+ROUTES: Dict[str, Dict[str, Any]] = {
+    "classify_fields": {"base": 0, "steps": (30,)},
+    "user_details": {"base": 0, "steps": (6000,)},
+    "image_ocr": {"base": 1, "steps": ()},
+    "intent": {"base": 0, "steps": ()},
+    "navigation": {"base": 0, "steps": ()},
+}
+
+
+class ModelRouter:
+    """Pick a Gemini model tier per call instead of one model for everything.
+
+    The starting tier rises with the call's size, with ``low_confidence`` (the
+    local signal was weak, e.g. a poor semantic match or a repeated navigation
+    attempt) and with the tier's recent error rate for the task. ``call`` then
+    moves up one tier when the answer is malformed or fails the caller's
+    ``accept`` check. API errors (quota, network, safety blocks) are recorded
+    and re-raised, so a rate-limit burst is never pushed onto the pricier tiers.
+    """
+
+    MIN_SAMPLES = 4
+
+    def __init__(self, tiers: Optional[List[str]] = None, model_factory: Optional[Callable[[str], Any]] = None,
+                 max_escalations: int = MODEL_MAX_ESCALATIONS, error_rate: float = MODEL_ERROR_RATE_THRESHOLD,
+                 window_s: int = MODEL_ERROR_WINDOW_S):
+        self.tiers = list(tiers or MODEL_TIERS)
+        self.model_factory = model_factory or (lambda name: genai.GenerativeModel(name))
+        self.max_escalations = max_escalations
+        self.error_rate = error_rate
+        self.window_s = window_s
+        self._models: Dict[str, Any] = {}
+        self._outcomes: Dict[Tuple[str, int], Deque[Tuple[float, bool]]] = {}
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def fixed(cls, model: Any) -> "ModelRouter":
+        """A single-tier router around an existing model (tests, benchmarks, old callers)."""
+        return cls(tiers=[model_name_of(model)], model_factory=lambda name: model, max_escalations=0)
+
+    def model(self, tier: int) -> Any:
+        name = self.tiers[tier]
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                model = self._models[name] = self.model_factory(name)
+            return model
+
+    def _recent_error_rate(self, task: str, tier: int) -> Optional[float]:
+        outcomes = self._outcomes.get((task, tier))
+        cutoff = time.time() - self.window_s
+        while outcomes and outcomes[0][0] < cutoff:
+            outcomes.popleft()
+        if not outcomes or len(outcomes) < self.MIN_SAMPLES:
+            return None
+        return sum(1 for _, ok in outcomes if not ok) / len(outcomes)
+
+    def pick(self, task: str, size: int = 0, low_confidence: bool = False, floor: int = 0) -> int:
+        """Index of the tier a call should start on."""
+        route = ROUTES.get(task, {"base": 0, "steps": ()})
+        tier = route["base"] + sum(1 for step in route["steps"] if size >= step)
+        if low_confidence:
+            tier += 1
+        tier = min(max(tier, floor), len(self.tiers) - 1)
+        with self._lock:
+            # Skip tiers that have been failing this task lately
+            while tier < len(self.tiers) - 1:
+                rate = self._recent_error_rate(task, tier)
+                if rate is None or rate < self.error_rate:
+                    break
+                tier += 1
+        return tier
+
+    def record(self, task: str, tier: int, ok: bool) -> None:
+        with self._lock:
+            self._outcomes.setdefault((task, tier), deque(maxlen=50)).append((time.time(), ok))
+            counts = self.stats.setdefault(f"{task}:{self.tiers[tier]}", {"calls": 0, "failures": 0})
+            counts["calls"] += 1
+            if not ok:
+                counts["failures"] += 1
+
+    def call(self, task: str, fn: Callable[[Any], Any], size: int = 0, low_confidence: bool = False,
+             accept: Optional[Callable[[Any], bool]] = None, floor: int = 0) -> Any:
+        """Run ``fn(model)`` on the routed tier, escalating on a malformed or rejected answer.
+
+        A MalformedResponse is retried once: on the next tier when escalation is
+        allowed, otherwise on the same one. Any other exception propagates
+        unchanged; the last tier's rejected answer is returned as is.
+        """
+        tier = self.pick(task, size, low_confidence, floor)
+        last = min(len(self.tiers) - 1, tier + self.max_escalations)
+        retried = False
+        while True:
+            try:
+                result = fn(self.model(tier))
+            except MalformedResponse as e:
+                self.record(task, tier, False)
+                if retried:
+                    raise
+                retried = True
+                reason = f"malformed response: {e}"
+            except Exception:
+                self.record(task, tier, False)
+                raise
+            else:
+                ok = accept is None or accept(result)
+                self.record(task, tier, ok)
+                if ok or tier >= last:
+                    return result
+                reason = "low confidence"
+            if tier < last:
+                print(f"🔀 {task}: escalating {self.tiers[tier]} → {self.tiers[tier + 1]} ({reason})")
+                tier += 1
+            else:
+                print(f"🔁 {task}: retrying {self.tiers[tier]} ({reason})")
+
+
+def as_router(model: Any) -> ModelRouter:
+    """Accept either a ModelRouter or a plain model object."""
+    return model if isinstance(model, ModelRouter) else ModelRouter.fixed(model)
+
+
+_model_router: Optional[ModelRouter] = None
+
+
+def get_model_router() -> ModelRouter:
+    """Process-wide ModelRouter over MODEL_TIERS, shared so error rates are seen by every caller."""
+    global _model_router
+    if _model_router is None:
+        _model_router = ModelRouter()
+    return _model_router
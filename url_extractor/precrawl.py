@@ -0,0 +1,132 @@
+from __future__ import annotations
+import asyncio
+import re
+import sys
+import time
+from collections import deque
+from typing import Dict, List
+
+from .normalizer import extract_keywords
+from .resolvers import load_forms_db
+from .semantic import STOPWORDS
+from .site_index import SiteIndex
+from .verify import launch_stealth_context, snapshot_page, canonicalize_url, site_of, STEALTH_SCRIPT
+
+SITEMAP_LOC_RE = re.compile(r"<loc>\s*([^<\s]+)\s*</loc>", re.I)
+
+
+def _title_words(text: str) -> List[str]:
+    return [w for w in extract_keywords(text) if len(w) > 2 and w not in STOPWORDS]
+
+
+async def _sitemap_urls(context, start_url: str, site: str, limit: int) -> List[str]:
+    parts = start_url.split("/", 3)
+    try:
+        resp = await context.request.get(f"{parts[0]}//{parts[2]}/sitemap.xml", timeout=10000)
+        if not resp.ok:
+            return []
+        locs = SITEMAP_LOC_RE.findall(await resp.text())
+    except Exception:
+        return []
+    return [u for u in locs if site_of(u) == site][:limit]
+
+
+async def build_site_index(start_urls: List[str], max_pages: int = 60, max_depth: int = 3, concurrency: int = 4) -> SiteIndex:
+    """Breadth-first crawl of one site from ``start_urls`` (plus its sitemap) into a SiteIndex."""
+    site = site_of(start_urls[0])
+    p, browser, context, page = await launch_stealth_context(headless=True)
+    rows: Dict[str, int] = {}
+    pages: List[list] = []
+    edges: List[List[int]] = []
+    edge_set = set()
+    try:
+        await page.close()
+        queue = deque((u, 0, None, "") for u in start_urls)
+        queue.extend((u, 1, None, "") for u in await _sitemap_urls(context, start_urls[0], site, max_pages))
+        seen = set()
+        sem = asyncio.Semaphore(concurrency)
+
+        def row_for(canonical: str, url: str) -> int:
+            if canonical not in rows:
+                rows[canonical] = len(pages)
+                pages.append([url, "", 0, False, []])
+            return rows[canonical]
+
+        async def visit(url: str):
+            async with sem:
+                child = await context.new_page()
+                try:
+                    await child.add_init_script(STEALTH_SCRIPT)
+                    await child.goto(url, wait_until="domcontentloaded", timeout=20000)
+                    await asyncio.sleep(2)
+                    return await snapshot_page(child)
+                except Exception as e:
+                    print(f"⚠️ Precrawl failed for {url}: {e}")
+                    return None
+                finally:
+                    try:
+                        await child.close()
+                    except Exception:
+                        pass
+
+        while queue and len(seen) < max_pages:
+            batch = []
+            while queue and len(batch) < concurrency and len(seen) < max_pages:
+                url, depth, parent, anchor = queue.popleft()
+                canonical = canonicalize_url(url)
+                row = row_for(canonical, url)
+                if anchor:
+                    pages[row][4] = sorted(set(pages[row][4]) | set(_title_words(anchor)))
+                if parent is not None and parent != row and (parent, row) not in edge_set:
+                    edge_set.add((parent, row))
+                    edges.append([parent, row])
+                if canonical in seen:
+                    continue
+                seen.add(canonical)
+                batch.append((url, depth, row))
+            snaps = await asyncio.gather(*(visit(u) for u, _, _ in batch))
+            for (url, depth, row), snap in zip(batch, snaps):
+                if snap is None:
+                    continue
+                entry = pages[row]
+                entry[1] = snap.title[:120]
+                entry[2] = snap.visible_inputs
+                entry[3] = snap.has_password
+                entry[4] = sorted(set(entry[4]) | set(_title_words(snap.title)))
+                print(f"  [{snap.visible_inputs:3d} inputs] {snap.title[:60]!r} {url}")
+                if depth >= max_depth:
+                    continue
+                for link in snap.links:
+                    href = link.get("href", "")
+                    if href.startswith("http") and site_of(href) == site:
+                        queue.append((href, depth + 1, row, link.get("text", "")))
+    finally:
+        try:
+            await browser.close()
+        except Exception:
+            pass
+        try:
+            await p.stop()
+        except Exception:
+            pass
+    return SiteIndex(site, pages, edges, time.time())
+
+
+async def main():
+    max_pages = 60
+    if "--max-pages" in sys.argv:
+        max_pages = int(sys.argv[sys.argv.index("--max-pages") + 1])
+    by_site: Dict[str, List[str]] = {}
+    for entry in load_forms_db().values():
+        url = entry.get("url")
+        if url:
+            by_site.setdefault(site_of(url), []).append(url)
+    for site, urls in by_site.items():
+        print(f"\n🕸️ Precrawling {site} from {len(urls)} start URL(s)")
+        index = await build_site_index(urls, max_pages=max_pages)
+        forms = sum(1 for row in index.pages if row[2] and not row[3])
+        print(f"💾 {len(index.pages)} pages, {len(index.edges)} links, {forms} form pages -> {index.save()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
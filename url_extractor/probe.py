@@ -0,0 +1,100 @@
+from __future__ import annotations
+import asyncio
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from .http_client import get_async_client, httpx
+
+TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title>", re.I | re.S)
+# Markers of client-rendered app shells that need JavaScript to show anything
+JS_SHELL_MARKERS = ('<app-root', 'id="root"', "id='root'", 'id="app"', 'enable javascript', 'requires javascript')
+BLOCKED_MARKERS = ('access denied', 'permission denied', 'captcha')
+
+OK = "ok"
+FAIL = "fail"
+NEEDS_BROWSER = "needs_browser"
+
+
+@dataclass
+class ProbeResult:
+    """Outcome of a plain HTTP fetch of a candidate URL.
+
+    verdict is OK (page is usable as-is), FAIL (dead link, no point opening a
+    browser) or NEEDS_BROWSER (JS app shell, bot wall or inconclusive).
+    """
+    url: str
+    verdict: str
+    reason: str
+    status: Optional[int] = None
+    final_url: Optional[str] = None
+    content_type: str = ""
+    title: str = ""
+
+
+async def probe_url(url: str, timeout_s: float = 10.0, sample_bytes: int = 65536) -> ProbeResult:
+    """GET ``url`` with redirects and classify it from status, content type and a bounded body sample."""
+    client = get_async_client()
+    if client is None:
+        return ProbeResult(url, NEEDS_BROWSER, "http probe unavailable (httpx not installed)")
+    try:
+        async with client.stream("GET", url, timeout=timeout_s) as resp:
+            chunks: List[bytes] = []
+            size = 0
+            async for chunk in resp.aiter_bytes():
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= sample_bytes:
+                    break
+            status = resp.status_code
+            final_url = str(resp.url)
+            content_type = resp.headers.get("content-type", "").lower()
+            body = b"".join(chunks)[:sample_bytes].decode(resp.encoding or "utf-8", errors="replace")
+    except httpx.TimeoutException:
+        return ProbeResult(url, NEEDS_BROWSER, "http probe timed out")
+    except httpx.ConnectError as e:
+        # Includes TLS handshake failures; many .gov.in portals serve chains
+        # httpx rejects but Chromium still loads
+        return ProbeResult(url, NEEDS_BROWSER, f"http connect error: {e}")
+    except (httpx.UnsupportedProtocol, httpx.TooManyRedirects) as e:
+        return ProbeResult(url, FAIL, f"error: {e}")
+    except Exception as e:
+        return ProbeResult(url, NEEDS_BROWSER, f"http probe error: {e}")
+
+    result = ProbeResult(url, NEEDS_BROWSER, "", status, final_url, content_type)
+    if status in (404, 410):
+        result.verdict, result.reason = FAIL, f"{status} - Page not found"
+        return result
+    if status in (401, 403, 429) or status >= 500:
+        # Often a bot wall for non-browser clients; let the stealth browser decide
+        result.reason = f"http {status}"
+        return result
+    if content_type and "html" not in content_type:
+        result.verdict, result.reason = FAIL, f"not an HTML page ({content_type.split(';')[0]})"
+        return result
+
+    sample = body.lower()
+    m = TITLE_RE.search(body)
+    result.title = re.sub(r"\s+", " ", m.group(1)).strip() if m else ""
+    title = result.title.lower()
+    if '404' in title or 'not found' in title:
+        result.verdict, result.reason = FAIL, "404 - Page not found"
+    elif any(marker in sample for marker in BLOCKED_MARKERS):
+        result.reason = "blocked or captcha marker in raw HTML"
+    elif not result.title or any(marker in sample for marker in JS_SHELL_MARKERS):
+        result.reason = "needs JavaScript to render"
+    else:
+        result.verdict, result.reason = OK, "ok"
+    return result
+
+
+async def probe_candidates(urls: List[str], concurrency: int = 8, timeout_s: float = 10.0) -> Dict[str, ProbeResult]:
+    """Probe many URLs concurrently over the shared connection pool."""
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(u: str) -> ProbeResult:
+        async with sem:
+            return await probe_url(u, timeout_s=timeout_s)
+
+    results = await asyncio.gather(*(one(u) for u in urls))
+    return {r.url: r for r in results}
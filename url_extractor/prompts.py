@@ -0,0 +1,146 @@
+from __future__ import annotations
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Set, Tuple
+
+from .config import PROMPT_CACHE_BACKEND, PROMPT_CACHE_TTL_S
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """A prompt split into a static prefix and a per-call suffix.
+
+    The prefix is identical on every call, so the provider can cache it. The
+    suffix is a ``str.format`` template filled with the call's values.
+    """
+    name: str
+    prefix: str
+    suffix: str
+
+    def suffix_text(self, **values: Any) -> str:
+        return self.suffix.format(**values)
+
+    def render(self, **values: Any) -> str:
+        return self.prefix + self.suffix_text(**values)
+
+
+_REGISTRY: Dict[str, PromptTemplate] = {}
+
+
+def register_prompt(name: str, prefix: str, suffix: str) -> PromptTemplate:
+    template = PromptTemplate(name, prefix, suffix)
+    _REGISTRY[name] = template
+    return template
+
+
+def get_prompt(name: str) -> PromptTemplate:
+    return _REGISTRY[name]
+
+
+def model_name_of(model: Any) -> str:
+    return getattr(model, "model_name", None) or type(model).__name__
+
+
+class _LocalCachedModel:
+    def __init__(self, backend: "LocalCacheBackend", model: Any, template: PromptTemplate):
+        self._backend = backend
+        self._model = model
+        self._template = template
+
+    def generate_content(self, suffix: str, **kwargs: Any) -> Any:
+        self._backend.prefix_tokens_saved += estimate_tokens(self._template.prefix)
+        return self._model.generate_content(self._template.prefix + suffix, **kwargs)
+
+
+class LocalCacheBackend:
+    """Stand-in for provider caching in tests and benchmarks.
+
+    The wrapped model still receives prefix + suffix, so answers are unchanged.
+    The backend counts cache entries and the prefix tokens a real cache would
+    have saved.
+    """
+    name = "local"
+
+    def __init__(self, ttl_s: int = PROMPT_CACHE_TTL_S):
+        self.ttl_s = ttl_s
+        self.created = 0
+        self.prefix_tokens_saved = 0
+
+    def create(self, model: Any, template: PromptTemplate) -> Any:
+        self.created += 1
+        return _LocalCachedModel(self, model, template)
+
+
+class PromptCache:
+    """Send registered prompts with the static prefix first.
+
+    Gemini's implicit caching discounts a repeated prompt prefix, so rendering
+    prefix + suffix is enough in production. The registered prefixes are far
+    below the explicit context-cache minimum, so no provider cache is created.
+    With a backend (the local counting stub) each (template, model) pair gets
+    one cached entry, renewed shortly before its TTL runs out; pairs the
+    backend rejects are remembered and sent as plain prompts.
+    """
+
+    RENEW_MARGIN_S = 60
+
+    def __init__(self, backend: Any = None):
+        self.backend = backend
+        self._entries: Dict[Tuple[str, str], Tuple[Any, float]] = {}
+        self._uncacheable: Set[Tuple[str, str]] = set()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "created": 0, "uncached": 0}
+
+    def _cached_model(self, model: Any, template: PromptTemplate) -> Optional[Any]:
+        if self.backend is None:
+            return None
+        key = (template.name, model_name_of(model))
+        with self._lock:
+            if key in self._uncacheable:
+                return None
+            entry = self._entries.get(key)
+            if entry and entry[1] - self.RENEW_MARGIN_S > time.time():
+                self.stats["hits"] += 1
+                return entry[0]
+        # Created outside the lock so a slow backend never holds up other calls;
+        # threads racing on a new pair may each create one, the last one is kept
+        try:
+            cached = self.backend.create(model, template)
+        except Exception as e:
+            print(f"⚠️ Prompt prefix caching unavailable for {template.name} on {key[1]}: {e}")
+            with self._lock:
+                self._uncacheable.add(key)
+            return None
+        with self._lock:
+            self._entries[key] = (cached, time.time() + self.backend.ttl_s)
+            self.stats["created"] += 1
+        print(f"🗄️ Cached prompt prefix '{template.name}' for {key[1]} (~{estimate_tokens(template.prefix)} tokens, {self.backend.name})")
+        return cached
+
+    def generate(self, model: Any, name: str, values: Dict[str, Any], **kwargs: Any) -> Any:
+        """generate_content for template ``name`` filled with ``values``; kwargs pass through (e.g. stream=True)."""
+        template = get_prompt(name)
+        cached = self._cached_model(model, template)
+        if cached is None:
+            with self._lock:
+                self.stats["uncached"] += 1
+            return model.generate_content(template.render(**values), **kwargs)
+        return cached.generate_content(template.suffix_text(**values), **kwargs)
+
+
+_prompt_cache: Optional[PromptCache] = None
+
+
+def get_prompt_cache() -> PromptCache:
+    """Process-wide PromptCache using the PROMPT_CACHE_BACKEND setting (off | local)."""
+    global _prompt_cache
+    if _prompt_cache is None:
+        backend = LocalCacheBackend() if PROMPT_CACHE_BACKEND == "local" else None
+        _prompt_cache = PromptCache(backend)
+    return _prompt_cache
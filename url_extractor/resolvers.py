@@ -1,19 +1,30 @@
 from __future__ import annotations
+import asyncio
+import html
+from abc import ABC, abstractmethod
 import json
 import re
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
 
 import requests
-from bs4 import BeautifulSoup
 
 try:
     import google.generativeai as genai
 except Exception:
     genai = None  # optional
 
-from .config import GEMINI_API_KEY, SERPAPI_API_KEY, DEFAULT_USER_AGENT
+from .cache import TTLStore
+from .config import (
+    GEMINI_API_KEY, SERPAPI_API_KEY, DEFAULT_USER_AGENT, SEMANTIC_CONFIDENCE_THRESHOLD,
+    SEMANTIC_MIN_SIMILARITY, CACHE_DIR, SEARCH_CACHE_TTL_S,
+)
+from .http_client import get_async_client, close_async_client
+from .model_router import get_model_router
 from .normalizer import normalize_user_text, extract_keywords
+from .semantic import SemanticIndex, np
+from .structured import json_config, parse_structured, response_text
 
 ROOT = Path(__file__).resolve().parents[1]
 FORMS_JSON = ROOT / "forms.json"
@@ -91,17 +102,79 @@ class SynonymResolver:
         return sorted({c["url"]: c for c in cands}.values(), key=lambda x: x["score"], reverse=True)
 
 
+class SemanticResolver:
+    """Local similarity match of the request against forms.json entries and their synonyms."""
+
+    _index_cache: Dict[str, SemanticIndex] = {}
+
+    def __init__(self, forms_db: Dict[str, Dict[str, Any]], min_similarity: float = SEMANTIC_MIN_SIMILARITY):
+        self.forms_db = forms_db
+        self.min_similarity = min_similarity
+        self.index = self._get_index(forms_db) if np is not None else None
+
+    @classmethod
+    def _get_index(cls, forms_db: Dict[str, Dict[str, Any]]) -> SemanticIndex:
+        fingerprint = json.dumps(forms_db, sort_keys=True)
+        index = cls._index_cache.get(fingerprint)
+        if index is None:
+            docs = []
+            for key, entry in forms_db.items():
+                url_words = re.sub(r"[^a-zA-Z0-9]+", " ", entry.get("url", ""))
+                docs.append((key, f"{key.replace('_', ' ')} {entry.get('title', '')} {url_words}"))
+                for phrase in SYNONYMS.get(key, []):
+                    docs.append((key, phrase))
+            index = SemanticIndex(docs)
+            cls._index_cache = {fingerprint: index}
+        return index
+
+    def resolve(self, user_text: str) -> List[ResolutionCandidate]:
+        if self.index is None:
+            return []
+        cands: List[ResolutionCandidate] = []
+        for key, sim in self.index.query(normalize_user_text(user_text), top_k=3):
+            if sim < self.min_similarity:
+                continue
+            url = self.forms_db.get(key, {}).get("url")
+            if url:
+                cands.append({
+                    "url": url,
+                    "title": f"Semantic match: {key}",
+                    "score": round(min(0.5 + 0.4 * sim, 0.9), 3),
+                    "source": "semantic",
+                    "debug": {"matched_key": key, "similarity": round(sim, 3)}
+                })
+        return cands
+
+
+URL_CANDIDATES_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "title": {"type": "string", "nullable": True},
+            "url": {"type": "string"},
+            "score": {"type": "number", "nullable": True},
+            "reason": {"type": "string", "nullable": True},
+        },
+        "required": ["url"],
+    },
+}
+URL_CANDIDATES_CONFIG = json_config(URL_CANDIDATES_SCHEMA)
+
+
 class AIIntentResolver:
     def __init__(self):
         self.enabled = bool(GEMINI_API_KEY and genai)
         if self.enabled:
             genai.configure(api_key=GEMINI_API_KEY)
-            self.model = genai.GenerativeModel("gemini-2.5-flash")
+            self.router = get_model_router()
         else:
-            self.model = None
+            self.router = None
 
-    def resolve(self, user_text: str, forms_db: Dict[str, Dict[str, Any]]) -> List[ResolutionCandidate]:
-        if not self.enabled or not self.model:
+    def resolve(self, user_text: str, forms_db: Dict[str, Dict[str, Any]],
+                confidence: float = 0.0) -> List[ResolutionCandidate]:
+        """``confidence`` is the best local semantic similarity; far-off requests get a stronger model."""
+        if not self.enabled or not self.router:
             return []
         prompt = f"""
 You are a smart URL resolver for government and institutional forms in India.
@@ -111,17 +184,21 @@ Prefer official government domains when applicable. Respond strictly as JSON lis
 User request: {user_text}
 Known forms keys (for preference if relevant): {list(forms_db.keys())}
 """
+
+        def ask(model):
+            resp = model.generate_content(prompt, generation_config=URL_CANDIDATES_CONFIG)
+            return parse_structured(response_text(resp), URL_CANDIDATES_SCHEMA)
+
         try:
-            resp = self.model.generate_content(prompt)
-            text = (resp.text or "").strip()
-            text = re.sub(r"^```[a-zA-Z]*\n?", "", text)
-            text = re.sub(r"```$", "", text)
-            data = json.loads(text)
+            data = self.router.call(
+                "intent", ask, low_confidence=confidence < SEMANTIC_CONFIDENCE_THRESHOLD / 2, accept=bool
+            )
             cands: List[ResolutionCandidate] = []
             for item in data[:5]:
                 url = item.get("url")
                 title = item.get("title") or "AI candidate"
-                score = float(item.get("score", 0.65))
+                score = item.get("score")
+                score = 0.65 if score is None else float(score)
                 cands.append({
                     "url": url,
                     "title": title,
@@ -140,31 +217,98 @@ Known forms keys (for preference if relevant): {list(forms_db.keys())}
             return []
 
 
+class SearchBackend(ABC):
+    """Async web search returning (url, title) pairs."""
+    name = "base"
+
+    @abstractmethod
+    async def search(self, query: str, max_results: int = 5) -> List[Tuple[str, str]]:
+        ...
+
+
+DDG_RESULT_RE = re.compile(r'<a\b([^>]*\bclass="[^"]*\bresult__a\b[^"]*"[^>]*)>(.*?)</a>', re.S | re.I)
+HREF_RE = re.compile(r'\bhref="([^"]+)"', re.I)
+TAG_RE = re.compile(r"<[^>]+>")
+
+
+def parse_ddg_results(page: str, max_results: int = 5) -> List[Tuple[str, str]]:
+    """Pull result anchors out of DuckDuckGo's HTML page without building a DOM."""
+    results = []
+    for m in DDG_RESULT_RE.finditer(page):
+        href_m = HREF_RE.search(m.group(1))
+        if not href_m:
+            continue
+        href = html.unescape(href_m.group(1))
+        # Redirect links carry the real target in the uddg parameter
+        if "duckduckgo.com/l/" in href:
+            href = parse_qs(urlsplit(href).query).get("uddg", [""])[0]
+        title = html.unescape(TAG_RE.sub("", m.group(2))).strip()
+        if href.startswith("http"):
+            results.append((href, title))
+        if len(results) >= max_results:
+            break
+    return results
+
+
+class DuckDuckGoBackend(SearchBackend):
+    name = "ddg"
+    url = "https://duckduckgo.com/html/"
+
+    def __init__(self, timeout_s: float = 15.0):
+        self.timeout_s = timeout_s
+        self._session = None  # sync fallback when httpx is missing
+
+    async def search(self, query: str, max_results: int = 5) -> List[Tuple[str, str]]:
+        client = get_async_client()
+        if client is not None:
+            r = await client.get(self.url, params={"q": query}, timeout=self.timeout_s)
+            r.raise_for_status()
+            text = r.text
+        else:
+            if self._session is None:
+                self._session = requests.Session()
+                self._session.headers.update({"User-Agent": DEFAULT_USER_AGENT})
+            r = await asyncio.to_thread(self._session.get, self.url, params={"q": query}, timeout=self.timeout_s)
+            r.raise_for_status()
+            text = r.text
+        return parse_ddg_results(text, max_results)
+
+
+class StaticSearchBackend(SearchBackend):
+    """Offline stub: serves canned results by normalized query (for tests and demos)."""
+    name = "static"
+
+    def __init__(self, results: Dict[str, List[Tuple[str, str]]]):
+        self.results = {normalize_user_text(q): r for q, r in results.items()}
+
+    async def search(self, query: str, max_results: int = 5) -> List[Tuple[str, str]]:
+        return list(self.results.get(normalize_user_text(query), []))[:max_results]
+
+
 class WebSearchResolver:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({"User-Agent": DEFAULT_USER_AGENT})
-
-    def _ddg_search(self, query: str, max_results: int = 5) -> List[Tuple[str, str]]:
-        url = "https://duckduckgo.com/html/"
-        params = {"q": query}
-        r = self.session.get(url, params=params, timeout=15)
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-        results = []
-        for a in soup.select("a.result__a"):
-            href = a.get("href")
-            title = a.get_text(strip=True)
-            if href and href.startswith("http"):
-                results.append((href, title))
-            if len(results) >= max_results:
-                break
-        return results
+    def __init__(self, backend: Optional[SearchBackend] = None, cache: Optional[TTLStore] = None, ttl_s: int = SEARCH_CACHE_TTL_S):
+        self.backend = backend or DuckDuckGoBackend()
+        self.cache = cache if cache is not None else TTLStore(CACHE_DIR / "search.json")
+        self.ttl_s = ttl_s
 
-    def resolve(self, user_text: str) -> List[ResolutionCandidate]:
+    async def _search(self, query: str, max_results: int) -> List[Tuple[str, str]]:
+        key = f"{self.backend.name}:{max_results}:{query}"
+        rec = self.cache.get(key)
+        if rec:
+            return [tuple(pair) for pair in rec["value"]]
+        try:
+            pairs = await self.backend.search(query, max_results=max_results)
+        except Exception as e:
+            print(f"⚠️ Web search failed: {e}")
+            return []
+        if pairs:
+            self.cache.set(key, pairs, self.ttl_s)
+        return pairs
+
+    async def resolve_async(self, user_text: str) -> List[ResolutionCandidate]:
         nt = normalize_user_text(user_text)
         query = nt
-        pairs = self._ddg_search(query, max_results=6)
+        pairs = await self._search(query, max_results=6)
         cands: List[ResolutionCandidate] = []
         for href, title in pairs:
             score = 0.55
@@ -176,28 +320,59 @@ class WebSearchResolver:
                 "title": title or "search result",
                 "score": min(score, 0.8),
                 "source": "web_search",
-                "debug": {"engine": "ddg"}
+                "debug": {"engine": self.backend.name}
             })
         return cands
 
+    def resolve(self, user_text: str) -> List[ResolutionCandidate]:
+        return _run_sync(self.resolve_async(user_text))
+
 
-def resolve_candidates(user_text: str) -> List[ResolutionCandidate]:
-    forms_db = load_forms_db()
-    pipeline = [
-        KnownFormsResolver(forms_db).resolve,
-        SynonymResolver(forms_db).resolve,
-    ]
-    ai = AIIntentResolver()
-    pipeline.append(lambda text: ai.resolve(text, forms_db))
-    pipeline.append(WebSearchResolver().resolve)
+def _run_sync(coro):
+    """Run ``coro`` for a synchronous caller; the pooled HTTP client is closed with its loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        coro.close()
+        raise RuntimeError("called from a running event loop; await the *_async variant instead")
+
+    async def run():
+        try:
+            return await coro
+        finally:
+            await close_async_client()
+
+    return asyncio.run(run())
 
+
+async def resolve_candidates_async(user_text: str, search_backend: Optional[SearchBackend] = None) -> List[ResolutionCandidate]:
+    forms_db = load_forms_db()
     seen = set()
     all_cands: List[ResolutionCandidate] = []
-    for step in pipeline:
-        for c in step(user_text):
+
+    def add(cands: List[ResolutionCandidate]) -> None:
+        for c in cands:
             url = c.get("url")
             if not url or url in seen:
                 continue
             seen.add(url)
             all_cands.append(c)
+
+    add(KnownFormsResolver(forms_db).resolve(user_text))
+    add(SynonymResolver(forms_db).resolve(user_text))
+    semantic = SemanticResolver(forms_db).resolve(user_text)
+    add(semantic)
+    # Only pay for the LLM when the local semantic match is not confident;
+    # it runs in a worker thread alongside the web search
+    confidence = max((c["debug"]["similarity"] for c in semantic), default=0.0)
+    search = asyncio.create_task(WebSearchResolver(search_backend).resolve_async(user_text))
+    if confidence < SEMANTIC_CONFIDENCE_THRESHOLD:
+        add(await asyncio.to_thread(AIIntentResolver().resolve, user_text, forms_db, confidence))
+    add(await search)
     return sorted(all_cands, key=lambda x: x["score"], reverse=True)
+
+
+def resolve_candidates(user_text: str, search_backend: Optional[SearchBackend] = None) -> List[ResolutionCandidate]:
+    return _run_sync(resolve_candidates_async(user_text, search_backend))
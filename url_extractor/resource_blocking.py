@@ -0,0 +1,75 @@
+from __future__ import annotations
+from typing import Dict, Any, Iterable, List, Optional
+from urllib.parse import urlparse
+
+# Playwright resource types dropped by each profile. Stylesheets and scripts are
+# never blocked: visibility checks and SPA forms depend on them.
+BLOCK_PROFILES: Dict[str, frozenset] = {
+    "off": frozenset(),
+    "trackers": frozenset(),
+    "light": frozenset({"media", "font"}),
+    "strict": frozenset({"media", "font", "image", "texttrack", "manifest"}),
+}
+
+# Analytics/ads hosts blocked by every profile except "off"
+TRACKER_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "adservice.google.com",
+    "connect.facebook.net",
+    "hotjar.com",
+    "clarity.ms",
+    "scorecardresearch.com",
+    "nr-data.net",
+    "mixpanel.com",
+    "segment.io",
+)
+
+RESOURCE_TYPES = {
+    "document", "stylesheet", "image", "media", "font", "script", "texttrack",
+    "xhr", "fetch", "eventsource", "websocket", "manifest", "other",
+}
+
+
+def _is_tracker(url: str) -> bool:
+    host = urlparse(url).hostname or ""
+    return any(host == t or host.endswith("." + t) for t in TRACKER_HOSTS)
+
+
+def allowlist_for_url(url: str, forms_db: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Collect ``allow_resources`` from every forms.json entry on the same host as ``url``."""
+    host = urlparse(url).hostname
+    allow: List[str] = []
+    for entry in forms_db.values():
+        if host and urlparse(entry.get("url", "")).hostname == host:
+            allow.extend(entry.get("allow_resources", []))
+    return allow
+
+
+async def apply_resource_blocking(context, profile: str = "strict", allow: Optional[Iterable[str]] = None) -> None:
+    """Route every request of ``context`` through the given blocking profile.
+
+    ``allow`` entries are either resource types (e.g. "image") that the profile
+    should let through, or URL substrings (e.g. "captcha") that are always loaded.
+    """
+    if profile not in BLOCK_PROFILES:
+        raise ValueError(f"Unknown resource blocking profile: {profile!r}")
+    if profile == "off":
+        return
+    allow = list(allow or [])
+    allowed_types = {a for a in allow if a in RESOURCE_TYPES}
+    allowed_urls = [a for a in allow if a not in RESOURCE_TYPES]
+    blocked_types = BLOCK_PROFILES[profile] - allowed_types
+
+    async def handler(route):
+        request = route.request
+        url = request.url
+        if not any(a in url for a in allowed_urls):
+            if request.resource_type in blocked_types or _is_tracker(url):
+                await route.abort()
+                return
+        await route.continue_()
+
+    await context.route("**/*", handler)
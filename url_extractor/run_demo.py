@@ -1,20 +1,30 @@
 import asyncio
 import json
 import sys
-from .service import resolve_form_url
+from .http_client import close_async_client
+from .service import resolve_form_url, wait_for_background_tasks
 
 async def main():
     if len(sys.argv) < 2:
-        print("Usage: python -m url_extractor.run_demo \"<your request>\" [--visible]")
+        print("Usage: python -m url_extractor.run_demo \"<your request>\" [--visible] [--no-cache] [--crawl] [--user <id>]")
         print("\nExamples:")
         print('  python -m url_extractor.run_demo "I want to pay my income tax"')
         print('  python -m url_extractor.run_demo "help me e-verify my ITR" --visible')
         print("\nOptions:")
         print("  --visible: Run browser in visible mode (for manual login if needed)")
+        print("  --no-cache: Ignore the resolution cache and resolve from scratch")
+        print("  --crawl: Explore several links per depth level in parallel")
+        print("  --user <id>: Restore/save this user's login sessions (the bot's Telegram id) in the session vault")
         return
     
     query = sys.argv[1]
     headless = "--visible" not in sys.argv
+    use_cache = "--no-cache" not in sys.argv
+    crawl = "--crawl" in sys.argv
+    user_id = None
+    if "--user" in sys.argv:
+        i = sys.argv.index("--user")
+        user_id = sys.argv[i + 1] if i + 1 < len(sys.argv) else None
     
     print(f"\n{'='*60}")
     print(f"🔍 Resolving form URL for: {query}")
@@ -26,7 +36,10 @@ async def main():
         verify=True, 
         navigate=True,
         headless=headless,
-        timeout_s=20
+        timeout_s=20,
+        use_cache=use_cache,
+        crawl=crawl,
+        user_id=user_id
     )
     
     print(f"\n{'='*60}")
@@ -34,6 +47,15 @@ async def main():
     print(f"{'='*60}")
     print(f"✅ Best URL: {url}")
     
+    if meta.get("cache", {}).get("hit"):
+        c = meta["cache"]
+        print(f"♻️  From cache (age {c['age_s']:.0f}s{', stale - refreshing' if c['stale'] else ''})")
+    
+    if meta.get("hint_cache"):
+        h = meta["hint_cache"]
+        rate = f"{h['hit_rate']:.0%}" if h["hit_rate"] is not None else "n/a"
+        print(f"🧠 Navigation hint cache: {h['hits']} hits, {h['misses']} misses (hit rate {rate})")
+    
     if meta.get("needs_login"):
         print("⚠️  Login Required: Try running with --visible flag")
     
@@ -57,6 +79,11 @@ async def main():
     
     print(f"\n💾 Full metadata:")
     print(json.dumps(meta, indent=2, default=str))
+    if meta.get("cache", {}).get("stale"):
+        print("\n♻️  Refreshing the stale cache entry...")
+    # A stale hit revalidates in the background; finish it before the loop closes
+    await wait_for_background_tasks()
+    await close_async_client()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,79 @@
+from __future__ import annotations
+import re
+import zlib
+from typing import List, Tuple
+
+try:
+    import numpy as np
+except Exception:
+    np = None  # optional
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Filler words that carry no intent ("i want to fill my ...")
+STOPWORDS = {
+    "a", "an", "the", "i", "me", "my", "to", "for", "of", "on", "in", "and", "or",
+    "want", "need", "would", "like", "please", "help", "with", "can", "you", "do",
+    "how", "fill", "form", "online", "www", "https", "http", "com", "gov",
+}
+
+
+class HashedTfEmbedder:
+    """CPU-only text embedder using the hashing trick over words and char trigrams.
+
+    Words carry the exact-match signal; character trigrams let "epaytax" match
+    "e pay tax" and tolerate small typos. Hashes use crc32 so vectors are stable
+    across processes.
+    """
+
+    def __init__(self, dim: int = 2048):
+        self.dim = dim
+
+    @staticmethod
+    def features(text: str) -> List[Tuple[str, float]]:
+        words = [w for w in TOKEN_RE.findall(text.lower()) if w not in STOPWORDS]
+        feats: List[Tuple[str, float]] = [("w:" + w, 1.0) for w in words]
+        # Trigrams over the joined text so split/merged spellings still overlap
+        joined = "".join(words)
+        feats.extend(("c:" + joined[i:i + 3], 0.5) for i in range(len(joined) - 2))
+        return feats
+
+    def embed_many(self, texts: List[str]) -> "np.ndarray":
+        mat = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feat, weight in self.features(text):
+                h = zlib.crc32(feat.encode("utf-8"))
+                sign = 1.0 if h & 0x80000000 else -1.0
+                mat[row, h % self.dim] += sign * weight
+        # Sublinear tf, then L2 normalise so a dot product is cosine similarity
+        mat = np.sign(mat) * np.log1p(np.abs(mat))
+        norms = np.linalg.norm(mat, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return mat / norms
+
+
+class SemanticIndex:
+    """Precomputed matrix of document vectors answering queries with one matmul.
+
+    Several documents may share a label (a form key plus each of its synonyms);
+    a label's score is the best similarity among its documents.
+    """
+
+    def __init__(self, docs: List[Tuple[str, str]], embedder: HashedTfEmbedder = None):
+        if np is None:
+            raise RuntimeError("numpy is required for SemanticIndex")
+        self.embedder = embedder or HashedTfEmbedder()
+        self.labels = sorted({label for label, _ in docs})
+        label_pos = {label: i for i, label in enumerate(self.labels)}
+        self.doc_labels = np.array([label_pos[label] for label, _ in docs], dtype=np.int64)
+        self.matrix = self.embedder.embed_many([text for _, text in docs])
+
+    def query(self, text: str, top_k: int = 3) -> List[Tuple[str, float]]:
+        if not self.labels:
+            return []
+        q = self.embedder.embed_many([text])[0]
+        sims = self.matrix @ q
+        best = np.full(len(self.labels), -1.0, dtype=np.float32)
+        np.maximum.at(best, self.doc_labels, sims)
+        order = np.argsort(-best)[:top_k]
+        return [(self.labels[i], float(best[i])) for i in order if best[i] > 0]
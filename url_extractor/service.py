@@ -1,16 +1,87 @@
 from __future__ import annotations
 import asyncio
-from typing import Dict, Any, Optional, Tuple
-from .resolvers import resolve_candidates
+import time
+from typing import Dict, Any, Optional, Set, Tuple
+from .cache import ResolutionCache
+from .probe import probe_candidates, OK as PROBE_OK, FAIL as PROBE_FAIL
+from .resolvers import resolve_candidates_async
 from .verify import verify_url, verify_and_navigate_to_form
 
+_resolution_cache: Optional[ResolutionCache] = None
+# Keys currently being refreshed in the background, and the tasks doing it
+_revalidating: Set[str] = set()
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def get_resolution_cache() -> ResolutionCache:
+    global _resolution_cache
+    if _resolution_cache is None:
+        _resolution_cache = ResolutionCache()
+    return _resolution_cache
+
+
+def _meta_from_cache(entry: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "candidates": [],
+        "needs_login": entry.get("needs_login", False),
+        "selected": entry.get("selected") or {"url": entry.get("url")},
+        "navigation": entry.get("navigation", {}),
+        "cache": {
+            "hit": True,
+            "negative": not entry.get("found"),
+            "stale": entry.get("stale", False),
+            "age_s": round(entry.get("age_s", 0.0), 1),
+        },
+    }
+
+
+def _add_hint_stats(meta: Dict[str, Any], nav_result: Dict[str, Any]) -> None:
+    """Fold one candidate's navigation hint cache hits/misses into meta["hint_cache"]."""
+    stats = meta.setdefault("hint_cache", {"hits": 0, "misses": 0, "hit_rate": None})
+    for k in ("hits", "misses"):
+        stats[k] += nav_result.get("hint_cache", {}).get(k, 0)
+    total = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / total, 3) if total else None
+
+
+async def _revalidate(user_text: str, timeout_s: int, pool=None) -> None:
+    cache = get_resolution_cache()
+    key = cache.key_for(user_text)
+    try:
+        url, meta = await _resolve_uncached(user_text, True, True, True, timeout_s, pool=pool)
+        cache.store_result(user_text, url, meta)
+    except Exception as e:
+        print(f"⚠️ Background revalidation failed for '{key}': {e}")
+    finally:
+        _revalidating.discard(key)
+
+
+def _schedule_revalidation(user_text: str, timeout_s: int, pool=None) -> None:
+    key = get_resolution_cache().key_for(user_text)
+    if key in _revalidating:
+        return
+    _revalidating.add(key)
+    task = asyncio.create_task(_revalidate(user_text, timeout_s, pool))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def wait_for_background_tasks() -> None:
+    """Let pending cache revalidations finish (e.g. before closing a shared BrowserPool)."""
+    if _background_tasks:
+        await asyncio.gather(*list(_background_tasks), return_exceptions=True)
+
 
 async def resolve_form_url(
     user_text: str, 
     verify: bool = True, 
     navigate: bool = True,
     headless: bool = True,
-    timeout_s: int = 20
+    timeout_s: int = 20,
+    use_cache: bool = True,
+    crawl: bool = False,
+    user_id: Any = None,
+    pool=None
 ) -> Tuple[Optional[str], Dict[str, Any]]:
     """
     High-level API to get the best URL for a user request.
@@ -21,6 +92,10 @@ async def resolve_form_url(
         navigate: If True, intelligently navigate to find form page
         headless: Browser visibility (False = visible for manual login)
         timeout_s: Timeout per URL check
+        use_cache: Serve and record navigated results in the persistent resolution cache
+        crawl: Explore links breadth-first in parallel pages instead of one link per attempt
+        user_id: Reuse/save this user's login sessions from the encrypted session vault
+        pool: Shared BrowserPool to lease contexts from instead of launching Chromium per URL
     
     Returns:
         (url, metadata) where metadata contains:
@@ -28,9 +103,46 @@ async def resolve_form_url(
         - selected: the chosen candidate
         - navigation: navigation details if navigate=True
         - needs_login: whether manual login is required
+        - cache: present on cache hits (hit, negative, stale, age_s)
+        - hint_cache: navigation hint cache hits, misses and hit_rate across navigated candidates
+        - timings: seconds spent per stage (candidates, probe, navigate/verify, cache)
     """
-    candidates = resolve_candidates(user_text)
-    meta: Dict[str, Any] = {"candidates": candidates, "needs_login": False}
+    # Only the full verify+navigate flow is cached; it is the expensive one
+    cacheable = use_cache and verify and navigate
+    if cacheable:
+        started = time.perf_counter()
+        cache = get_resolution_cache()
+        entry = cache.lookup(user_text)
+        # A login failure seen headless is worth retrying when the user can log in
+        if entry and not (not entry.get("found") and entry.get("needs_login") and not headless):
+            if entry.get("found") and entry.get("stale") and not entry.get("needs_login"):
+                _schedule_revalidation(user_text, timeout_s, pool)
+            print(f"♻️ Cache hit for '{cache.key_for(user_text)}' (age {entry['age_s']:.0f}s)")
+            meta = _meta_from_cache(entry)
+            meta["timings"] = {"cache": round(time.perf_counter() - started, 4)}
+            return entry.get("url"), meta
+
+    url, meta = await _resolve_uncached(user_text, verify, navigate, headless, timeout_s, crawl, user_id, pool)
+    if cacheable:
+        get_resolution_cache().store_result(user_text, url, meta)
+    return url, meta
+
+
+async def _resolve_uncached(
+    user_text: str,
+    verify: bool,
+    navigate: bool,
+    headless: bool,
+    timeout_s: int,
+    crawl: bool = False,
+    user_id: Any = None,
+    pool=None
+) -> Tuple[Optional[str], Dict[str, Any]]:
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    candidates = await resolve_candidates_async(user_text)
+    timings["candidates"] = round(time.perf_counter() - started, 4)
+    meta: Dict[str, Any] = {"candidates": candidates, "needs_login": False, "timings": timings}
     
     if not candidates:
         return None, meta
@@ -40,20 +152,38 @@ async def resolve_form_url(
         meta["selected"] = best
         return best.get("url"), meta
 
+    # Cheap concurrent HTTP probe of the top candidates before any browser launch
+    top = candidates[:5]
+    started = time.perf_counter()
+    probes = await probe_candidates([c["url"] for c in top], timeout_s=min(timeout_s, 10))
+    timings["probe"] = round(time.perf_counter() - started, 4)
+    for cand in top:
+        pr = probes[cand["url"]]
+        cand["probe"] = {"verdict": pr.verdict, "reason": pr.reason, "status": pr.status}
+
     # Try candidates with navigation if enabled
+    started = time.perf_counter()
     if navigate:
-        for cand in candidates[:5]:
+        for cand in top:
+            if cand["probe"]["verdict"] == PROBE_FAIL:
+                print(f"\n⏭️ Skipping candidate: {cand['url']} ({cand['probe']['reason']})")
+                continue
             print(f"\n🔍 Trying candidate: {cand['url']} (score: {cand['score']:.2f})")
             nav_result = await verify_and_navigate_to_form(
                 cand["url"], 
                 user_text, 
                 headless=headless,
-                timeout_ms=timeout_s * 1000
+                timeout_ms=timeout_s * 1000,
+                crawl=crawl,
+                user_id=user_id,
+                pool=pool
             )
             cand["navigation"] = nav_result
+            _add_hint_stats(meta, nav_result)
             
             if nav_result["found"]:
                 print(f"✅ Found form at: {nav_result['final_url']}")
+                timings["navigate"] = round(time.perf_counter() - started, 4)
                 meta["selected"] = cand
                 meta["navigation"] = nav_result
                 return nav_result["final_url"], meta
@@ -67,19 +197,29 @@ async def resolve_form_url(
         
         # None found with navigation
         print("❌ Could not find form page in any candidate")
+        timings["navigate"] = round(time.perf_counter() - started, 4)
         meta["selected"] = candidates[0]
         meta["navigation"] = candidates[0].get("navigation", {})
         return candidates[0]["url"], meta
     
     else:
-        # Simple verification without navigation
-        for cand in candidates[:5]:
-            ok, reason = await verify_url(cand["url"], timeout_ms=timeout_s * 1000)
+        # Simple verification without navigation; the browser only sees
+        # candidates the HTTP probe could not decide
+        for cand in top:
+            verdict = cand["probe"]["verdict"]
+            if verdict == PROBE_OK:
+                ok, reason = True, "ok (http probe)"
+            elif verdict == PROBE_FAIL:
+                ok, reason = False, cand["probe"]["reason"]
+            else:
+                ok, reason = await verify_url(cand["url"], timeout_ms=timeout_s * 1000, probe=False, pool=pool)
             cand["verify"] = {"ok": ok, "reason": reason}
             if ok:
+                timings["verify"] = round(time.perf_counter() - started, 4)
                 meta["selected"] = cand
                 return cand["url"], meta
         
         # None verified, return top anyway
+        timings["verify"] = round(time.perf_counter() - started, 4)
         meta["selected"] = candidates[0]
         return candidates[0]["url"], meta
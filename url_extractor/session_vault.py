@@ -0,0 +1,103 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except Exception:
+    Fernet = None  # optional; the vault stays disabled without it
+    InvalidToken = Exception
+
+from .config import CACHE_DIR, SESSION_VAULT_KEY, SESSION_VAULT_MAX_AGE_S
+
+
+def _host_in_site(host: str, site: str) -> bool:
+    host = host.lstrip(".").lower()
+    return host == site or host.endswith("." + site)
+
+
+class SessionVault:
+    """Encrypted per-user, per-site store of Playwright storage state.
+
+    After a manual login the context's cookies and localStorage for the site are
+    saved here and fed to later contexts via ``new_context(storage_state=...)``
+    until the earliest persistent cookie or ``max_age_s`` expires. Without a
+    Fernet key (``SESSION_VAULT_KEY``) or the ``cryptography`` package nothing is
+    stored, so sessions are never written to disk in plaintext.
+    """
+
+    def __init__(self, directory: Path = CACHE_DIR / "sessions", key: Optional[str] = SESSION_VAULT_KEY, max_age_s: int = SESSION_VAULT_MAX_AGE_S):
+        self.directory = Path(directory)
+        self.max_age_s = max_age_s
+        self._fernet = None
+        if key and Fernet is not None:
+            try:
+                self._fernet = Fernet(key.encode())
+            except ValueError as e:
+                print(f"⚠️ SESSION_VAULT_KEY is not a valid Fernet key ({e}); login sessions will not be saved")
+
+    @property
+    def enabled(self) -> bool:
+        return self._fernet is not None
+
+    def _path(self, user_id: Any, site: str) -> Path:
+        digest = hashlib.sha256(f"{user_id}:{site}".encode("utf-8")).hexdigest()[:32]
+        return self.directory / f"{digest}.bin"
+
+    def load(self, user_id: Any, site: str) -> Optional[Dict[str, Any]]:
+        """Return a storage_state dict for ``new_context`` or None if absent/expired."""
+        if not self.enabled or user_id is None:
+            return None
+        path = self._path(user_id, site)
+        try:
+            record = json.loads(self._fernet.decrypt(path.read_bytes()))
+        except FileNotFoundError:
+            return None
+        except (InvalidToken, ValueError):
+            self.discard(user_id, site)
+            return None
+        if record.get("expires_at", 0) <= time.time():
+            self.discard(user_id, site)
+            return None
+        return record["state"]
+
+    def save(self, user_id: Any, site: str, state: Dict[str, Any]) -> bool:
+        """Store the part of ``state`` that belongs to ``site``; False if there is nothing to keep."""
+        if not self.enabled or user_id is None:
+            return False
+        cookies = [c for c in state.get("cookies", []) if _host_in_site(c.get("domain", ""), site)]
+        origins = [o for o in state.get("origins", []) if _host_in_site(o.get("origin", "").split("://")[-1].split(":")[0], site)]
+        if not cookies and not origins:
+            return False
+        now = time.time()
+        expires_at = now + self.max_age_s
+        persistent = [c["expires"] for c in cookies if c.get("expires", -1) > now]
+        if persistent:
+            expires_at = min(expires_at, min(persistent))
+        record = {"saved_at": now, "expires_at": expires_at, "state": {"cookies": cookies, "origins": origins}}
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(user_id, site)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(self._fernet.encrypt(json.dumps(record).encode("utf-8")))
+        os.replace(tmp, path)
+        return True
+
+    def discard(self, user_id: Any, site: str) -> None:
+        try:
+            self._path(user_id, site).unlink()
+        except FileNotFoundError:
+            pass
+
+
+_vault: Optional[SessionVault] = None
+
+
+def get_session_vault() -> SessionVault:
+    global _vault
+    if _vault is None:
+        _vault = SessionVault()
+    return _vault
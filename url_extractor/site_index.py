@@ -0,0 +1,99 @@
+from __future__ import annotations
+import gzip
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .config import CACHE_DIR, SITE_INDEX_MAX_AGE_S
+from .normalizer import normalize_user_text, extract_keywords
+from .semantic import STOPWORDS
+
+INDEX_DIR = CACHE_DIR / "site_index"
+
+# An indexed page must share this many of the request's keywords (or all of
+# them for shorter requests), and at least this fraction of them
+MIN_KEYWORD_OVERLAP = 2
+MIN_KEYWORD_SHARE = 0.5
+
+
+class SiteIndex:
+    """Compact per-site link graph built offline by ``build_site_index``.
+
+    ``pages`` rows are ``[url, title, visible_inputs, has_password, keywords]`` where
+    keywords come from the page title and the anchor texts that link to it;
+    ``edges`` are ``[from_row, to_row]`` pairs.
+    """
+
+    def __init__(self, site: str, pages: List[list], edges: List[List[int]], built_at: float):
+        self.site = site
+        self.pages = pages
+        self.edges = edges
+        self.built_at = built_at
+
+    @staticmethod
+    def path_for(site: str) -> Path:
+        return INDEX_DIR / f"{site}.json.gz"
+
+    def save(self) -> Path:
+        path = self.path_for(self.site)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"site": self.site, "built_at": self.built_at, "pages": self.pages, "edges": self.edges}
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        return path
+
+    @classmethod
+    def load(cls, site: str) -> Optional["SiteIndex"]:
+        path = cls.path_for(site)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, OSError, json.JSONDecodeError):
+            return None
+        return cls(data["site"], data["pages"], data["edges"], data["built_at"])
+
+    def best_form_page(self, user_request: str) -> Optional[Tuple[str, float]]:
+        """Best non-login page with visible inputs covering enough of the request's keywords.
+
+        Returns ``(url, share)`` where share is the fraction of the request's
+        keywords found on the page; pages sharing fewer than
+        ``MIN_KEYWORD_OVERLAP`` keywords (or all of them, for shorter requests)
+        or less than ``MIN_KEYWORD_SHARE`` of them are ignored.
+        """
+        words = {w for w in extract_keywords(normalize_user_text(user_request)) if len(w) > 2 and w not in STOPWORDS}
+        if not words:
+            return None
+        needed = min(MIN_KEYWORD_OVERLAP, len(words))
+        best: Optional[Tuple[str, float]] = None
+        for url, _title, inputs, has_password, keywords in self.pages:
+            if not inputs or has_password:
+                continue
+            overlap = len(words & set(keywords))
+            share = overlap / len(words)
+            if overlap < needed or share < MIN_KEYWORD_SHARE:
+                continue
+            if best is None or share > best[1]:
+                best = (url, share)
+        return best
+
+
+_loaded: Dict[str, Tuple[float, Optional[SiteIndex]]] = {}
+
+
+def lookup_form_page(site: str, user_request: str) -> Optional[str]:
+    """Known form page on ``site`` for this request, if a fresh index exists."""
+    path = SiteIndex.path_for(site)
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return None
+    cached = _loaded.get(site)
+    if not cached or cached[0] != mtime:
+        cached = (mtime, SiteIndex.load(site))
+        _loaded[site] = cached
+    index = cached[1]
+    if not index or time.time() - index.built_at > SITE_INDEX_MAX_AGE_S:
+        return None
+    best = index.best_form_page(user_request)
+    return best[0] if best else None
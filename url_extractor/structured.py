@@ -0,0 +1,168 @@
+from __future__ import annotations
+import json
+import re
+from typing import Any, Dict, Optional
+
+try:
+    import orjson
+except Exception:
+    orjson = None  # optional; the stdlib parser is used instead
+
+
+class MalformedResponse(ValueError):
+    """Model output that is not JSON matching the requested schema, even after repair."""
+
+
+def json_config(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """generation_config asking Gemini for JSON constrained to ``schema`` (OpenAPI subset)."""
+    return {"response_mime_type": "application/json", "response_schema": schema}
+
+
+def response_text(response: Any) -> str:
+    try:
+        return response.text or ""
+    except Exception:
+        return ""  # e.g. a response blocked by safety filters
+
+
+FENCE_START = re.compile(r"^\s*```[a-zA-Z]*\s*")
+FENCE_END = re.compile(r"\s*```\s*$")
+TRAILING_COMMA = re.compile(r",(\s*[\]}])")
+# Complete objects kept when an array answer was cut off mid-object
+MAX_TRUNCATION_CUTS = 3
+
+
+def _loads(text: str) -> Any:
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+
+def _schema_type(schema: Dict[str, Any]) -> str:
+    return str(schema.get("type", "")).lower()
+
+
+def _repair(text: str, root: str) -> Optional[Any]:
+    """Undo the usual defects: markdown fences, prose around the JSON, trailing commas, truncation."""
+    text = FENCE_END.sub("", FENCE_START.sub("", text))
+    opener, closer = ("[", "]") if root == "array" else ("{", "}")
+    start = text.find(opener)
+    if start < 0 and root == "array":
+        # A lone object where a list was asked for
+        opener, closer = "{", "}"
+        start = text.find(opener)
+    if start < 0:
+        return None
+    end = text.rfind(closer)
+    body = text[start:end + 1] if end > start else text[start:]
+    try:
+        return _loads(TRAILING_COMMA.sub(r"\1", body))
+    except ValueError:
+        pass
+    if opener == "[":
+        cut = len(body)
+        for _ in range(MAX_TRUNCATION_CUTS):
+            cut = body.rfind("}", 0, cut)
+            if cut < 0:
+                break
+            try:
+                return _loads(TRAILING_COMMA.sub(r"\1", body[:cut + 1] + "]"))
+            except ValueError:
+                pass
+    return None
+
+
+def validate(value: Any, schema: Dict[str, Any], path: str = "$") -> Any:
+    """Check ``value`` against ``schema`` and return it with trivial coercions applied.
+
+    Numeric strings become numbers, scalars (and lists of them, comma-joined)
+    become strings where a string is expected, enum values are matched
+    case-insensitively and a lone object becomes a one-item array. Invalid
+    array items are dropped; any other mismatch raises MalformedResponse.
+    """
+    kind = _schema_type(schema)
+    if value is None:
+        if schema.get("nullable") or not kind:
+            return None
+        raise MalformedResponse(f"{path}: null")
+    if kind == "object":
+        if not isinstance(value, dict):
+            raise MalformedResponse(f"{path}: expected object, got {type(value).__name__}")
+        missing = [k for k in schema.get("required", ()) if value.get(k) is None]
+        if missing:
+            raise MalformedResponse(f"{path}: missing {', '.join(missing)}")
+        out = dict(value)
+        for key, sub in schema.get("properties", {}).items():
+            if key not in value:
+                continue
+            try:
+                out[key] = validate(value[key], sub, f"{path}.{key}")
+            except MalformedResponse:
+                if key in schema.get("required", ()) or not sub.get("nullable"):
+                    raise
+                out[key] = None
+        return out
+    if kind == "array":
+        if isinstance(value, dict):
+            value = [value]
+        if not isinstance(value, list):
+            raise MalformedResponse(f"{path}: expected array, got {type(value).__name__}")
+        items = schema.get("items")
+        if not items:
+            return value
+        out = []
+        for n, item in enumerate(value):
+            try:
+                out.append(validate(item, items, f"{path}[{n}]"))
+            except MalformedResponse:
+                continue
+        return out
+    if kind == "string":
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        elif isinstance(value, list) and all(isinstance(v, (str, int, float)) for v in value):
+            value = ", ".join(str(v) for v in value)
+        if not isinstance(value, str):
+            raise MalformedResponse(f"{path}: expected string, got {type(value).__name__}")
+        enum = schema.get("enum")
+        if enum and value not in enum:
+            match = next((e for e in enum if e.lower() == value.strip().lower()), None)
+            if match is None:
+                raise MalformedResponse(f"{path}: {value!r} not one of {', '.join(enum)}")
+            value = match
+        return value
+    if kind in ("integer", "number"):
+        if isinstance(value, str):
+            try:
+                value = float(value.strip())
+            except ValueError:
+                raise MalformedResponse(f"{path}: expected {kind}, got {value!r}")
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise MalformedResponse(f"{path}: expected {kind}, got {type(value).__name__}")
+        if kind == "integer":
+            if value != value or value in (float("inf"), float("-inf")) or value != int(value):
+                raise MalformedResponse(f"{path}: expected integer, got {value}")
+            return int(value)
+        return value
+    if kind == "boolean":
+        if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+            return value.strip().lower() == "true"
+        if not isinstance(value, bool):
+            raise MalformedResponse(f"{path}: expected boolean, got {type(value).__name__}")
+        return value
+    return value
+
+
+def parse_structured(text: str, schema: Dict[str, Any]) -> Any:
+    """Parse model output as JSON matching ``schema``, repairing trivial defects first.
+
+    Raises MalformedResponse when nothing usable can be recovered.
+    """
+    text = (text or "").strip()
+    if not text:
+        raise MalformedResponse("empty response")
+    try:
+        data = _loads(text)
+    except ValueError:
+        data = _repair(text, _schema_type(schema))
+        if data is None:
+            raise MalformedResponse(f"not JSON: {text[:80]!r}")
+    return validate(data, schema)
@@ -1,8 +1,12 @@
 from __future__ import annotations
 import asyncio
 import json
+import heapq
 import re
-from typing import Tuple, Dict, Any, Optional
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Tuple, Dict, Any, List, Optional, Callable, Awaitable
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 from playwright.async_api import async_playwright, Page
 
 try:
@@ -12,7 +16,18 @@ except Exception:
     genai = None
     GEMINI_API_KEY = None
 
-from .config import DEFAULT_USER_AGENT
+from .cache import get_navigation_hint_cache
+from .config import DEFAULT_USER_AGENT, VERIFY_BLOCK_PROFILE, VERIFY_VISIBLE_BLOCK_PROFILE
+from .resolvers import load_forms_db
+from .normalizer import normalize_user_text, extract_keywords
+from .probe import probe_url, OK as PROBE_OK, FAIL as PROBE_FAIL
+from .model_router import get_model_router
+from .prompts import get_prompt_cache, register_prompt
+from .structured import json_config, parse_structured, response_text
+from .resource_blocking import apply_resource_blocking, allowlist_for_url
+from .semantic import STOPWORDS
+from .session_vault import get_session_vault
+from .site_index import lookup_form_page
 
 STEALTH_SCRIPT = """
 Object.defineProperty(navigator, 'webdriver', { get: () => undefined });
@@ -22,24 +37,35 @@ Object.defineProperty(navigator, 'platform', { get: () => 'Win32' });
 """
 
 
-async def launch_stealth_context(headless: bool = True):
-    p = await async_playwright().start()
-    browser = await p.chromium.launch(
-        headless=headless,
-        args=[
-            '--disable-blink-features=AutomationControlled',
-            '--disable-dev-shm-usage',
-            '--no-sandbox',
-            '--disable-setuid-sandbox',
-            '--disable-web-security',
-            '--disable-features=IsolateOrigins,site-per-process'
-        ]
-    )
+CHROMIUM_ARGS = [
+    '--disable-blink-features=AutomationControlled',
+    '--disable-dev-shm-usage',
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-web-security',
+    '--disable-features=IsolateOrigins,site-per-process'
+]
+
+
+async def open_stealth_context(
+    browser,
+    headless: bool = True,
+    block_profile: Optional[str] = None,
+    allow: Optional[List[str]] = None,
+    storage_state: Optional[Dict[str, Any]] = None
+):
+    """Create a stealth context + page on an existing browser. Returns (context, page).
+
+    ``block_profile`` defaults to VERIFY_BLOCK_PROFILE headless and
+    VERIFY_VISIBLE_BLOCK_PROFILE when a user may need to see the page.
+    ``storage_state`` restores cookies/localStorage from a saved login session.
+    """
     context = await browser.new_context(
         viewport={'width': 1366, 'height': 768},
         user_agent=DEFAULT_USER_AGENT,
         locale='en-US',
         timezone_id='Asia/Kolkata',
+        storage_state=storage_state,
         extra_http_headers={
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.9',
@@ -54,176 +80,392 @@ async def launch_stealth_context(headless: bool = True):
             'sec-ch-ua-platform': '"Windows"'
         }
     )
+    if block_profile is None:
+        block_profile = VERIFY_BLOCK_PROFILE if headless else VERIFY_VISIBLE_BLOCK_PROFILE
+    await apply_resource_blocking(context, block_profile, allow)
     page = await context.new_page()
     await page.add_init_script(STEALTH_SCRIPT)
+    return context, page
+
+
+async def launch_stealth_context(
+    headless: bool = True,
+    block_profile: Optional[str] = None,
+    allow: Optional[List[str]] = None,
+    storage_state: Optional[Dict[str, Any]] = None
+):
+    """Launch Chromium with a stealth context that drops unneeded resources (see open_stealth_context)."""
+    p = await async_playwright().start()
+    browser = await p.chromium.launch(headless=headless, args=CHROMIUM_ARGS)
+    context, page = await open_stealth_context(browser, headless, block_profile, allow, storage_state)
     return p, browser, context, page
 
 
-async def has_forms_on_page(page: Page) -> bool:
-    """Check if page has visible form fields."""
+@asynccontextmanager
+async def stealth_page(pool=None, headless: bool = True, allow: Optional[List[str]] = None, storage_state: Optional[Dict[str, Any]] = None):
+    """Yield (context, page) leased from ``pool`` (a BrowserPool) or from a private browser closed on exit."""
+    if pool is not None:
+        async with pool.lease(allow=allow, storage_state=storage_state) as leased:
+            yield leased
+        return
+    p = browser = None
     try:
-        count = await page.evaluate("""
-            () => {
-                const inputs = document.querySelectorAll('input:not([type="hidden"]):not([type="image"]), textarea, select');
-                let visible = 0;
-                inputs.forEach(inp => {
-                    const rect = inp.getBoundingClientRect();
-                    if (rect.width > 0 && rect.height > 0) visible++;
-                });
-                return visible;
-            }
-        """)
-        return count > 0
-    except Exception:
-        return False
+        p, browser, context, page = await launch_stealth_context(headless=headless, allow=allow, storage_state=storage_state)
+        yield context, page
+    finally:
+        try:
+            if browser:
+                await browser.close()
+        except Exception:
+            pass
+        try:
+            if p:
+                await p.stop()
+        except Exception:
+            pass
 
 
-async def detect_404(page: Page) -> bool:
-    """Detect 404 or not found pages."""
+@dataclass
+class PageSnapshot:
+    """Everything the navigation detectors need, gathered in one page.evaluate."""
+    url: str
+    title: str
+    html_sample: str  # lowercased start of the serialized DOM
+    text_sample: str  # lowercased start of the visible body text
+    visible_inputs: int
+    has_password: bool
+    links: List[Dict[str, str]] = field(default_factory=list)  # [{text, href}] in document order
+
+
+SNAPSHOT_JS = """
+({htmlChars, textChars, maxLinks}) => {
+    const inputs = document.querySelectorAll('input:not([type="hidden"]):not([type="image"]), textarea, select');
+    let visible = 0;
+    inputs.forEach(inp => {
+        const rect = inp.getBoundingClientRect();
+        if (rect.width > 0 && rect.height > 0) visible++;
+    });
+    const links = [];
+    for (const a of document.querySelectorAll('a[href]')) {
+        const text = (a.innerText || '').trim().substring(0, 100);
+        if (text) links.push({text: text, href: a.href});
+        if (links.length >= maxLinks) break;
+    }
+    const root = document.documentElement;
+    return {
+        title: document.title || '',
+        html_sample: root ? root.outerHTML.substring(0, htmlChars) : '',
+        text_sample: document.body ? (document.body.innerText || '').substring(0, textChars) : '',
+        visible_inputs: visible,
+        has_password: document.querySelector('input[type="password"]') !== null,
+        links: links
+    };
+}
+"""
+
+
+async def snapshot_page(page: Page, html_chars: int = 5000, text_chars: int = 3000, max_links: int = 200) -> PageSnapshot:
+    """Capture title, bounded DOM/text samples, input counts and links in a single round trip."""
     try:
-        title = (await page.title()).lower()
-        content = (await page.content())[:3000].lower()
-        if '404' in title or 'not found' in title:
-            return True
-        if '404' in content and ('not found' in content or 'page not found' in content):
-            return True
-        return False
+        data = await page.evaluate(SNAPSHOT_JS, {"htmlChars": html_chars, "textChars": text_chars, "maxLinks": max_links})
     except Exception:
-        return False
+        data = {}
+    return PageSnapshot(
+        url=page.url,
+        title=data.get("title", ""),
+        html_sample=data.get("html_sample", "").lower(),
+        text_sample=data.get("text_sample", "").lower(),
+        visible_inputs=int(data.get("visible_inputs", 0)),
+        has_password=bool(data.get("has_password", False)),
+        links=data.get("links", []),
+    )
+
+
+async def has_forms_on_page(page: Page, snapshot: Optional[PageSnapshot] = None) -> bool:
+    """Check if page has visible form fields."""
+    snapshot = snapshot or await snapshot_page(page)
+    return snapshot.visible_inputs > 0
+
+
+async def detect_404(page: Page, snapshot: Optional[PageSnapshot] = None) -> bool:
+    """Detect 404 or not found pages."""
+    snapshot = snapshot or await snapshot_page(page)
+    title = snapshot.title.lower()
+    content = snapshot.html_sample[:3000]
+    if '404' in title or 'not found' in title:
+        return True
+    if '404' in content and ('not found' in content or 'page not found' in content):
+        return True
+    return False
+
 
+def detect_blocked(snapshot: PageSnapshot) -> Optional[str]:
+    """Return a reason if the page is an access-denied or CAPTCHA wall."""
+    content = snapshot.html_sample
+    if 'access denied' in content or 'permission denied' in content:
+        return "Access denied or blocked"
+    if 'captcha' in content:
+        return "CAPTCHA detected - cannot proceed automatically"
+    return None
 
-async def detect_login_required(page: Page) -> bool:
+
+async def detect_login_required(page: Page, snapshot: Optional[PageSnapshot] = None) -> bool:
     """Detect if page requires login."""
-    try:
-        content = (await page.content())[:5000].lower()
-        keywords = ['login', 'sign in', 'log in', 'authenticate', 'enter password', 'username']
-        # Check for login forms
-        login_count = sum(1 for kw in keywords if kw in content)
-        if login_count >= 2:
-            # Check if there are password fields
-            has_password = await page.evaluate("""
-                () => {
-                    const pwds = document.querySelectorAll('input[type="password"]');
-                    return pwds.length > 0;
-                }
-            """)
-            if has_password:
-                return True
-        return False
-    except Exception:
-        return False
+    snapshot = snapshot or await snapshot_page(page)
+    keywords = ['login', 'sign in', 'log in', 'authenticate', 'enter password', 'username']
+    # Check for login forms
+    login_count = sum(1 for kw in keywords if kw in snapshot.html_sample)
+    return login_count >= 2 and snapshot.has_password
 
 
-async def get_navigation_hint_from_ai(page: Page, user_request: str, attempt: int) -> Optional[Dict[str, Any]]:
-    """Ask Gemini for navigation guidance to find the form."""
-    if not genai or not GEMINI_API_KEY:
-        return None
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        
-        # Get page context
-        title = await page.title()
-        url = page.url
-        # Get visible links
-        links = await page.evaluate("""
-            () => {
-                const anchors = Array.from(document.querySelectorAll('a[href]'));
-                return anchors.slice(0, 30).map(a => ({
-                    text: a.innerText.trim().substring(0, 100),
-                    href: a.href
-                })).filter(l => l.text);
-            }
-        """)
-        
-        prompt = f"""
-You are helping navigate a website to find a form page.
+NAVIGATION_PROMPT = register_prompt(
+    "navigation_hint",
+    prefix="""You are helping navigate a website to find a form page.
+You will get the user's request, the current page and a sample of its visible links.
+
+Task: Determine the best action to find the form page.
+Options:
+1. If current page has the form, respond: {"action": "found", "reason": "form is here"}
+2. If you see a link that likely leads to the form, respond: {"action": "click", "link_text": "exact text", "href": "url", "reason": "why this link"}
+3. If page requires login first, respond: {"action": "login_required", "reason": "why"}
+4. If no relevant links, respond: {"action": "not_found", "reason": "why"}
+
+Respond ONLY with valid JSON, no markdown.
+""",
+    suffix="""
 User wants: {user_request}
 Current page title: {title}
 Current URL: {url}
 Attempt: {attempt}/3
 
 Visible links on page (sample):
-{json.dumps(links[:20], indent=2)}
+{links}
+""",
+)
 
-Task: Determine the best action to find the form page.
-Options:
-1. If current page has the form, respond: {{"action": "found", "reason": "form is here"}}
-2. If you see a link that likely leads to the form, respond: {{"action": "click", "link_text": "exact text", "href": "url", "reason": "why this link"}}
-3. If page requires login first, respond: {{"action": "login_required", "reason": "why"}}
-4. If no relevant links, respond: {{"action": "not_found", "reason": "why"}}
 
-Respond ONLY with valid JSON, no markdown.
-"""
+NAVIGATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "action": {"type": "string", "enum": ["found", "click", "login_required", "not_found"]},
+        "link_text": {"type": "string", "nullable": True},
+        "href": {"type": "string", "nullable": True},
+        "reason": {"type": "string", "nullable": True},
+    },
+    "required": ["action"],
+}
+NAVIGATION_CONFIG = json_config(NAVIGATION_SCHEMA)
+
+
+async def get_navigation_hint_from_ai(page: Page, user_request: str, attempt: int, snapshot: Optional[PageSnapshot] = None,
+                                     hint_stats: Optional[Dict[str, int]] = None) -> Optional[Dict[str, Any]]:
+    """Ask Gemini for navigation guidance to find the form.
+
+    Answers are memoized per (canonical URL, visible links, intent) once they
+    lead to a form (see ``_settle_hints``); repeat attempts skip the cache and
+    ask a stronger tier. ``hint_stats`` counts this navigation's cache hits and
+    misses. The returned hint carries its ``cache_key`` and whether it was
+    ``cached``.
+    """
+    try:
+        # Page context comes from the step's snapshot
+        snapshot = snapshot or await snapshot_page(page)
+        title = snapshot.title
+        url = snapshot.url
+        links = snapshot.links[:20]
+        
+        hint_cache = get_navigation_hint_cache()
+        cache_key = hint_cache.key_for(canonicalize_url(url), links, user_request)
+        if attempt == 1:
+            cached = hint_cache.lookup(cache_key)
+            if hint_stats is not None:
+                hint_stats["hits" if cached else "misses"] += 1
+            if cached:
+                print(f"♻️ Navigation hint from cache: {cached.get('action')}")
+                return {**cached, "cache_key": cache_key, "cached": True}
         
-        resp = model.generate_content(prompt)
-        text = (resp.text or "").strip()
-        text = re.sub(r"^```[a-zA-Z]*\n?", "", text)
-        text = re.sub(r"```$", "", text)
-        data = json.loads(text)
-        return data
+        if not genai or not GEMINI_API_KEY:
+            return None
+        genai.configure(api_key=GEMINI_API_KEY)
+        values = {
+            "user_request": user_request,
+            "title": title,
+            "url": url,
+            "attempt": attempt,
+            "links": json.dumps(links, indent=2),
+        }
+        
+        def ask(model):
+            resp = get_prompt_cache().generate(model, NAVIGATION_PROMPT.name, values, generation_config=NAVIGATION_CONFIG)
+            return parse_structured(response_text(resp), NAVIGATION_SCHEMA)
+        
+        # A repeat attempt means the previous hint did not reach the form; ask a stronger tier
+        hint = await asyncio.to_thread(get_model_router().call, "navigation", ask, low_confidence=attempt > 1)
+        return {**hint, "cache_key": cache_key, "cached": False}
     except Exception as e:
         print(f"AI navigation hint failed: {e}")
         return None
 
 
-async def navigate_to_form(page: Page, user_request: str, max_attempts: int = 3, headless: bool = True) -> Tuple[bool, str, str]:
+# Resolves once the page has no password field, re-checking only when the DOM mutates
+PASSWORD_GONE_JS = """
+() => new Promise(resolve => {
+    const gone = () => !document.querySelector('input[type="password"]');
+    if (gone()) return resolve(true);
+    const observer = new MutationObserver(() => {
+        if (gone()) {
+            observer.disconnect();
+            resolve(true);
+        }
+    });
+    observer.observe(document.documentElement, {
+        childList: true, subtree: true, attributes: true, attributeFilter: ['type']
+    });
+})
+"""
+
+
+async def _watch_password_field(page: Page, after_reload: bool = False) -> bool:
+    if after_reload:
+        await page.wait_for_load_state('domcontentloaded')
+    return await page.evaluate(PASSWORD_GONE_JS)
+
+
+async def wait_for_login(page: Page, timeout_s: float = 180) -> bool:
+    """
+    Wait for a manual login to finish: the main frame navigates to another URL
+    or the password field disappears from the current document. Event driven,
+    so navigation resumes as soon as either happens. Returns False on timeout.
+    """
+    start_url = page.url
+    navigated = asyncio.create_task(page.wait_for_event(
+        "framenavigated",
+        predicate=lambda frame: frame == page.main_frame and frame.url != start_url,
+        timeout=timeout_s * 1000
+    ))
+    watcher = asyncio.create_task(_watch_password_field(page))
+    pending = {navigated, watcher}
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout_s
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=max(0.0, deadline - loop.time()), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                return False
+            for task in done:
+                if task.exception() is None:
+                    return True
+                if task is navigated or page.is_closed():
+                    return False
+                # Same-URL reload replaced the document; watch the new one
+                watcher = asyncio.create_task(_watch_password_field(page, after_reload=True))
+                pending.add(watcher)
+        return False
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+def _settle_hints(hints: List[Dict[str, Any]], found: bool) -> None:
+    """Cache the hints a navigation followed once it reached a form; drop reused ones that did not."""
+    hint_cache = get_navigation_hint_cache()
+    for hint in hints:
+        if found:
+            hint_cache.store_hint(hint["cache_key"], hint)
+        elif hint.get("cached"):
+            hint_cache.discard(hint["cache_key"])
+
+
+FORM_LINK_WORDS = ('form', 'apply', 'register', 'application')
+
+
+def heuristic_form_links(snapshot: PageSnapshot, limit: int = 5) -> List[Dict[str, str]]:
+    """Links whose text suggests they lead to a form, in page order."""
+    matches = []
+    for link in snapshot.links:
+        text = link["text"].lower()
+        if any(w in text for w in FORM_LINK_WORDS):
+            matches.append({"text": text, "href": link["href"]})
+            if len(matches) >= limit:
+                break
+    return matches
+
+
+async def navigate_to_form(
+    page: Page,
+    user_request: str,
+    max_attempts: int = 3,
+    headless: bool = True,
+    on_login: Optional[Callable[[], Awaitable[None]]] = None,
+    hint_stats: Optional[Dict[str, int]] = None
+) -> Tuple[bool, str, str]:
     """
     Intelligently navigate to find the form page.
     Returns (found, final_url, reason).
-    If login required and headless=False, will wait for user to login.
+    If login required and headless=False, will wait for user to login
+    and then await on_login (e.g. to persist the session).
     """
+    followed: List[Dict[str, Any]] = []
+    found, final_url, reason = await _navigate_steps(page, user_request, max_attempts, headless, on_login, hint_stats, followed)
+    _settle_hints(followed, found)
+    return found, final_url, reason
+
+
+async def _navigate_steps(page: Page, user_request: str, max_attempts: int, headless: bool, on_login, hint_stats, followed: List[Dict[str, Any]]) -> Tuple[bool, str, str]:
+    # ``followed`` collects the AI hints acted on, for _settle_hints
     for attempt in range(1, max_attempts + 1):
         print(f"🔍 Navigation attempt {attempt}/{max_attempts} at {page.url}")
         
         # Wait for page to stabilize
         await asyncio.sleep(2)
         
+        # One DOM snapshot feeds every detector for this step
+        snapshot = await snapshot_page(page)
+        
         # Check for 404
-        if await detect_404(page):
+        if await detect_404(page, snapshot):
             return False, page.url, "404 - Page not found"
         
         # Check for blocking/captcha
-        content_sample = (await page.content())[:5000].lower()
-        if 'access denied' in content_sample or 'permission denied' in content_sample:
-            return False, page.url, "Access denied or blocked"
-        if 'captcha' in content_sample:
-            return False, page.url, "CAPTCHA detected - cannot proceed automatically"
+        blocked = detect_blocked(snapshot)
+        if blocked:
+            return False, page.url, blocked
         
         # Check if login required
-        if await detect_login_required(page):
+        if await detect_login_required(page, snapshot):
             if headless:
                 return False, page.url, "Login required - please run with headless=False and login manually"
             else:
                 print("⚠️ Login required. Please login manually in the browser...")
-                print("⏳ Waiting for login (checking every 5s for up to 3 minutes)...")
-                # Wait for login - check if password field disappears or URL changes
-                start_url = page.url
-                for _ in range(36):  # 3 minutes
-                    await asyncio.sleep(5)
-                    still_login = await detect_login_required(page)
-                    if not still_login or page.url != start_url:
-                        print("✅ Login detected, continuing navigation...")
-                        break
+                print("⏳ Waiting for login (up to 3 minutes)...")
+                if await wait_for_login(page, timeout_s=180):
+                    print("✅ Login detected, continuing navigation...")
                 else:
                     return False, page.url, "Login timeout - user did not complete login in 3 minutes"
+                if on_login:
+                    await on_login()
+                # The page changed under us; re-read it before the form checks
+                snapshot = await snapshot_page(page)
         
         # Check if current page has forms
-        if await has_forms_on_page(page):
+        if await has_forms_on_page(page, snapshot):
             print(f"✅ Found forms on page: {page.url}")
             return True, page.url, "Form found on current page"
         
         # Ask AI for navigation hint
-        hint = await get_navigation_hint_from_ai(page, user_request, attempt)
+        hint = await get_navigation_hint_from_ai(page, user_request, attempt, snapshot, hint_stats)
         if hint:
             action = hint.get("action")
             reason = hint.get("reason", "")
             
             if action == "found":
                 # AI thinks form is here, double-check
-                if await has_forms_on_page(page):
+                if await has_forms_on_page(page, snapshot):
+                    followed.append(hint)
                     return True, page.url, f"AI confirmed: {reason}"
                 else:
+                    _settle_hints([hint], False)
                     print(f"⚠️ AI said form found but no forms detected, continuing...")
             
             elif action == "click":
@@ -237,6 +479,7 @@ async def navigate_to_form(page: Page, user_request: str, max_attempts: int = 3,
                         try:
                             await page.click(f'text="{link_text}"', timeout=5000)
                             await page.wait_for_load_state('domcontentloaded', timeout=15000)
+                            followed.append(hint)
                             continue
                         except Exception:
                             pass
@@ -244,9 +487,11 @@ async def navigate_to_form(page: Page, user_request: str, max_attempts: int = 3,
                     if href:
                         try:
                             await page.goto(href, wait_until='domcontentloaded', timeout=15000)
+                            followed.append(hint)
                             continue
                         except Exception:
                             pass
+                    _settle_hints([hint], False)
                     print("⚠️ Could not click suggested link, trying next...")
                 except Exception as e:
                     print(f"⚠️ Click failed: {e}")
@@ -263,20 +508,7 @@ async def navigate_to_form(page: Page, user_request: str, max_attempts: int = 3,
         
         # If AI didn't help, try heuristic link search
         try:
-            form_links = await page.evaluate("""
-                () => {
-                    const anchors = Array.from(document.querySelectorAll('a[href]'));
-                    return anchors.map(a => ({
-                        text: a.innerText.trim().toLowerCase(),
-                        href: a.href
-                    })).filter(l => 
-                        l.text.includes('form') || 
-                        l.text.includes('apply') || 
-                        l.text.includes('register') ||
-                        l.text.includes('application')
-                    ).slice(0, 5);
-                }
-            """)
+            form_links = heuristic_form_links(snapshot)
             if form_links:
                 first = form_links[0]
                 print(f"🔗 Heuristic: trying link '{first['text']}' -> {first['href']}")
@@ -295,87 +527,268 @@ async def navigate_to_form(page: Page, user_request: str, max_attempts: int = 3,
     return False, page.url, f"Could not find form page after {max_attempts} attempts"
 
 
-async def verify_url(url: str, timeout_ms: int = 20000) -> Tuple[bool, str]:
-    """Try to open the URL with stealth Playwright. Returns (ok, reason)."""
-    p = browser = context = page = None
+# Second-level public suffixes under which the site is the third label (incometax.gov.in)
+_PUBLIC_SUFFIX_SLDS = {'gov', 'nic', 'ac', 'co', 'org', 'net', 'edu', 'res'}
+_TRACKING_PARAMS = re.compile(r'^(utm_.*|fbclid|gclid|ref|source)$')
+_SKIP_EXTENSIONS = ('.pdf', '.zip', '.doc', '.docx', '.xls', '.xlsx', '.jpg', '.png', '.mp4')
+
+
+def canonicalize_url(url: str) -> str:
+    """Normalise a URL for de-duplication; SPA hash routes ("#/...") are kept."""
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    if parts.port and not ((parts.scheme == 'http' and parts.port == 80) or (parts.scheme == 'https' and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip('/') or '/'
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _TRACKING_PARAMS.match(k)))
+    fragment = parts.fragment if parts.fragment.startswith(('/', '!/')) else ''
+    return urlunsplit((parts.scheme.lower(), host, path, query, fragment))
+
+
+def site_of(url: str) -> str:
+    """Registrable site of a URL, e.g. eportal.incometax.gov.in -> incometax.gov.in."""
+    labels = (urlsplit(url).hostname or '').lower().split('.')
+    if len(labels) >= 3 and labels[-2] in _PUBLIC_SUFFIX_SLDS and len(labels[-1]) == 2:
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
+
+
+def score_link(link: Dict[str, str], intent_words: List[str], hint_href: Optional[str] = None) -> float:
+    """Rank a link by form-ish wording, overlap with the user's intent and the AI hint."""
+    text = link['text'].lower()
+    href = link['href'].lower()
+    score = sum(1.0 for w in FORM_LINK_WORDS if w in text)
+    score += 0.5 * sum(1 for w in intent_words if w in text or w in href)
+    if hint_href and canonicalize_url(link['href']) == canonicalize_url(hint_href):
+        score += 5.0
+    return score
+
+
+async def _open_and_snapshot(context, href: str, timeout_ms: int) -> Optional[PageSnapshot]:
+    child = await context.new_page()
     try:
-        p, browser, context, page = await launch_stealth_context(headless=True)
-        await page.goto(url, wait_until='domcontentloaded', timeout=timeout_ms)
-        # basic checks: status like blocking pages often redirect; we can inspect title
-        title = await page.title()
-        if not title:
-            return False, 'no title'
-        # heuristic: permissions/denied words
-        content = (await page.content())[:5000].lower()
-        if 'access denied' in content or 'permission denied' in content or 'captcha' in content:
-            return False, 'blocked or captcha'
-        return True, 'ok'
-    except Exception as e:
-        return False, f'error: {e}'
+        await child.add_init_script(STEALTH_SCRIPT)
+        await child.goto(href, wait_until='domcontentloaded', timeout=timeout_ms)
+        await asyncio.sleep(2)
+        return await snapshot_page(child)
+    except Exception:
+        return None
     finally:
         try:
-            if browser:
-                await browser.close()
+            await child.close()
         except Exception:
             pass
+
+
+async def crawl_to_form(
+    page: Page,
+    user_request: str,
+    headless: bool = True,
+    max_depth: int = 2,
+    top_k: int = 3,
+    timeout_ms: int = 15000,
+    steps: Optional[List[str]] = None,
+    on_login: Optional[Callable[[], Awaitable[None]]] = None,
+    hint_stats: Optional[Dict[str, int]] = None
+) -> Tuple[bool, str, str]:
+    """
+    Bounded breadth-first search for a form page.
+    Keeps a scored frontier of same-site links (heuristic + AI hint), opens the
+    top_k of each depth level in parallel pages of the same context and stops at
+    the first page with visible form fields. Returns (found, final_url, reason).
+    """
+    steps = steps if steps is not None else []
+    await asyncio.sleep(2)
+    snapshot = await snapshot_page(page)
+    if await detect_404(page, snapshot):
+        return False, page.url, "404 - Page not found"
+    blocked = detect_blocked(snapshot)
+    if blocked:
+        return False, page.url, blocked
+    if await detect_login_required(page, snapshot):
+        if headless:
+            return False, page.url, "Login required - please run with headless=False and login manually"
+        # The sequential navigator knows how to wait for a manual login
+        return await navigate_to_form(page, user_request, headless=headless, on_login=on_login, hint_stats=hint_stats)
+    if await has_forms_on_page(page, snapshot):
+        return True, page.url, "Form found on current page"
+
+    hint = await get_navigation_hint_from_ai(page, user_request, 1, snapshot, hint_stats)
+    hint_href = hint.get("href") if hint and hint.get("action") == "click" else None
+    if hint and not hint_href:
+        # A "found" here was already contradicted by has_forms_on_page above
+        _settle_hints([hint], False)
+    intent_words = [w for w in extract_keywords(normalize_user_text(user_request)) if len(w) > 2 and w not in STOPWORDS]
+    site = site_of(page.url)
+    visited = {canonicalize_url(page.url)}
+    frontier: List[Tuple[float, str, str]] = []  # (-score, canonical, href) heap
+    login_seen = False
+
+    def extend_frontier(snap: PageSnapshot) -> None:
+        for link in snap.links:
+            href = link.get('href', '')
+            if not href.startswith('http') or site_of(href) != site:
+                continue
+            if urlsplit(href).path.lower().endswith(_SKIP_EXTENSIONS):
+                continue
+            canonical = canonicalize_url(href)
+            if canonical in visited:
+                continue
+            score = score_link(link, intent_words, hint_href)
+            if score > 0:
+                visited.add(canonical)
+                heapq.heappush(frontier, (-score, canonical, href))
+
+    extend_frontier(snapshot)
+    for depth in range(1, max_depth + 1):
+        batch = [heapq.heappop(frontier) for _ in range(min(top_k, len(frontier)))]
+        if not batch:
+            break
+        print(f"🕸️ Crawl depth {depth}: opening {len(batch)} links in parallel")
+        steps.append(f"Crawl depth {depth}: " + ", ".join(href for _, _, href in batch))
+        tasks = [asyncio.create_task(_open_and_snapshot(page.context, href, timeout_ms)) for _, _, href in batch]
+        found_snap = None
         try:
-            if p:
-                await p.stop()
-        except Exception:
-            pass
+            for fut in asyncio.as_completed(tasks):
+                snap = await fut
+                if snap is None or await detect_404(page, snap) or detect_blocked(snap):
+                    continue
+                if await detect_login_required(page, snap):
+                    login_seen = True
+                    continue
+                if await has_forms_on_page(page, snap):
+                    found_snap = snap
+                    break
+                extend_frontier(snap)
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if found_snap:
+            print(f"✅ Found forms on page: {found_snap.url}")
+            if hint_href:
+                _settle_hints([hint], canonicalize_url(found_snap.url) == canonicalize_url(hint_href))
+            return True, found_snap.url, f"Form found by crawl at depth {depth}"
+
+    if hint_href:
+        _settle_hints([hint], False)
+    if login_seen:
+        return False, page.url, "Login required - form pages sit behind a login"
+    return False, page.url, f"Could not find form page within crawl depth {max_depth}"
+
+
+async def verify_url(url: str, timeout_ms: int = 20000, probe: bool = True, pool=None) -> Tuple[bool, str]:
+    """
+    Check that the URL is a usable page. Returns (ok, reason).
+    A plain HTTP probe decides first; the stealth browser only opens for pages
+    that need JavaScript or look like a bot wall (or when probe=False).
+    ``pool`` (a BrowserPool) lends a context instead of launching Chromium.
+    """
+    if probe:
+        pr = await probe_url(url, timeout_s=timeout_ms / 1000)
+        if pr.verdict == PROBE_OK:
+            return True, 'ok (http probe)'
+        if pr.verdict == PROBE_FAIL:
+            return False, pr.reason
+    try:
+        async with stealth_page(pool, headless=True, allow=allowlist_for_url(url, load_forms_db())) as (context, page):
+            await page.goto(url, wait_until='domcontentloaded', timeout=timeout_ms)
+            # basic checks: status like blocking pages often redirect; we can inspect title
+            snapshot = await snapshot_page(page)
+            if not snapshot.title:
+                return False, 'no title'
+            # heuristic: permissions/denied words
+            if detect_blocked(snapshot):
+                return False, 'blocked or captcha'
+            return True, 'ok'
+    except Exception as e:
+        return False, f'error: {e}'
 
 
-async def verify_and_navigate_to_form(url: str, user_request: str, headless: bool = True, timeout_ms: int = 20000) -> Dict[str, Any]:
+async def verify_and_navigate_to_form(
+    url: str,
+    user_request: str,
+    headless: bool = True,
+    timeout_ms: int = 20000,
+    crawl: bool = False,
+    user_id: Any = None,
+    pool=None
+) -> Dict[str, Any]:
     """
     Advanced verification: navigate to URL and intelligently find the form page.
-    Returns dict with: found, final_url, reason, needs_login, steps
+    With crawl=True the bounded parallel crawler replaces the one-link-per-attempt navigator.
+    With user_id, a saved login session for the site is restored and a new manual
+    login is saved to the session vault. ``pool`` (a BrowserPool) lends the context.
+    Returns dict with: found, final_url, reason, needs_login, steps, hint_cache (hits/misses)
     """
-    p = browser = context = page = None
     result = {
         "found": False,
         "final_url": url,
         "reason": "unknown",
         "needs_login": False,
-        "steps": []
+        "steps": [],
+        "hint_cache": {"hits": 0, "misses": 0}
     }
     
     try:
-        p, browser, context, page = await launch_stealth_context(headless=headless)
-        
-        # Initial navigation
-        try:
-            await page.goto(url, wait_until='domcontentloaded', timeout=timeout_ms)
-            result["steps"].append(f"Opened {url}")
-        except Exception as e:
-            result["reason"] = f"Failed to open URL: {e}"
-            return result
-        
-        # Check for immediate 404
-        if await detect_404(page):
-            result["reason"] = "404 - Page not found"
-            result["final_url"] = page.url
-            return result
-        
-        # Navigate to find form
-        found, final_url, reason = await navigate_to_form(page, user_request, max_attempts=3, headless=headless)
-        result["found"] = found
-        result["final_url"] = final_url
-        result["reason"] = reason
-        result["needs_login"] = "login required" in reason.lower()
-        
-        return result
+        vault = get_session_vault()
+        site = site_of(url)
+        storage_state = vault.load(user_id, site)
+        async with stealth_page(pool, headless=headless, allow=allowlist_for_url(url, load_forms_db()), storage_state=storage_state) as (context, page):
+            if storage_state:
+                result["steps"].append(f"Restored saved session for {site}")
+            
+            async def save_session():
+                if vault.save(user_id, site, await context.storage_state()):
+                    result["steps"].append(f"Saved login session for {site}")
+            
+            return await _navigate_in_page(page, url, user_request, headless, timeout_ms, crawl, result, site, save_session)
         
     except Exception as e:
         result["reason"] = f"Error during navigation: {e}"
         return result
-    finally:
-        try:
-            if browser:
-                await browser.close()
-        except Exception:
-            pass
+
+
+async def _navigate_in_page(page: Page, url: str, user_request: str, headless: bool, timeout_ms: int, crawl: bool, result: Dict[str, Any], site: str, save_session) -> Dict[str, Any]:
+    # Jump straight to a form page known from the offline site index, unless
+    # the candidate already is a registered forms.json form
+    known_forms = {canonicalize_url(e["url"]) for e in load_forms_db().values() if e.get("url")}
+    indexed = None if canonicalize_url(url) in known_forms else lookup_form_page(site, user_request)
+    if indexed and canonicalize_url(indexed) != canonicalize_url(url):
         try:
-            if p:
-                await p.stop()
+            await page.goto(indexed, wait_until='domcontentloaded', timeout=timeout_ms)
+            await asyncio.sleep(2)
+            snapshot = await snapshot_page(page)
+            if await has_forms_on_page(page, snapshot) and not detect_blocked(snapshot):
+                result["steps"].append(f"Opened indexed form page {indexed}")
+                result.update(found=True, final_url=page.url, reason="Form found via site index")
+                return result
         except Exception:
             pass
+        result["steps"].append(f"Indexed form page {indexed} did not load a form")
+    
+    # Initial navigation
+    try:
+        await page.goto(url, wait_until='domcontentloaded', timeout=timeout_ms)
+        result["steps"].append(f"Opened {url}")
+    except Exception as e:
+        result["reason"] = f"Failed to open URL: {e}"
+        return result
+    
+    # Check for immediate 404
+    if await detect_404(page):
+        result["reason"] = "404 - Page not found"
+        result["final_url"] = page.url
+        return result
+    
+    # Navigate to find form
+    if crawl:
+        found, final_url, reason = await crawl_to_form(page, user_request, headless=headless, steps=result["steps"], on_login=save_session, hint_stats=result["hint_cache"])
+    else:
+        found, final_url, reason = await navigate_to_form(page, user_request, max_attempts=3, headless=headless, on_login=save_session, hint_stats=result["hint_cache"])
+    result["found"] = found
+    result["final_url"] = final_url
+    result["reason"] = reason
+    result["needs_login"] = "login required" in reason.lower()
+    
+    return result